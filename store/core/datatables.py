@@ -0,0 +1,182 @@
+import heapq
+from functools import total_ordering
+from itertools import islice
+
+from django.db.models import Q
+from django.http import JsonResponse
+from django.utils.html import format_html
+
+# Filas maximas por pagina que se aceptan del cliente.
+MAX_PAGE_LENGTH = 100
+
+
+def int_param(params, name, default):
+    try:
+        return int(params.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+def column_fields(column):
+    """Cada columna es None, un campo del ORM o una tupla (campo para ordenar, campo para buscar)."""
+    if column is None:
+        return None, None
+    if isinstance(column, tuple):
+        return column
+    return column, column
+
+
+def filter_queryset(queryset, params, columns, search=None):
+    """`search(queryset, texto)` reemplaza el icontains de la busqueda general, si se pasa."""
+    search_fields = [column_fields(column)[1] for column in columns]
+    filtered = False
+
+    value = params.get('search[value]', '').strip()
+    if value and search:
+        queryset = search(queryset, value)
+        filtered = True
+    elif value:
+        query = Q()
+        for field in search_fields:
+            if field:
+                query |= Q(**{f'{field}__icontains': value})
+        queryset = queryset.filter(query)
+        filtered = True
+
+    for index, field in enumerate(search_fields):
+        value = params.get(f'columns[{index}][search][value]', '').strip()
+        if field and value:
+            queryset = queryset.filter(**{f'{field}__icontains': value})
+            filtered = True
+
+    # Las busquedas sobre relaciones inversas pueden repetir filas.
+    return (queryset.distinct(), True) if filtered else (queryset, False)
+
+
+def ordering_fields(params, columns):
+    ordering = []
+    i = 0
+    while f'order[{i}][column]' in params:
+        index = int_param(params, f'order[{i}][column]', -1)
+        if 0 <= index < len(columns):
+            field = column_fields(columns[index])[0]
+            if field:
+                prefix = '-' if params.get(f'order[{i}][dir]') == 'desc' else ''
+                ordering.append(prefix + field)
+        i += 1
+    return ordering
+
+
+def order_queryset(queryset, params, columns):
+    ordering = ordering_fields(params, columns)
+    if ordering:
+        queryset = queryset.order_by(*ordering, 'pk')
+    return queryset
+
+
+@total_ordering
+class Descending:
+    """Invierte la comparacion de un valor, para los campos ordenados con '-'."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def field_value(obj, field):
+    for name in field.split('__'):
+        obj = getattr(obj, name)
+    return obj
+
+
+def merged_page(querysets, ordering, start, length):
+    """
+    Pagina de varios querysets como si fueran uno: cada uno se ordena en SQL y
+    aporta a lo sumo start + length filas, que se mezclan en el mismo orden.
+    """
+    fields = [*ordering, 'pk']
+
+    def key(obj):
+        return tuple(
+            Descending(field_value(obj, field[1:])) if field.startswith('-') else field_value(obj, field)
+            for field in fields
+        )
+
+    ordered = [queryset.order_by(*fields)[:start + length] for queryset in querysets]
+    return list(islice(heapq.merge(*ordered, key=key), start, start + length))
+
+
+def datatable_response(request, queryset, columns, render_row, search=None):
+    """
+    Responde una peticion server-side de DataTables: pagina, ordena y filtra en
+    SQL y solo convierte en filas los registros de la pagina pedida. Cada
+    pagina cuesta dos COUNT y una consulta por la pagina (mas los
+    prefetch_related que tenga el queryset).
+
+    `queryset` tambien puede ser una lista de querysets, por ejemplo la base
+    principal y los archivos de ventas de años anteriores (ver merged_page).
+    """
+    params = request.GET
+    querysets = list(queryset) if isinstance(queryset, (list, tuple)) else [queryset]
+    total = sum(queryset.count() for queryset in querysets)
+    results = [filter_queryset(queryset, params, columns, search) for queryset in querysets]
+    querysets = [queryset for queryset, _ in results]
+    filtered = any(filtered for _, filtered in results)
+    records_filtered = sum(queryset.count() for queryset in querysets) if filtered else total
+
+    start = max(int_param(params, 'start', 0), 0)
+    length = int_param(params, 'length', 10)
+    if length <= 0 or length > MAX_PAGE_LENGTH:
+        length = MAX_PAGE_LENGTH
+
+    if len(querysets) == 1:
+        page = order_queryset(querysets[0], params, columns)[start:start + length]
+    else:
+        page = merged_page(querysets, ordering_fields(params, columns), start, length)
+
+    return JsonResponse({
+        'draw': int_param(params, 'draw', 0),
+        'recordsTotal': total,
+        'recordsFiltered': records_filtered,
+        'data': [render_row(obj) for obj in page],
+    })
+
+
+def action_buttons(update_url, delete_url):
+    """Botones de editar y eliminar de las listas de mantenimiento."""
+    return format_html(
+        '<a href="{}" class="btn btn-primary btn-sm" title="Editar"><i class="mdi mdi-pencil"></i></a> '
+        '<a href="{}" class="btn btn-danger btn-sm" title="Eliminar"><i class="mdi mdi-delete"></i></a>',
+        update_url,
+        delete_url,
+    )
+
+
+class DataTablesMixin:
+    """
+    Para ListView: cuando la peticion trae `draw` responde con la pagina en
+    JSON; si no, muestra la plantilla, que ya no recorre los registros.
+    """
+    datatable_columns = []
+    # Metodo opcional (queryset, texto) -> queryset para la busqueda general.
+    datatable_search = None
+
+    def get(self, request, *args, **kwargs):
+        if 'draw' in request.GET:
+            return datatable_response(
+                request, self.get_datatable_queryset(), self.datatable_columns, self.datatable_row,
+                self.datatable_search,
+            )
+        return super().get(request, *args, **kwargs)
+
+    def get_datatable_queryset(self):
+        """Queryset (o lista de querysets) de la tabla; por defecto el de la lista."""
+        return self.get_queryset()
+
+    def datatable_row(self, obj):
+        raise NotImplementedError
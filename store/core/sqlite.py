@@ -0,0 +1,85 @@
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection as default_connection
+from django.db.backends.signals import connection_created
+
+# Pragmas que se aplican a cada conexion SQLite. Se pueden cambiar con el
+# setting SQLITE_PRAGMAS (un diccionario con el mismo formato).
+DEFAULT_PRAGMAS = {
+    # Los lectores no bloquean al escritor ni el escritor a los lectores.
+    'journal_mode': 'WAL',
+    # En WAL solo se sincroniza al hacer checkpoint; no se pierde consistencia,
+    # pero un corte de energia puede perder las ultimas transacciones
+    # confirmadas. Use 'FULL' si cada venta confirmada debe ser durable.
+    'synchronous': 'NORMAL',
+    # Negativo = KiB: 64 MB de cache de paginas por conexion.
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+    'temp_store': 'MEMORY',
+    # Milisegundos que una conexion espera un bloqueo antes de fallar.
+    'busy_timeout': 5000,
+}
+
+# Mensajes de SQLite que indican que el bloqueo no se pudo obtener a tiempo.
+BUSY_ERRORS = ('database is locked', 'database table is locked')
+READ_ONLY_SKIP = {'journal_mode', 'synchronous'}
+
+
+def sqlite_pragmas():
+    return getattr(settings, 'SQLITE_PRAGMAS', DEFAULT_PRAGMAS)
+
+
+def pragma_statements(pragmas):
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Se ejecuta al abrir cada conexion (signal connection_created)."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = sqlite_pragmas()
+    if 'mode=ro' in str(connection.settings_dict['NAME']):
+        # Los archivos de solo lectura no pueden cambiar el journal.
+        pragmas = {name: value for name, value in pragmas.items() if name not in READ_ONLY_SKIP}
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(pragmas):
+            cursor.execute(statement)
+
+
+def connect_signals():
+    connection_created.connect(configure_connection, dispatch_uid='core.sqlite.configure_connection')
+
+
+def is_busy_error(error):
+    return isinstance(error, OperationalError) and any(message in str(error) for message in BUSY_ERRORS)
+
+
+def retry_on_busy(func=None, attempts=5, delay=0.05, max_delay=1.0):
+    """
+    Reintenta la funcion cuando SQLite responde "database is locked", con
+    espera exponencial y algo de azar para que los terminales no reintenten
+    a la vez. Solo reintenta cuando la funcion abre su propia transaccion:
+    dentro de un atomic() externo el error se propaga, porque la transaccion
+    de afuera ya no es valida.
+    """
+    if func is None:
+        return functools.partial(retry_on_busy, attempts=attempts, delay=delay, max_delay=max_delay)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        for attempt in range(attempts):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as e:
+                if (
+                    not is_busy_error(e)
+                    or default_connection.in_atomic_block
+                    or attempt == attempts - 1
+                ):
+                    raise
+                wait = min(delay * 2 ** attempt, max_delay)
+                time.sleep(wait + random.uniform(0, wait))
+    return wrapper
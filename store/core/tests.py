@@ -1,3 +1,56 @@
-from django.test import TestCase
+import json
 
-# Create your tests here.
+from django.test import RequestFactory, TestCase
+
+from inventory.models import Category
+from .datatables import MAX_PAGE_LENGTH, datatable_response
+
+
+class DataTableResponseTests(TestCase):
+    columns = ['name', ('description', None), None]
+
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(12):
+            Category.objects.create(name=f'Categoria {index:02}', description='Par' if index % 2 else 'Impar')
+
+    def page(self, **params):
+        request = RequestFactory().get('/', {'draw': 3, **params})
+        response = datatable_response(request, Category.objects.order_by('pk'), self.columns, lambda c: [c.name])
+        return json.loads(response.content)
+
+    def test_pages_the_queryset(self):
+        data = self.page(start=10, length=5)
+        self.assertEqual(data['draw'], 3)
+        self.assertEqual((data['recordsTotal'], data['recordsFiltered']), (12, 12))
+        self.assertEqual(data['data'], [['Categoria 10'], ['Categoria 11']])
+
+    def test_orders_by_the_requested_column(self):
+        data = self.page(**{'order[0][column]': 0, 'order[0][dir]': 'desc', 'length': 2})
+        self.assertEqual(data['data'], [['Categoria 11'], ['Categoria 10']])
+        # Las columnas sin campo no ordenan.
+        data = self.page(**{'order[0][column]': 2, 'order[0][dir]': 'desc', 'length': 1})
+        self.assertEqual(data['data'], [['Categoria 00']])
+
+    def test_search_filters_the_count(self):
+        data = self.page(**{'search[value]': 'categoria 0'})
+        self.assertEqual((data['recordsTotal'], data['recordsFiltered']), (12, 10))
+        # La descripcion no se busca: su columna no tiene campo de busqueda.
+        self.assertEqual(self.page(**{'search[value]': 'Par'})['recordsFiltered'], 0)
+        data = self.page(**{'columns[0][search][value]': '11'})
+        self.assertEqual(data['data'], [['Categoria 11']])
+
+    def test_merges_several_querysets(self):
+        request = RequestFactory().get('/', {
+            'draw': 1, 'start': 3, 'length': 4, 'order[0][column]': 0, 'order[0][dir]': 'desc',
+            'search[value]': 'categoria',
+        })
+        querysets = [Category.objects.filter(description=description) for description in ('Par', 'Impar')]
+        data = json.loads(datatable_response(request, querysets, self.columns, lambda c: c.name).content)
+        self.assertEqual((data['recordsTotal'], data['recordsFiltered']), (12, 12))
+        self.assertEqual(data['data'], ['Categoria 08', 'Categoria 07', 'Categoria 06', 'Categoria 05'])
+
+    def test_page_length_is_capped(self):
+        for length in (-1, MAX_PAGE_LENGTH + 1):
+            self.assertEqual(len(self.page(length=length)['data']), 12)
+        self.assertEqual(len(self.page(length='x')['data']), 10)
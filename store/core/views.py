@@ -80,7 +80,7 @@ def home(request):
         date_added__month = current_month,
         date_added__day = current_day
     ).all()
-    total_sales = sum(today_sales.values_list('grand_total',flat=True))
+    total_sales = sum_amount(today_sales, 'grand_total')
     context = {
         'page_title':'Home',
         'categories' : categories,
@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Category, Products
+from .models import Category, PriceHistory, Products
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'description', 'status', 'date_added', 'date_updated')
     search_fields = ('name', 'description')
@@ -11,6 +11,12 @@ class ProductsAdmin(admin.ModelAdmin):
     search_fields = ('code', 'name', 'description')
     list_filter = ('status', 'category', 'date_added', 'date_updated')
     
+class PriceHistoryAdmin(admin.ModelAdmin):
+    list_display = ('product', 'old_price', 'new_price', 'cost', 'reason', 'user', 'date_added')
+    search_fields = ('product__code', 'product__name', 'reason')
+    list_filter = ('date_added',)
+
 
 admin.site.register(Category, CategoryAdmin)
-admin.site.register(Products, ProductsAdmin)
\ No newline at end of file
+admin.site.register(Products, ProductsAdmin)
+admin.site.register(PriceHistory, PriceHistoryAdmin)
\ No newline at end of file
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        from django.db.models.signals import post_migrate
+        from .search import install_fts_after_migrate
+        post_migrate.connect(install_fts_after_migrate, sender=self)
@@ -1,10 +1,9 @@
 from django import forms
-from .models import  Products, Category
-import unicodedata
+from .models import  Products, Category, normalize_text
+from .repricing import ROUNDINGS, RULE_PERCENT, RULES
 from django.utils.text import slugify
-import re
-import unicodedata
 from django.core.exceptions import ValidationError
+from django.db.models import Q
 
 class CategoryForm(forms.ModelForm):
     class Meta:
@@ -33,20 +32,12 @@ class CategoryForm(forms.ModelForm):
     def clean_name(self):
         name = self.cleaned_data.get('name')
         if name:
-            # Normalizar el nombre: eliminar acentos, espacios extra y convertir a minúsculas
-            normalized_name = ''.join(c for c in unicodedata.normalize('NFD', name)
-                                    if unicodedata.category(c) != 'Mn')
-            normalized_name = re.sub(r'\s+', '', normalized_name.lower())
-            
-            instance = self.instance
-            # Buscar categorías existentes con nombres similares
-            existing_categories = Category.objects.exclude(id=instance.id)
-            for category in existing_categories:
-                category_normalized = ''.join(c for c in unicodedata.normalize('NFD', category.name)
-                                            if unicodedata.category(c) != 'Mn')
-                category_normalized = re.sub(r'\s+', '', category_normalized.lower())
-                if category_normalized == normalized_name:
-                    raise ValidationError(f"Ya existe una categoría similar: '{category.name}'")
+            # Busqueda por la columna normalizada (indexada), igual que en productos.
+            similar = Category.objects.exclude(pk=self.instance.pk).filter(
+                normalized_name=normalize_text(name)
+            ).first()
+            if similar:
+                raise ValidationError(f"Ya existe una categoría similar: '{similar.name}'")
         return name
 
         
@@ -137,15 +128,7 @@ class ProductsForm(forms.ModelForm):
         self.fields['status'].disabled = True
     
     
-    @staticmethod
-    def normalize_text(text):
-        if text:
-            # Eliminar acentos y convertir a minúsculas
-            text = ''.join(c for c in unicodedata.normalize('NFD', text)
-                        if unicodedata.category(c) != 'Mn')
-            # Eliminar caracteres especiales y espacios
-            text = re.sub(r'[^\w]', '', text.lower())
-        return text
+    normalize_text = staticmethod(normalize_text)
     
     def clean(self):
         cleaned_data = super().clean()
@@ -153,29 +136,59 @@ class ProductsForm(forms.ModelForm):
         code = cleaned_data.get('code')
 
         if name and code:
-            normalized_name = self.normalize_text(name)
-            normalized_code = self.normalize_text(code)
-
-            # Obtener la instancia actual si estamos editando
-            instance_id = self.instance.pk if self.instance.pk else None
+            # Busquedas por las columnas normalizadas (indexadas), no sobre todo el catalogo.
+            others = Products.objects.all()
+            if self.instance.pk:
+                others = others.exclude(pk=self.instance.pk)
 
             # Verificar duplicados de nombre
-            name_duplicates = Products.objects.all()
-            if instance_id:
-                name_duplicates = name_duplicates.exclude(pk=instance_id)
-            
-            for product in name_duplicates:
-                if self.normalize_text(product.name) == normalized_name:
-                    self.add_error('name', "Ya existe un producto con un nombre similar.")
-                    raise ValidationError("Ya existe un producto con un nombre similar.")
+            if others.filter(normalized_name=normalize_text(name)).exists():
+                self.add_error('name', "Ya existe un producto con un nombre similar.")
+                raise ValidationError("Ya existe un producto con un nombre similar.")
 
             # Verificar duplicados de código
-            code_duplicates = Products.objects.filter(code__iexact=normalized_code)
-            if instance_id:
-                code_duplicates = code_duplicates.exclude(pk=instance_id)
-            if code_duplicates.exists():
+            if others.filter(normalized_code=normalize_text(code)).exists():
                 self.add_error('code', "Ya existe un producto con este código.")
                 raise ValidationError("Ya existe un producto con este código.")
 
         return cleaned_data
-    
\ No newline at end of file
+
+
+class RepricingForm(forms.Form):
+    category = forms.ModelChoiceField(
+        queryset=Category.objects.order_by('name'), required=False, label='Categoría', empty_label='Todas',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    search = forms.CharField(
+        required=False, label='Código o nombre',
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Vino'}),
+    )
+    rule = forms.ChoiceField(choices=RULES, label='Regla', widget=forms.Select(attrs={'class': 'form-control'}))
+    value = forms.DecimalField(
+        max_digits=7, decimal_places=2, label='Porcentaje',
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01'}),
+    )
+    rounding = forms.ChoiceField(
+        choices=ROUNDINGS, label='Redondeo', widget=forms.Select(attrs={'class': 'form-control'}),
+    )
+    reason = forms.CharField(
+        required=False, max_length=255, label='Motivo',
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Lista de precios de marzo'}),
+    )
+    token = forms.CharField(required=False, widget=forms.HiddenInput)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        value = cleaned_data.get('value')
+        if value is not None and cleaned_data.get('rule') == RULE_PERCENT and value <= -100:
+            self.add_error('value', "La reducción debe ser menor al 100%.")
+        return cleaned_data
+
+    def queryset(self):
+        products = Products.objects.all()
+        if self.cleaned_data.get('category'):
+            products = products.filter(category=self.cleaned_data['category'])
+        search = self.cleaned_data.get('search')
+        if search:
+            products = products.filter(Q(code__icontains=search) | Q(name__icontains=search))
+        return products
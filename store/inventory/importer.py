@@ -0,0 +1,210 @@
+import csv
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from openpyxl import load_workbook
+
+from .models import Category, NameTrigram, Products, normalize_text, products_bulk_saved
+
+# Columnas del archivo (primera fila). description es opcional.
+REQUIRED_COLUMNS = ('code', 'name', 'category', 'price')
+OPTIONAL_COLUMNS = ('description',)
+# Campos que se actualizan cuando el codigo ya existe.
+UPDATE_FIELDS = ['name', 'normalized_name', 'category', 'description', 'price', 'status', 'date_updated']
+
+
+class ProductImportError(Exception):
+    """El archivo no se puede importar (formato o columnas)."""
+
+
+def cell_text(value):
+    """Texto de una celda; los numeros enteros de Excel (codigos de barras) pierden el '.0'."""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def read_rows(path):
+    """
+    Recorre el archivo fila por fila sin cargarlo entero: CSV con csv.reader y
+    XLSX con openpyxl en modo read_only. Devuelve (numero de fila, {columna: texto}).
+    """
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix == '.csv':
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            yield from map_rows(csv.reader(f))
+    elif suffix in ('.xlsx', '.xlsm'):
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            yield from map_rows(workbook.active.iter_rows(values_only=True))
+        finally:
+            workbook.close()
+    else:
+        raise ProductImportError(f"Formato no soportado: {path.suffix}. Use CSV o XLSX.")
+
+
+def map_rows(rows):
+    rows = iter(rows)
+    header = [cell_text(value).lower() for value in next(rows, [])]
+    missing = [column for column in REQUIRED_COLUMNS if column not in header]
+    if missing:
+        raise ProductImportError(f"Faltan columnas: {', '.join(missing)}.")
+    columns = [(index, name) for index, name in enumerate(header) if name in REQUIRED_COLUMNS + OPTIONAL_COLUMNS]
+    for number, row in enumerate(rows, start=2):
+        values = {name: cell_text(row[index]) if index < len(row) else '' for index, name in columns}
+        if any(values.values()):
+            yield number, values
+
+
+class ProductImporter:
+    """
+    Crea o actualiza productos desde un archivo, por lotes.
+
+    Los codigos, nombres normalizados y categorias existentes se cargan una vez
+    en memoria; cada fila se valida contra esos conjuntos (que se actualizan con
+    las filas aceptadas) y se escribe con bulk_create, como upsert para los
+    existentes. Los productos se identifican por codigo normalizado; la cantidad
+    y el costo no se importan, los mantienen las compras. Las filas con error se
+    informan y no se guardan.
+    """
+
+    def __init__(self, batch_size=1000, create_categories=False, dry_run=False):
+        self.batch_size = batch_size
+        self.create_categories = create_categories
+        self.dry_run = dry_run
+        self.errors = []
+        self.created = []
+        self.updated = []
+        self.fields = {name: Products._meta.get_field(name) for name in ('code', 'name', 'description', 'price')}
+
+    def load(self):
+        self.products = {}
+        self.names = {}
+        # Se cargan todos los campos: las actualizaciones se escriben como INSERT con upsert.
+        for product in Products.objects.defer('description').iterator(chunk_size=5000):
+            self.products[product.normalized_code] = product
+            if product.normalized_name:
+                self.names[product.normalized_name] = product.pk
+        self.categories = dict(Category.objects.exclude(normalized_name=None).values_list('normalized_name', 'pk'))
+
+    def run(self, rows):
+        self.load()
+        self.seen = set()
+        self.new_names = {}
+        self.renamed = {}
+        batch = []
+        try:
+            for number, values in rows:
+                try:
+                    batch.append(self.build(values))
+                except ValidationError as e:
+                    self.errors.append((number, '; '.join(e.messages)))
+                    continue
+                if len(batch) >= self.batch_size:
+                    self.write(batch)
+                    batch = []
+            self.write(batch)
+        finally:
+            # Tambien si el archivo falla a la mitad: los lotes ya guardados quedan indexados.
+            if not self.dry_run:
+                self.finish()
+        return self
+
+    def finish(self):
+        """Indexa los nombres de una vez y avisa del cambio de catalogo."""
+        NameTrigram.index_names(NameTrigram.KIND_PRODUCT, self.new_names, replace=False)
+        NameTrigram.index_names(NameTrigram.KIND_PRODUCT, self.renamed)
+        products_bulk_saved.send(sender=Products, created=self.created, updated=self.updated)
+
+    def clean(self, name, value):
+        try:
+            return self.fields[name].clean(value, None)
+        except ValidationError as e:
+            raise ValidationError(f"{name}: {'; '.join(e.messages)}")
+
+    def category_id(self, name):
+        key = normalize_text(name)
+        if not key:
+            raise ValidationError("category: Este campo no puede estar en blanco.")
+        if key not in self.categories:
+            if not self.create_categories:
+                raise ValidationError(f"No existe la categoría '{name}'.")
+            self.categories[key] = None if self.dry_run else Category.objects.create(name=name, description='').pk
+        return self.categories[key]
+
+    def build(self, values):
+        code = self.clean('code', values['code'])
+        name = self.clean('name', values['name'])
+        description = self.clean('description', values.get('description', ''))
+        price = self.clean('price', values['price'])
+        if price <= 0:
+            raise ValidationError("El precio debe ser mayor que cero.")
+        category_id = self.category_id(values['category'])
+
+        normalized_code = normalize_text(code)
+        normalized_name = normalize_text(name)
+        if normalized_code in self.seen:
+            raise ValidationError(f"El código '{code}' se repite en el archivo.")
+        product = self.products.get(normalized_code)
+        owner = self.names.get(normalized_name)
+        if owner is not None and (product is None or owner != product.pk):
+            raise ValidationError("Ya existe un producto con un nombre similar.")
+        self.seen.add(normalized_code)
+
+        if product is None:
+            product = Products(code=code, normalized_code=normalized_code, quantity=0)
+        else:
+            product.previous_name = product.normalized_name
+            product.previous_state = product.saved_active_state()
+            self.names.pop(product.normalized_name, None)
+        product.name = name
+        product.normalized_name = normalized_name or None
+        product.category_id = category_id
+        product.description = description
+        product.price = price
+        product.status = product.derived_status()
+        if normalized_name:
+            # El pk se conoce al escribir el lote; mientras tanto el nombre queda reservado.
+            self.names[normalized_name] = product.pk or product
+        return product
+
+    def write(self, batch):
+        new = [product for product in batch if product.pk is None]
+        existing = [product for product in batch if product.pk is not None]
+        if not batch or self.dry_run:
+            self.created.extend(product.pk for product in new)
+            self.updated.extend(product.pk for product in existing)
+            return
+        with transaction.atomic():
+            Products.objects.bulk_create(new, batch_size=self.batch_size)
+            renamed = {product.pk for product in existing if product.previous_name != product.normalized_name}
+            if renamed:
+                # Se liberan los nombres antes del UPDATE para que un intercambio
+                # de nombres dentro del lote no choque con la restriccion unica.
+                Products.objects.filter(pk__in=renamed).update(normalized_name=None)
+            # Upsert (INSERT ... ON CONFLICT DO UPDATE): bulk_update arma un CASE por
+            # fila y por campo y es varias veces mas lento con lotes grandes.
+            Products.objects.bulk_create(
+                existing, batch_size=self.batch_size,
+                update_conflicts=True, unique_fields=['id'], update_fields=UPDATE_FIELDS,
+            )
+
+            Category.adjust_active_counts(Category.active_count_deltas(
+                (getattr(product, 'previous_state', (None, False)),
+                 (product.category_id, product.status == Products.STATUS_ACTIVE))
+                for product in batch
+            ))
+
+        self.new_names.update((product.pk, product.name) for product in new)
+        self.renamed.update((product.pk, product.name) for product in existing if product.pk in renamed)
+
+        for product in new:
+            self.products[product.normalized_code] = product
+            if product.normalized_name:
+                self.names[product.normalized_name] = product.pk
+        self.created.extend(product.pk for product in new)
+        self.updated.extend(product.pk for product in existing)
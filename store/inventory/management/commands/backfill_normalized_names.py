@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.models import Category, Products, normalize_text
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcula normalized_name y normalized_code de los productos existentes y "
+        "normalized_name de las categorias. Si dos registros tienen el mismo nombre "
+        "normalizado, el mas antiguo conserva el valor y los demas quedan en NULL y "
+        "se listan para que se renombren."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        with transaction.atomic():
+            products = self.backfill(Products, ['code'], batch_size)
+            categories = self.backfill(Category, [], batch_size)
+        self.stdout.write(self.style.SUCCESS(
+            f"Productos actualizados: {products}. Categorias actualizadas: {categories}."
+        ))
+
+    def backfill(self, model, extra_fields, batch_size):
+        seen = {}
+        duplicates = []
+        objs = []
+        for obj in model.objects.only('id', 'name', *extra_fields).order_by('pk').iterator(chunk_size=batch_size):
+            name = normalize_text(obj.name) or None
+            if name in seen:
+                duplicates.append((obj, seen[name]))
+                name = None
+            elif name:
+                seen[name] = obj
+            obj.normalized_name = name
+            if 'code' in extra_fields:
+                obj.normalized_code = normalize_text(obj.code)
+            objs.append(obj)
+
+        # Primero se vacia la columna para que el orden del bulk_update no choque con la restriccion unica.
+        model.objects.update(normalized_name=None)
+        fields = ['normalized_name'] + [f'normalized_{field}' for field in extra_fields]
+        model.objects.bulk_update(objs, fields, batch_size=batch_size)
+
+        for obj, original in duplicates:
+            self.stdout.write(self.style.WARNING(
+                f"Nombre duplicado en {model._meta.model_name}: '{obj.name}' (id {obj.pk}) "
+                f"coincide con '{original.name}' (id {original.pk})."
+            ))
+        return len(objs)
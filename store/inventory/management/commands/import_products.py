@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.importer import ProductImporter, ProductImportError, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa productos desde un archivo CSV o XLSX con las columnas code, name, "
+        "category, price y opcionalmente description. Los codigos existentes se "
+        "actualizan y los nuevos se crean; las filas con error se listan y se omiten."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Archivo .csv o .xlsx.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--create-categories', action='store_true', help="Crear las categorias que no existan.")
+        parser.add_argument('--dry-run', action='store_true', help="Solo validar, sin guardar.")
+        parser.add_argument('--max-errors', type=int, default=50, help="Errores que se muestran.")
+
+    def handle(self, *args, **options):
+        importer = ProductImporter(
+            batch_size=options['batch_size'],
+            create_categories=options['create_categories'],
+            dry_run=options['dry_run'],
+        )
+        start = time.perf_counter()
+        try:
+            importer.run(read_rows(options['path']))
+        except (ProductImportError, OSError) as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - start
+
+        for number, message in importer.errors[:options['max_errors']]:
+            self.stdout.write(self.style.WARNING(f"Fila {number}: {message}"))
+        if len(importer.errors) > options['max_errors']:
+            self.stdout.write(self.style.WARNING(f"... y {len(importer.errors) - options['max_errors']} errores mas."))
+        prefix = "Simulacion: " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{len(importer.created)} creados, {len(importer.updated)} actualizados, "
+            f"{len(importer.errors)} filas con error en {elapsed:.1f} s."
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from inventory.models import Category, Products
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula el contador de productos activos y el estado de todas las "
+        "categorias. Se usa una vez despues de migrar o si los contadores se desfasan."
+    )
+
+    def handle(self, *args, **options):
+        active = (
+            Products.objects.filter(category=OuterRef('pk'), status=Products.STATUS_ACTIVE)
+            .order_by().values('category').annotate(total=Count('pk')).values('total')
+        )
+        with transaction.atomic():
+            updated = Category.objects.update(
+                active_product_count=Coalesce(Subquery(active, output_field=IntegerField()), 0),
+            )
+            Category.objects.update(
+                status=Case(When(active_product_count__gt=0, then=Value(1)), default=Value(0)),
+            )
+        self.stdout.write(self.style.SUCCESS(f"Contadores recalculados en {updated} categorias."))
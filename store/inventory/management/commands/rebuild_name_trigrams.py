@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventory.models import NameTrigram
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye el indice de trigramas de los nombres de productos y categorias. "
+        "Se usa una vez despues de migrar; luego el indice se mantiene al guardar."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            NameTrigram.objects.all().delete()
+            for kind in NameTrigram.KINDS:
+                names = dict(NameTrigram.model_for(kind).objects.values_list('pk', 'name'))
+                NameTrigram.index_names(kind, names, replace=False)
+                self.stdout.write(f"{kind}: {len(names)} nombres")
+        self.stdout.write(self.style.SUCCESS("Indice de trigramas reconstruido."))
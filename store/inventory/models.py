@@ -1,36 +1,101 @@
+import re
 import unicodedata
 from datetime import datetime
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models.signals import post_save, pre_save
-from django.dispatch import receiver
+from django.db import connection, models, transaction
+from django.db.models import Case, Count, ExpressionWrapper, F, FloatField, Max, Value, When
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
 from django.utils import timezone
 
 
 from decimal import Decimal
+
+
+def normalize_text(text):
+    """Texto sin acentos, en minusculas y sin espacios ni signos, para detectar nombres duplicados."""
+    if not text:
+        return ''
+    text = ''.join(c for c in unicodedata.normalize('NFD', text) if unicodedata.category(c) != 'Mn')
+    return re.sub(r'[^\w]', '', text.lower())
+
+
 class Category(models.Model):
     name = models.TextField()
     description = models.TextField()
     status = models.IntegerField(default=1) 
     date_added = models.DateTimeField(default=timezone.now) 
     date_updated = models.DateTimeField(auto_now=True) 
+    # Productos activos de la categoria. Lo mantienen Products.save y las
+    # actualizaciones en bloque del POS; el estado se deriva de este contador.
+    active_product_count = models.PositiveIntegerField(default=0)
+    COUNTER_FIELDS = ('active_product_count', 'status')
+    # Nombre normalizado con normalize_text(), igual que en Products; se calcula en save().
+    # Admite NULL solo para categorias duplicadas de antes de la columna.
+    normalized_name = models.CharField(max_length=255, unique=True, null=True, editable=False)
 
     def __str__(self):
         return self.name
     
     def check_and_update_status(self):
-        if self.pk:  
-            if self.products_set.filter(status=1).count() == 0:
-                self.status = 0
-            else:
-                self.status = 1
-            
-            Category.objects.filter(pk=self.pk).update(status=self.status)
+        """Vuelve a contar los productos activos (el contador normalmente se mantiene solo)."""
+        if self.pk:
+            self.active_product_count = self.products_set.filter(status=Products.STATUS_ACTIVE).count()
+            self.status = self.derived_status()
+            Category.objects.filter(pk=self.pk).update(
+                active_product_count=self.active_product_count, status=self.status,
+            )
+
+    def derived_status(self):
+        return 1 if self.active_product_count > 0 else 0
     
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'name' in update_fields:
+            self.normalized_name = normalize_text(self.name) or None
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'normalized_name'}
+        if self._state.adding:
+            self.status = self.derived_status()
+        elif update_fields is None:
+            # El contador y el estado de la instancia pueden estar desactualizados.
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
         super().save(*args, **kwargs)
-        self.check_and_update_status() 
+
+    @staticmethod
+    def active_count_deltas(changes):
+        """
+        Cambios de productos activos por categoria a partir de pares (antes, despues),
+        cada uno (category_id, activo) como lo devuelve Products.saved_active_state().
+        """
+        deltas = {}
+        for before, after in changes:
+            if before == after:
+                continue
+            if before[1]:
+                deltas[before[0]] = deltas.get(before[0], 0) - 1
+            if after[1]:
+                deltas[after[0]] = deltas.get(after[0], 0) + 1
+        return deltas
+
+    @classmethod
+    def adjust_active_counts(cls, deltas):
+        """
+        Suma a cada categoria su cambio de productos activos ({category_id: delta})
+        y recalcula el estado en el mismo UPDATE.
+        """
+        for category_id, delta in sorted(deltas.items()):
+            if category_id is None or not delta:
+                continue
+            cls.objects.filter(pk=category_id).update(
+                active_product_count=F('active_product_count') + delta,
+                status=Case(When(active_product_count__gt=-delta, then=Value(1)), default=Value(0)),
+            )
         
 
 class Products(models.Model):
@@ -51,12 +116,17 @@ class Products(models.Model):
     date_added = models.DateTimeField(default=timezone.now)
     date_updated = models.DateTimeField(auto_now=True)
     quantity = models.PositiveIntegerField(default=0)
+    # Nombre y codigo normalizados con normalize_text(); se calculan en save().
+    # normalized_name admite NULL solo para productos duplicados de antes de la columna.
+    normalized_name = models.CharField(max_length=255, unique=True, null=True, editable=False)
+    normalized_code = models.CharField(max_length=100, db_index=True, default='', editable=False)
 
     class Meta:
         indexes = [
             models.Index(fields=['code']),
             models.Index(fields=['name']),
             models.Index(fields=['status']),
+            models.Index(fields=['date_updated']),
         ]
 
     def __str__(self):
@@ -66,33 +136,41 @@ class Products(models.Model):
         quantity_sold = int(quantity_sold)
         if self.quantity >= quantity_sold:
             self.quantity -= quantity_sold
-            self.save(update_fields=['quantity'])
+            self.save(update_fields=['quantity'], validate=False)
             return True
         return False
 
     def increase_quantity(self, quantity_added):
         self.quantity += quantity_added
-        self.save(update_fields=['quantity'])
-        self.update_status()
+        self.save(update_fields=['quantity'], validate=False)
     # 1last copy
     def decrease_quantity(self, quantity_removed):
         self.quantity -= quantity_removed
         if self.quantity < 0:
             self.quantity = 0
-        self.save(update_fields=['quantity'])
-        self.update_status()
+        self.save(update_fields=['quantity'], validate=False)
         
     def update_quantity_on_purchase(self, quantity_difference):
         self.quantity += quantity_difference
         if self.quantity < 0:
             self.quantity = 0
-        self.save(update_fields=['quantity'])
-        self.update_status()
+        self.save(update_fields=['quantity'], validate=False)
 
     def update_cost(self, new_cost):
         self.cost = new_cost
-        self.save(update_fields=['cost'])
-        self.update_status()
+        self.save(update_fields=['cost'], validate=False)
+
+    def apply_purchase(self, quantity_difference, new_cost):
+        """Cantidad y costo de una compra en un solo UPDATE."""
+        self.quantity = max(self.quantity + quantity_difference, 0)
+        self.cost = new_cost
+        self.save(update_fields=['quantity', 'cost'], validate=False)
+
+    def revert_purchase(self, quantity_removed, cost_removed):
+        """Deshace una compra eliminada en un solo UPDATE."""
+        self.quantity = max(self.quantity - quantity_removed, 0)
+        self.cost = self.calculate_new_cost_after_deletion(cost_removed)
+        self.save(update_fields=['quantity', 'cost'], validate=False)
 
     def clean(self):
         super().clean()
@@ -101,25 +179,71 @@ class Products(models.Model):
         if self.cost < Decimal('0'):
             raise ValidationError("El costo no puede ser negativo.")
     
-    def save(self, *args, **kwargs):
-        self.full_clean()
-        super().save(*args, **kwargs)
-        self.update_status()
-        
-    def update_status(self):
+    def save(self, *args, validate=True, **kwargs):
+        """
+        El estado se calcula antes de guardar y se escribe en el mismo UPDATE.
+        Los caminos internos que solo cambian cantidad o costo pasan
+        validate=False para no repetir full_clean (y su consulta de codigo unico).
+        """
+        update_fields = kwargs.get('update_fields')
+        if not update_fields or 'name' in update_fields:
+            self.normalized_name = normalize_text(self.name) or None
+        if not update_fields or 'code' in update_fields:
+            self.normalized_code = normalize_text(self.code)
+        if validate:
+            self.full_clean()
+        status = self.derived_status()
+        if update_fields:
+            # Las sincronizaciones del POS dependen de date_updated.
+            update_fields = {*update_fields, 'date_updated'}
+            if 'name' in update_fields:
+                update_fields.add('normalized_name')
+            if 'code' in update_fields:
+                update_fields.add('normalized_code')
+            if status != self.status:
+                update_fields.add('status')
+            kwargs['update_fields'] = update_fields
+        self.status = status
+
+        before = self.saved_active_state()
+        after = (self.category_id, status == self.STATUS_ACTIVE)
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+            if before != after:
+                Category.adjust_active_counts(Category.active_count_deltas([(before, after)]))
+        self._saved_active_state = after
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'category_id' in instance.__dict__ and 'status' in instance.__dict__:
+            instance._saved_active_state = (instance.category_id, instance.status == cls.STATUS_ACTIVE)
+        return instance
+
+    def saved_active_state(self):
+        """(categoria, activo) tal como esta guardado, para ajustar los contadores de Category."""
+        if self._state.adding or self.pk is None:
+            return (None, False)
+        state = getattr(self, '_saved_active_state', None)
+        if state is None:
+            row = Products.objects.filter(pk=self.pk).values_list('category_id', 'status').first()
+            state = (row[0], row[1] == self.STATUS_ACTIVE) if row else (None, False)
+        return state
+
+    def derived_status(self):
         if self.quantity > 0 and self.cost > Decimal('0') and self.price > Decimal('0'):
-            if self.status != self.STATUS_ACTIVE:
-                self.status = self.STATUS_ACTIVE
-                self.save(update_fields=['status'])
-        else:
-            if self.status != self.STATUS_INACTIVE:
-                self.status = self.STATUS_INACTIVE
-                self.save(update_fields=['status'])
+            return self.STATUS_ACTIVE
+        return self.STATUS_INACTIVE
+
+    def update_status(self):
+        status = self.derived_status()
+        if self.status != status:
+            self.status = status
+            self.save(update_fields=['status'], validate=False)
 
     def update_cost_after_deletion(self, cost_removed):
         self.cost = self.calculate_new_cost_after_deletion(cost_removed)
-        self.save(update_fields=['cost'])
-        self.update_status()
+        self.save(update_fields=['cost'], validate=False)
     
     def calculate_new_cost_after_deletion(self, cost_removed):
         return max(self.cost - cost_removed, Decimal('0'))
@@ -143,4 +267,165 @@ class Products(models.Model):
         if self.cost > 0:
             return (self.price - self.cost) / self.cost
         return None
-    # !no funciono porbar solo la eliminacion don pruchase
\ No newline at end of file
+    # !no funciono porbar solo la eliminacion don pruchase
+
+
+class PriceHistory(models.Model):
+    """Cambio de precio de un producto hecho por un repreciado en bloque."""
+    product = models.ForeignKey(Products, on_delete=models.CASCADE, related_name='price_history')
+    old_price = models.DecimalField(max_digits=10, decimal_places=2)
+    new_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Costo del producto al momento del cambio, para reconstruir el margen.
+    cost = models.DecimalField(max_digits=18, decimal_places=8)
+    reason = models.CharField(max_length=255, blank=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    date_added = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'date_added']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.old_price} -> {self.new_price}"
+
+
+def name_trigrams(text):
+    """Trigramas de cada palabra normalizada, con dos espacios al inicio y uno al final."""
+    grams = set()
+    for word in (normalize_text(word) for word in (text or '').split()):
+        if word:
+            padded = f'  {word} '
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NameTrigram(models.Model):
+    """
+    Indice de trigramas de los nombres de productos y categorias, para sugerir
+    nombres parecidos mientras se escribe. Se mantiene al guardar y eliminar.
+    """
+    KIND_PRODUCT = 'product'
+    KIND_CATEGORY = 'category'
+    KINDS = (KIND_PRODUCT, KIND_CATEGORY)
+    # Similitud minima (coeficiente de Jaccard de los trigramas) para sugerir un nombre.
+    MIN_SIMILARITY = 0.3
+    # Nombres a partir de los cuales index_names recrea los indices en vez de
+    # actualizarlos fila por fila (SQLite los construye ordenando, mucho mas rapido).
+    BULK_INDEX_SIZE = 20000
+
+    kind = models.CharField(max_length=10)
+    object_id = models.BigIntegerField()
+    trigram = models.CharField(max_length=3)
+    # Cantidad de trigramas del nombre completo.
+    size = models.PositiveSmallIntegerField()
+
+    class Meta:
+        indexes = [
+            # Cubre la busqueda: se resuelve sin leer la tabla.
+            models.Index(fields=['kind', 'trigram', 'object_id', 'size']),
+            # Para reindexar: con (kind, object_id) SQLite lo elegia tambien para
+            # agrupar las busquedas y recorria todo el tipo.
+            models.Index(fields=['object_id', 'kind']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.trigram}"
+
+    @classmethod
+    def model_for(cls, kind):
+        return Products if kind == cls.KIND_PRODUCT else Category
+
+    @classmethod
+    def index_name(cls, kind, object_id, name):
+        grams = name_trigrams(name)
+        cls.objects.filter(kind=kind, object_id=object_id).delete()
+        cls.objects.bulk_create([
+            cls(kind=kind, object_id=object_id, trigram=gram, size=len(grams)) for gram in grams
+        ])
+
+    @classmethod
+    def index_names(cls, kind, names, replace=True):
+        """
+        Indexa muchos nombres a la vez ({object_id: nombre}), para las importaciones.
+        Las filas se insertan con executemany: crear un objeto del ORM por trigrama
+        es varias veces mas lento. Desde BULK_INDEX_SIZE nombres los indices de la
+        tabla se borran y se vuelven a crear al final, en la misma transaccion.
+        """
+        rows = []
+        for object_id, name in names.items():
+            grams = name_trigrams(name)
+            rows.extend((kind, object_id, gram, len(grams)) for gram in grams)
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            if replace:
+                ids = list(names)
+                for start in range(0, len(ids), 500):
+                    cls.objects.filter(object_id__in=ids[start:start + 500], kind=kind).delete()
+            rebuild = len(names) >= cls.BULK_INDEX_SIZE
+            if rebuild:
+                for index in cls._meta.indexes:
+                    cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+            cursor.executemany(f'INSERT INTO {table} (kind, object_id, trigram, size) VALUES (%s, %s, %s, %s)', rows)
+            if rebuild:
+                for index in cls._meta.indexes:
+                    columns = ', '.join(connection.ops.quote_name(field) for field in index.fields)
+                    cursor.execute(f'CREATE INDEX {connection.ops.quote_name(index.name)} ON {table} ({columns})')
+
+    @classmethod
+    def remove_name(cls, kind, object_id):
+        cls.objects.filter(kind=kind, object_id=object_id).delete()
+
+    @classmethod
+    def similar(cls, text, kind, limit=5, exclude=None):
+        """Los `limit` nombres mas parecidos a `text`: [{'id', 'name', 'score'}]."""
+        grams = name_trigrams(text)
+        if not grams:
+            return []
+        matches = cls.objects.filter(kind=kind, trigram__in=grams)
+        if exclude is not None:
+            matches = matches.exclude(object_id=exclude)
+        scored = (
+            matches.values('object_id')
+            .annotate(hits=Count('object_id'), total=Max('size'))
+            .annotate(score=ExpressionWrapper(
+                F('hits') * 1.0 / (Value(len(grams)) + F('total') - F('hits')), output_field=FloatField(),
+            ))
+            .filter(score__gte=cls.MIN_SIMILARITY)
+            .order_by('-score', 'object_id')[:limit]
+        )
+        scores = {row['object_id']: row['score'] for row in scored}
+        names = dict(cls.model_for(kind).objects.filter(pk__in=scores).values_list('pk', 'name'))
+        return [
+            {'id': object_id, 'name': names[object_id], 'score': round(score, 3)}
+            for object_id, score in scores.items() if object_id in names
+        ]
+
+
+# Se envia despues de escrituras en bloque de Products (bulk_create/bulk_update),
+# que no disparan post_save. Argumentos: created y updated, listas de ids.
+products_bulk_saved = Signal()
+
+
+@receiver(post_delete, sender=Products)
+def product_deleted(sender, instance, **kwargs):
+    if instance.status == Products.STATUS_ACTIVE and instance.category_id:
+        Category.adjust_active_counts({instance.category_id: -1})
+    NameTrigram.remove_name(NameTrigram.KIND_PRODUCT, instance.pk)
+
+
+@receiver(post_save, sender=Products)
+def product_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'name' in update_fields:
+        NameTrigram.index_name(NameTrigram.KIND_PRODUCT, instance.pk, instance.name)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'name' in update_fields:
+        NameTrigram.index_name(NameTrigram.KIND_CATEGORY, instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted(sender, instance, **kwargs):
+    NameTrigram.remove_name(NameTrigram.KIND_CATEGORY, instance.pk)
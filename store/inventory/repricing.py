@@ -0,0 +1,125 @@
+import hashlib
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Category, PriceHistory, Products, products_bulk_saved
+
+RULE_MARKUP = 'markup'
+RULE_PERCENT = 'percent'
+RULES = [
+    # precio = costo * (1 + valor / 100)
+    (RULE_MARKUP, 'Margen sobre el costo (%)'),
+    # precio = precio actual * (1 + valor / 100)
+    (RULE_PERCENT, 'Cambio del precio actual (%)'),
+]
+ROUNDINGS = [
+    ('0.01', 'Al centavo'),
+    ('0.05', 'A 0.05'),
+    ('0.10', 'A 0.10'),
+    ('1', 'Al entero'),
+    ('0.99', 'Terminar en .99'),
+]
+CENT = Decimal('0.01')
+# Products.price tiene max_digits=10 y decimal_places=2.
+MAX_PRICE = Decimal('99999999.99')
+
+
+class RepricingError(Exception):
+    pass
+
+
+def round_price(price, rounding):
+    if rounding == '0.99':
+        return max(price.quantize(Decimal('1'), rounding=ROUND_HALF_UP), Decimal('1')) - CENT
+    step = Decimal(rounding)
+    return ((price / step).quantize(Decimal('1'), rounding=ROUND_HALF_UP) * step).quantize(CENT)
+
+
+def margin(price, cost):
+    """Margen sobre el costo en porcentaje, igual que Products.profit_margin."""
+    if cost > 0:
+        return ((price - cost) / cost * 100).quantize(Decimal('0.1'))
+    return None
+
+
+def preview(queryset, rule, value, rounding):
+    """
+    Precio nuevo de cada producto del queryset, calculado en una sola pasada sobre
+    una consulta de valores (sin instanciar los modelos). Cada fila trae el margen
+    antes y despues; `skipped` explica por que un producto no se puede repreciar.
+    """
+    factor = 1 + Decimal(value) / 100
+    rows = []
+    for product in queryset.order_by('pk').values('id', 'code', 'name', 'category__name', 'cost', 'price'):
+        cost, price = product['cost'], product['price']
+        row = {**product, 'new_price': price, 'changed': False, 'skipped': ''}
+        if rule == RULE_MARKUP and cost <= 0:
+            row['skipped'] = "Sin costo"
+        else:
+            new_price = round_price((cost if rule == RULE_MARKUP else price) * factor, rounding)
+            if not Decimal('0') < new_price <= MAX_PRICE:
+                row['skipped'] = "Precio resultante inválido"
+            else:
+                row['new_price'] = new_price
+                row['changed'] = new_price != price
+        row['margin'] = margin(price, cost)
+        row['new_margin'] = margin(row['new_price'], cost)
+        row['margin_delta'] = (
+            row['new_margin'] - row['margin'] if row['margin'] is not None else None
+        )
+        rows.append(row)
+    return rows
+
+
+def summary(rows):
+    changed = [row for row in rows if row['changed']]
+    margins = [row for row in changed if row['margin'] is not None]
+    return {
+        'total': len(rows),
+        'changed': len(changed),
+        'skipped': sum(1 for row in rows if row['skipped']),
+        'margin': sum(row['margin'] for row in margins) / len(margins) if margins else None,
+        'new_margin': sum(row['new_margin'] for row in margins) / len(margins) if margins else None,
+    }
+
+
+def price_token(rows):
+    """Huella de los precios de la vista previa; si cambian antes de aplicar, se rechaza."""
+    digest = hashlib.sha1()
+    for row in rows:
+        if row['changed']:
+            digest.update(f"{row['id']}:{row['price']}:{row['new_price']};".encode())
+    return digest.hexdigest()
+
+
+def apply(queryset, rule, value, rounding, token, user=None, reason=''):
+    """
+    Aplica el repreciado de la vista previa con un solo bulk_update y registra el
+    historial de precios, todo en una transaccion. Devuelve los productos cambiados.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        rows = preview(queryset, rule, value, rounding)
+        if price_token(rows) != token:
+            raise RepricingError("Los precios cambiaron desde la vista previa. Revise los cambios de nuevo.")
+        changes = {row['id']: row['new_price'] for row in rows if row['changed']}
+        products = list(Products.objects.filter(pk__in=changes))
+        states = []
+        history = []
+        for product in products:
+            before = product.saved_active_state()
+            history.append(PriceHistory(
+                product=product, old_price=product.price, new_price=changes[product.pk],
+                cost=product.cost, reason=reason, user=user, date_added=now,
+            ))
+            product.price = changes[product.pk]
+            product.status = product.derived_status()
+            product.date_updated = now
+            states.append((before, (product.category_id, product.status == Products.STATUS_ACTIVE)))
+        Products.objects.bulk_update(products, ['price', 'status', 'date_updated'])
+        Category.adjust_active_counts(Category.active_count_deltas(states))
+        PriceHistory.objects.bulk_create(history)
+        products_bulk_saved.send(sender=Products, created=[], updated=[product.pk for product in products])
+    return len(products)
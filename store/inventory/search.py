@@ -0,0 +1,109 @@
+import re
+import unicodedata
+
+from django.db import connections
+
+from .models import Category, Products
+
+FTS_TABLE = 'inventory_products_fts'
+# Peso de cada columna en bm25: un codigo exacto pesa mas que una palabra de la descripcion.
+FTS_WEIGHTS = {'code': 10.0, 'name': 5.0, 'description': 1.0, 'category': 2.0}
+
+PRODUCTS = Products._meta.db_table
+CATEGORIES = Category._meta.db_table
+CATEGORY_NAME = f"COALESCE((SELECT name FROM {CATEGORIES} WHERE id = new.category_id), '')"
+
+# Tabla FTS5 con el rowid igual al id del producto. unicode61 con
+# remove_diacritics 2 quita acentos y mayusculas igual que normalize_text().
+# Los triggers la mantienen con cualquier escritura (save, update, bulk_create
+# o bulk_update), no solo con Products.save().
+FTS_SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        code, name, description, category, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    f"""
+    INSERT INTO {FTS_TABLE} (rowid, code, name, description, category)
+    SELECT p.id, p.code, p.name, p.description, COALESCE(c.name, '')
+    FROM {PRODUCTS} p LEFT JOIN {CATEGORIES} c ON c.id = p.category_id
+    """,
+]
+FTS_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON {PRODUCTS} BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, code, name, description, category)
+        VALUES (new.id, new.code, new.name, new.description, {CATEGORY_NAME});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+    AFTER UPDATE OF code, name, description, category_id ON {PRODUCTS} BEGIN
+        UPDATE {FTS_TABLE}
+        SET code = new.code, name = new.name, description = new.description, category = {CATEGORY_NAME}
+        WHERE rowid = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON {PRODUCTS} BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_category AFTER UPDATE OF name ON {CATEGORIES} BEGIN
+        UPDATE {FTS_TABLE} SET category = new.name
+        WHERE rowid IN (SELECT id FROM {PRODUCTS} WHERE category_id = new.id);
+    END
+    """,
+]
+
+
+def install_fts(using):
+    """Crea la tabla FTS5 (llenandola con los productos existentes) y sus triggers si no existen."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        tables = connection.introspection.table_names(cursor)
+        if PRODUCTS not in tables:
+            return
+        if FTS_TABLE not in tables:
+            for statement in FTS_SCHEMA:
+                cursor.execute(statement)
+        for statement in FTS_TRIGGERS:
+            cursor.execute(statement)
+
+
+def install_fts_after_migrate(sender, using, **kwargs):
+    install_fts(using)
+
+
+def match_query(text):
+    """
+    Consulta MATCH para lo que escribe el usuario, separada en palabras igual
+    que el indice: sin acentos ni mayusculas y cortando en los signos, asi
+    "coca-cola" busca "coca"* "cola"*. Cada palabra se busca como prefijo;
+    todas deben aparecer.
+    """
+    text = ''.join(c for c in unicodedata.normalize('NFD', text or '') if unicodedata.category(c) != 'Mn')
+    return ' '.join(f'"{token}"*' for token in re.findall(r'\w+', text.lower()))
+
+
+def search_products(queryset, text):
+    """
+    Filtra el queryset de Products con la tabla FTS5 y lo ordena por relevancia
+    (bm25, menor es mejor) en la columna search_rank.
+    """
+    query = match_query(text)
+    if not query:
+        return queryset.none()
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS.values())
+    # La tabla FTS se une en la misma consulta: bm25() solo se calcula dentro de
+    # la busqueda MATCH, y una subconsulta por fila repetiria la busqueda completa.
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = {PRODUCTS}.id', f'{FTS_TABLE} MATCH %s'],
+        params=[query],
+        select={'search_rank': f'bm25({FTS_TABLE}, {weights})'},
+        order_by=['search_rank', 'pk'],
+    )
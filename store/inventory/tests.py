@@ -1,3 +1,368 @@
+import csv
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.core.management import CommandError, call_command
 from django.test import TestCase
+from django.urls import reverse
+from openpyxl import Workbook
+
+from .forms import CategoryForm, ProductsForm
+from . import repricing
+from .models import Category, NameTrigram, PriceHistory, Products
+from .search import match_query, search_products
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Bebidas', description='')
+        cls.coca = cls.product('750', 'Coca-Cola 600ml')
+        cls.seven = cls.product('751', '7-Up lata')
+        cls.sauce = cls.product('752', 'Salsa A-1')
+        cls.coffee = cls.product('753', 'Café Molido')
+
+    @classmethod
+    def product(cls, code, name):
+        return Products.objects.create(code=code, name=name, category=cls.category, price=10, quantity=5)
+
+    def search(self, text):
+        return list(search_products(Products.objects.all(), text))
+
+    def test_match_query_splits_like_the_index(self):
+        self.assertEqual(match_query('Coca-Cola'), '"coca"* "cola"*')
+        self.assertEqual(match_query('  café, molido '), '"cafe"* "molido"*')
+        self.assertEqual(match_query('-- ,'), '')
+
+    def test_punctuated_queries(self):
+        self.assertEqual(self.search('coca-cola'), [self.coca])
+        self.assertEqual(self.search('coca cola'), [self.coca])
+        self.assertEqual(self.search('7-up'), [self.seven])
+        self.assertEqual(self.search('A-1'), [self.sauce])
+
+    def test_accented_queries(self):
+        self.assertEqual(self.search('CAFÉ mol'), [self.coffee])
+        self.assertEqual(self.search('cafe'), [self.coffee])
+
+    def test_index_follows_updates(self):
+        self.coca.name = 'Pepsi 600ml'
+        self.coca.save()
+        self.assertEqual(self.search('coca'), [])
+        self.assertEqual(self.search('pepsi'), [self.coca])
+        self.assertEqual(self.search('bebidas pepsi'), [self.coca])
+
+
+class NormalizedNameTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Abarrotes', description='')
+        cls.coffee = Products.objects.create(
+            code='A-1', name='Café Molido', category=cls.category, price=10, quantity=5,
+        )
+
+    def form(self, code, name, instance=None):
+        data = {'code': code, 'category': self.category.pk, 'name': name, 'description': 'x', 'price': '10'}
+        return ProductsForm(data, instance=instance)
+
+    def test_columns_are_computed_on_save(self):
+        self.assertEqual(self.coffee.normalized_name, 'cafemolido')
+        self.assertEqual(self.coffee.normalized_code, 'a1')
+        self.coffee.name = 'Café de Altura'
+        self.coffee.save(update_fields=['name'])
+        self.assertEqual(Products.objects.get(pk=self.coffee.pk).normalized_name, 'cafedealtura')
+
+    def test_form_rejects_normalized_duplicates(self):
+        form = self.form('B-2', 'cafe  molido')
+        self.assertFalse(form.is_valid())
+        self.assertIn('name', form.errors)
+
+        form = self.form('a1', 'Azúcar')
+        self.assertFalse(form.is_valid())
+        self.assertIn('code', form.errors)
+
+    def test_form_allows_editing_the_same_product(self):
+        self.assertTrue(self.form('A-1', 'CAFÉ MOLIDO', instance=self.coffee).is_valid())
+
+    def test_backfill_fills_the_columns_and_reports_duplicates(self):
+        twin = Products.objects.create(code='A-2', name='Té Verde', category=self.category, price=10, quantity=5)
+        Products.objects.filter(pk=twin.pk).update(name='Cafe molido')
+        Products.objects.update(normalized_name=None, normalized_code='')
+
+        out = StringIO()
+        call_command('backfill_normalized_names', stdout=out)
+        self.assertEqual(Products.objects.get(pk=self.coffee.pk).normalized_name, 'cafemolido')
+        self.assertEqual(Products.objects.get(pk=self.coffee.pk).normalized_code, 'a1')
+        self.assertIsNone(Products.objects.get(pk=twin.pk).normalized_name)
+        self.assertIn(f'(id {twin.pk})', out.getvalue())
+
+
+class SimilarNamesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Vinos', description='')
+        cls.sweet = cls.product('1', 'Vino Dulce 750ml')
+        cls.dry = cls.product('2', 'Vino Seco 750ml')
+        cls.beer = cls.product('3', 'Cerveza Paceña')
+
+    @classmethod
+    def product(cls, code, name):
+        return Products.objects.create(code=code, name=name, category=cls.category, price=10, quantity=5)
+
+    def names(self, text, kind=NameTrigram.KIND_PRODUCT, **kwargs):
+        return [row['name'] for row in NameTrigram.similar(text, kind, **kwargs)]
+
+    def test_near_duplicates_rank_first(self):
+        self.assertEqual(self.names('vino dulce 750'), ['Vino Dulce 750ml', 'Vino Seco 750ml'])
+        self.assertEqual(self.names('cerveza pacena'), ['Cerveza Paceña'])
+        self.assertEqual(self.names('agua'), [])
+        self.assertEqual(self.names(''), [])
+
+    def test_limit_and_exclude(self):
+        self.assertEqual(self.names('vino seco 750', limit=1), ['Vino Seco 750ml'])
+        self.assertEqual(self.names('vino dulce 750', exclude=self.sweet.pk), ['Vino Seco 750ml'])
+
+    def test_index_follows_renames_and_deletes(self):
+        self.beer.name = 'Vino Dulce 1L'
+        self.beer.save()
+        self.assertIn('Vino Dulce 1L', self.names('vino dulce'))
+        self.assertEqual(self.names('cerveza pacena'), [])
+
+        self.beer.delete()
+        self.assertNotIn('Vino Dulce 1L', self.names('vino dulce'))
+        self.assertFalse(NameTrigram.objects.filter(object_id=self.beer.pk, kind=NameTrigram.KIND_PRODUCT).exists())
+
+    def test_categories_are_indexed_apart(self):
+        self.assertEqual(self.names('vinos', NameTrigram.KIND_CATEGORY), ['Vinos'])
+        self.assertNotIn('Vinos', self.names('vinos'))
+
+    def test_bulk_indexing_matches_single_rows(self):
+        expected = set(NameTrigram.objects.values_list('kind', 'object_id', 'trigram', 'size'))
+        NameTrigram.objects.all().delete()
+        with mock.patch.object(NameTrigram, 'BULK_INDEX_SIZE', 2):
+            call_command('rebuild_name_trigrams', stdout=StringIO())
+        self.assertEqual(set(NameTrigram.objects.values_list('kind', 'object_id', 'trigram', 'size')), expected)
+        self.assertEqual(self.names('vino dulce 750')[0], 'Vino Dulce 750ml')
+
+    def test_endpoint(self):
+        url = reverse('inventory:similar_names')
+        self.assertEqual(self.client.get(url, {'q': 'vino'}).status_code, 302)
+
+        self.client.force_login(User.objects.create_user('vendedor', password='x'))
+        self.assertEqual(self.client.get(url, {'q': 'vino', 'kind': 'otro'}).status_code, 400)
+        response = self.client.get(url, {'q': 'vino dulce 750', 'exclude': self.dry.pk})
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.sweet.pk])
+
+
+class CategoryNameTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.drinks = Category.objects.create(name='Bebidas Frías', description='')
+
+    def form(self, name, instance=None):
+        return CategoryForm({'name': name, 'description': 'x'}, instance=instance)
+
+    def test_normalized_name_is_computed_on_save(self):
+        self.assertEqual(self.drinks.normalized_name, 'bebidasfrias')
+        self.drinks.name = 'Refrescos'
+        self.drinks.save(update_fields=['name'])
+        self.assertEqual(Category.objects.get(pk=self.drinks.pk).normalized_name, 'refrescos')
+
+    def test_form_rejects_normalized_duplicates(self):
+        form = self.form('bebidas  frias')
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['name'], ["Ya existe una categoría similar: 'Bebidas Frías'"])
+        self.assertTrue(self.form('Lácteos').is_valid())
+
+    def test_form_allows_editing_the_same_category(self):
+        self.assertTrue(self.form('BEBIDAS FRÍAS', instance=self.drinks).is_valid())
+
+    def test_backfill_reports_duplicate_categories(self):
+        twin = Category.objects.create(name='Lácteos', description='')
+        Category.objects.filter(pk=twin.pk).update(name='bebidas frias')
+        Category.objects.update(normalized_name=None)
+
+        out = StringIO()
+        call_command('backfill_normalized_names', stdout=out)
+        self.assertEqual(Category.objects.get(pk=self.drinks.pk).normalized_name, 'bebidasfrias')
+        self.assertIsNone(Category.objects.get(pk=twin.pk).normalized_name)
+        self.assertIn(f"Nombre duplicado en category: 'bebidas frias' (id {twin.pk})", out.getvalue())
+
+
+class ImportProductsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Abarrotes', description='')
+        cls.rice = Products.objects.create(code='A-1', name='Arroz', category=cls.category, price=10, cost=4, quantity=5)
+        cls.sugar = Products.objects.create(code='A-2', name='Azúcar', category=cls.category, price=8, cost=3, quantity=2)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def csv_file(self, *rows, header=('code', 'name', 'category', 'price', 'description')):
+        path = os.path.join(self.directory, 'productos.csv')
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows([header, *rows])
+        return path
+
+    def run_import(self, path, *args):
+        out = StringIO()
+        call_command('import_products', path, *args, stdout=out)
+        return out.getvalue()
+
+    def test_creates_new_codes_and_updates_existing_ones(self):
+        output = self.run_import(self.csv_file(
+            ('a1', 'Arroz Grano de Oro', 'abarrotes', '12.50', 'Bolsa 1kg'),
+            ('B-1', 'Frijol', 'Abarrotes', '9', ''),
+        ))
+        self.assertIn("1 creados, 1 actualizados, 0 filas con error", output)
+
+        rice = Products.objects.get(pk=self.rice.pk)
+        self.assertEqual((rice.code, rice.name, rice.price), ('A-1', 'Arroz Grano de Oro', Decimal('12.50')))
+        # La cantidad y el costo los mantienen las compras.
+        self.assertEqual((rice.quantity, rice.cost), (5, Decimal('4.00')))
+        self.assertEqual(rice.normalized_name, 'arrozgranodeoro')
+
+        beans = Products.objects.get(code='B-1')
+        self.assertEqual((beans.quantity, beans.status), (0, Products.STATUS_INACTIVE))
+        names = [row['name'] for row in NameTrigram.similar('frijol', NameTrigram.KIND_PRODUCT)]
+        self.assertEqual(names, ['Frijol'])
+        self.assertEqual(NameTrigram.similar('arroz grano de oro', NameTrigram.KIND_PRODUCT)[0]['id'], self.rice.pk)
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        output = self.run_import(self.csv_file(
+            ('C-1', 'Harina', 'Abarrotes', '', ''),
+            ('C-2', 'Avena', 'Abarrotes', '0', ''),
+            ('C-3', 'Vino', 'Bebidas', '40', ''),
+            ('C-4', 'Sal', 'Abarrotes', '3', ''),
+            ('c4', 'Sal Fina', 'Abarrotes', '3', ''),
+            ('C-5', 'AZUCAR', 'Abarrotes', '8', ''),
+        ), '--batch-size', '2')
+        self.assertIn("Fila 2: price:", output)
+        self.assertIn("Fila 3: El precio debe ser mayor que cero.", output)
+        self.assertIn("Fila 4: No existe la categoría 'Bebidas'.", output)
+        self.assertIn("Fila 6: El código 'c4' se repite en el archivo.", output)
+        self.assertIn("Fila 7: Ya existe un producto con un nombre similar.", output)
+        self.assertIn("1 creados, 0 actualizados, 5 filas con error", output)
+        self.assertEqual(list(Products.objects.exclude(pk__in=[self.rice.pk, self.sugar.pk]).values_list('code', flat=True)), ['C-4'])
+
+    def test_a_name_freed_earlier_in_the_file_can_be_reused(self):
+        output = self.run_import(self.csv_file(
+            ('A-1', 'Arroz Integral', 'Abarrotes', '10', ''),
+            ('A-2', 'Arroz', 'Abarrotes', '8', ''),
+        ))
+        self.assertIn("0 creados, 2 actualizados, 0 filas con error", output)
+        self.assertEqual(Products.objects.get(pk=self.rice.pk).normalized_name, 'arrozintegral')
+        self.assertEqual(Products.objects.get(pk=self.sugar.pk).normalized_name, 'arroz')
+
+    def test_create_categories(self):
+        path = self.csv_file(('D-1', 'Vino Tinto', 'Bebidas', '40', ''))
+        self.run_import(path, '--create-categories')
+        self.assertEqual(Products.objects.get(code='D-1').category.name, 'Bebidas')
+
+    def test_dry_run_writes_nothing(self):
+        path = self.csv_file(
+            ('A-1', 'Arroz Integral', 'Abarrotes', '11', ''),
+            ('D-1', 'Vino Tinto', 'Bebidas', '40', ''),
+        )
+        output = self.run_import(path, '--dry-run', '--create-categories')
+        self.assertIn("Simulacion: 1 creados, 1 actualizados, 0 filas con error", output)
+        self.assertEqual(Products.objects.get(pk=self.rice.pk).name, 'Arroz')
+        self.assertFalse(Products.objects.filter(code='D-1').exists())
+        self.assertFalse(Category.objects.filter(name='Bebidas').exists())
+
+    def test_xlsx_numeric_codes(self):
+        workbook = Workbook()
+        workbook.active.append(['Code', 'Name', 'Category', 'Price'])
+        workbook.active.append([7501.0, 'Leche', 'Abarrotes', 6.5])
+        path = os.path.join(self.directory, 'productos.xlsx')
+        workbook.save(path)
+        self.run_import(path)
+        self.assertEqual(Products.objects.get(code='7501').price, Decimal('6.50'))
+
+    def test_file_errors(self):
+        with self.assertRaisesMessage(CommandError, "Faltan columnas: price."):
+            self.run_import(self.csv_file(('E-1', 'Té', 'Abarrotes'), header=('code', 'name', 'category')))
+        with self.assertRaisesMessage(CommandError, "Formato no soportado: .txt"):
+            self.run_import(os.path.join(self.directory, 'productos.txt'))
+
+
+class RepricingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Abarrotes', description='')
+        cls.rice = Products.objects.create(code='A-1', name='Arroz', category=cls.category, price=10, cost=8, quantity=5)
+        cls.sugar = Products.objects.create(code='A-2', name='Azúcar', category=cls.category, price=5, cost=4, quantity=5)
+        cls.salt = Products.objects.create(code='A-3', name='Sal', category=cls.category, price=2, quantity=5)
+
+    def rows(self, rule, value, rounding='0.01'):
+        return {row['code']: row for row in repricing.preview(Products.objects.all(), rule, value, rounding)}
+
+    def price(self, product):
+        return Products.objects.get(pk=product.pk).price
+
+    def test_round_price(self):
+        self.assertEqual(repricing.round_price(Decimal('10.024'), '0.05'), Decimal('10.00'))
+        self.assertEqual(repricing.round_price(Decimal('10.025'), '0.05'), Decimal('10.05'))
+        self.assertEqual(repricing.round_price(Decimal('10.5'), '1'), Decimal('11.00'))
+        self.assertEqual(repricing.round_price(Decimal('10.40'), '0.99'), Decimal('9.99'))
+        self.assertEqual(repricing.round_price(Decimal('0.20'), '0.99'), Decimal('0.99'))
+
+    def test_preview_markup(self):
+        rows = self.rows(repricing.RULE_MARKUP, 50)
+        self.assertEqual(rows['A-1']['new_price'], Decimal('12.00'))
+        self.assertEqual((rows['A-1']['margin'], rows['A-1']['new_margin']), (Decimal('25.0'), Decimal('50.0')))
+        self.assertEqual(rows['A-1']['margin_delta'], Decimal('25.0'))
+        self.assertEqual((rows['A-3']['skipped'], rows['A-3']['changed']), ("Sin costo", False))
+
+        summary = repricing.summary(list(rows.values()))
+        self.assertEqual((summary['total'], summary['changed'], summary['skipped']), (3, 2, 1))
+
+    def test_preview_percent(self):
+        rows = self.rows(repricing.RULE_PERCENT, -10, '0.10')
+        self.assertEqual(rows['A-1']['new_price'], Decimal('9.00'))
+        self.assertEqual(rows['A-3']['new_price'], Decimal('1.80'))
+        self.assertEqual(self.rows(repricing.RULE_PERCENT, -100)['A-1']['skipped'], "Precio resultante inválido")
+
+    def test_apply_updates_prices_and_history(self):
+        user = User.objects.create_user('gerente', password='x')
+        queryset = Products.objects.filter(pk__in=[self.rice.pk, self.sugar.pk])
+        token = repricing.price_token(repricing.preview(queryset, repricing.RULE_PERCENT, 10, '0.01'))
+
+        count = repricing.apply(queryset, repricing.RULE_PERCENT, 10, '0.01', token, user=user, reason='Marzo')
+        self.assertEqual(count, 2)
+        self.assertEqual((self.price(self.rice), self.price(self.sugar), self.price(self.salt)),
+                         (Decimal('11.00'), Decimal('5.50'), Decimal('2.00')))
+        history = PriceHistory.objects.get(product=self.rice)
+        self.assertEqual((history.old_price, history.new_price, history.cost), (Decimal('10'), Decimal('11'), Decimal('8')))
+        self.assertEqual((history.user, history.reason), (user, 'Marzo'))
+
+    def test_apply_rejects_a_stale_preview(self):
+        queryset = Products.objects.all()
+        token = repricing.price_token(repricing.preview(queryset, repricing.RULE_PERCENT, 10, '0.01'))
+        Products.objects.filter(pk=self.rice.pk).update(price=20)
+
+        with self.assertRaises(repricing.RepricingError):
+            repricing.apply(queryset, repricing.RULE_PERCENT, 10, '0.01', token)
+        self.assertEqual(self.price(self.sugar), Decimal('5.00'))
+        self.assertFalse(PriceHistory.objects.exists())
+
+    def test_view_applies_the_previewed_prices(self):
+        user = User.objects.create_user('gerente', password='x')
+        user.user_permissions.add(Permission.objects.get(codename='change_products'))
+        self.client.force_login(user)
+        queryset = Products.objects.filter(category=self.category)
+        token = repricing.price_token(repricing.preview(queryset, repricing.RULE_MARKUP, 50, '0.01'))
 
-# Create your tests here.
+        response = self.client.post(reverse('inventory:product_reprice'), {
+            'category': self.category.pk, 'rule': repricing.RULE_MARKUP, 'value': '50',
+            'rounding': '0.01', 'reason': 'Nueva lista', 'token': token, 'apply': '1',
+        })
+        self.assertRedirects(response, reverse('inventory:product_list'), fetch_redirect_response=False)
+        self.assertEqual(self.price(self.rice), Decimal('12.00'))
+        self.assertEqual(PriceHistory.objects.get(product=self.sugar).user, user)
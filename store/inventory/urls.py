@@ -18,5 +18,7 @@ urlpatterns = [
     path('products/edit/<int:pk>/', ProductUpdate.as_view(), name='product_update'),
     path('products/delete/<int:pk>/', ProductDelete.as_view(), name='product_delete'),
     path('products/<int:pk>/', views.ProductDetailView.as_view(), name='product_detail'),
+    path('products/reprice/', views.ProductRepricing.as_view(), name='product_reprice'),
+    path('similar-names/', views.similar_names, name='similar_names'),
     
 ]
\ No newline at end of file
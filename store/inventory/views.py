@@ -4,17 +4,21 @@ from datetime import date, datetime
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpResponse, JsonResponse
-from django.db.models import Count, Sum
+from django.db.models import Sum
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.utils.html import format_html
+from django.template.defaultfilters import date as date_format
 from django.views import generic
 from django.contrib.messages.views import SuccessMessageMixin
 
-from .models import Category, Products
+from .models import Category, NameTrigram, Products
 from purchase.models import PurchaseProduct
-from .forms import ProductsForm, CategoryForm
+from .forms import ProductsForm, CategoryForm, RepricingForm
+from . import repricing, search
+from core.datatables import DataTablesMixin, action_buttons
 
 logger = logging.getLogger(__name__)
 
@@ -37,15 +41,26 @@ class CategoryProductsList(LoginRequiredMixin, PermissionRequiredMixin, generic.
         context['category'] = self.category
         return context
     
-class CategoryList(LoginRequiredMixin, PermissionRequiredMixin, generic.ListView):
+class CategoryList(LoginRequiredMixin, PermissionRequiredMixin, DataTablesMixin, generic.ListView):
 
     model = Category
     template_name = "inventory/category_list.html"
     context_object_name = "categories"
     permission_required = 'inventory.view_category'
-    
-    def get_queryset(self):
-        return Category.objects.annotate(product_count=Count('products'))
+    datatable_columns = ['name', 'description', ('active_product_count', None), 'date_added', 'date_updated', None]
+
+    def datatable_row(self, category):
+        return [
+            format_html('<a href="{}">{}</a>', reverse('inventory:category_products', args=[category.pk]), category.name),
+            format_html('{}', category.description),
+            category.active_product_count,
+            date_format(category.date_added, 'd-m-Y H:i'),
+            date_format(category.date_updated, 'd-m-Y H:i'),
+            action_buttons(
+                reverse('inventory:category_update', args=[category.pk]),
+                reverse('inventory:category_delete', args=[category.pk]),
+            ),
+        ]
     
 class CategoryCreate(LoginRequiredMixin, PermissionRequiredMixin, generic.CreateView):
     model = Category
@@ -117,11 +132,46 @@ class ProductDetailView(LoginRequiredMixin, PermissionRequiredMixin, generic.Det
         context['cantidad_historica'] = cantidad_historica
         return context
     
-class ProductList(LoginRequiredMixin, PermissionRequiredMixin, generic.ListView):
+class ProductList(LoginRequiredMixin, PermissionRequiredMixin, DataTablesMixin, generic.ListView):
     model = Products
     template_name = "inventory/product_list.html"
     context_object_name = "products"
     permission_required = 'inventory.view_products'
+    datatable_columns = ['code', 'name', 'category__name', 'cost', 'quantity', 'price', ('status', None), 'date_updated', None]
+
+    def get_queryset(self):
+        return Products.objects.select_related('category')
+
+    def datatable_search(self, queryset, value):
+        # Busqueda de texto completo (sin acentos), ordenada por relevancia.
+        return search.search_products(queryset, value)
+
+    def datatable_row(self, product):
+        category = ''
+        if product.category:
+            category = format_html(
+                '<a href="{}">{}</a>',
+                reverse('inventory:category_products', args=[product.category.pk]),
+                product.category.name,
+            )
+        if product.status == Products.STATUS_ACTIVE:
+            status = format_html('<span class="badge bg-success">Activo</span>')
+        else:
+            status = format_html('<span class="badge bg-warning">Inactivo</span>')
+        return [
+            format_html('{}', product.code),
+            format_html('<a href="{}">{}</a>', reverse('inventory:product_detail', args=[product.pk]), product.name),
+            category,
+            str(product.cost),
+            product.quantity,
+            str(product.price),
+            status,
+            date_format(product.date_updated, 'd-m-Y H:i'),
+            action_buttons(
+                reverse('inventory:product_update', args=[product.pk]),
+                reverse('inventory:product_delete', args=[product.pk]),
+            ),
+        ]
     
 class ProductCreate(LoginRequiredMixin, PermissionRequiredMixin, generic.CreateView):
     model = Products
@@ -171,4 +221,44 @@ class ProductDelete(LoginRequiredMixin, SuccessMessageMixin,PermissionRequiredMi
         success_message = f"Producto '{product_name}' eliminado exitosamente."
         messages.success(self.request, success_message)
         return self.delete(request, *args, **kwargs)
-    
\ No newline at end of file
+    
+
+class ProductRepricing(LoginRequiredMixin, PermissionRequiredMixin, generic.FormView):
+    """Repreciado en bloque: primero una vista previa con los margenes y luego se aplica."""
+    template_name = "inventory/product_reprice.html"
+    form_class = RepricingForm
+    permission_required = 'inventory.change_products'
+
+    def form_valid(self, form):
+        data = form.cleaned_data
+        params = (form.queryset(), data['rule'], data['value'], data['rounding'])
+        if 'apply' in self.request.POST:
+            try:
+                count = repricing.apply(*params, data['token'], user=self.request.user, reason=data['reason'])
+            except repricing.RepricingError as e:
+                messages.error(self.request, str(e))
+            else:
+                messages.success(self.request, f"Precios actualizados: {count} productos.")
+                return redirect('inventory:product_list')
+
+        rows = repricing.preview(*params)
+        form.data = form.data.copy()
+        form.data['token'] = repricing.price_token(rows)
+        return self.render_to_response(self.get_context_data(
+            form=form, rows=rows, summary=repricing.summary(rows),
+        ))
+
+
+
+# Sugerencias que devuelve la busqueda de nombres parecidos.
+SIMILAR_NAMES_LIMIT = 5
+
+@login_required
+def similar_names(request):
+    kind = request.GET.get('kind', NameTrigram.KIND_PRODUCT)
+    if kind not in NameTrigram.KINDS:
+        return JsonResponse({'error': "Tipo inválido."}, status=400)
+    exclude = request.GET.get('exclude')
+    exclude = int(exclude) if exclude and exclude.isdigit() else None
+    results = NameTrigram.similar(request.GET.get('q', ''), kind, limit=SIMILAR_NAMES_LIMIT, exclude=exclude)
+    return JsonResponse({'results': results})
@@ -1,15 +1,39 @@
-from django.contrib import admin
-from .models import Sales, salesItems
+from django.contrib import admin, messages
+from .checkout import void_sales
+from .models import Sales, salesItems, Sequence, ProductTombstone, StockHold
+
+@admin.action(description="Anular ventas seleccionadas y restaurar stock", permissions=['delete'])
+def void_selected_sales(modeladmin, request, queryset):
+    voided = void_sales(queryset)
+    modeladmin.message_user(request, f"{voided} ventas anuladas; las cantidades de productos fueron restauradas.", messages.SUCCESS)
 
 class SalesAdmin(admin.ModelAdmin):
     list_display = ('code', 'sub_total', 'grand_total', 'tax_amount', 'tax', 'tendered_amount', 'amount_change', 'date_added', 'date_updated', 'cliente')
     search_fields = ('code', 'cliente')
     list_filter = ('date_added', 'date_updated')
+    # Filtrar por fecha y seleccionar todo anula un rango de ventas.
+    date_hierarchy = 'date_added'
+    actions = [void_selected_sales]
 
 class SalesItemsAdmin(admin.ModelAdmin):
     list_display = ('sale', 'product', 'price', 'qty', 'total')
     search_fields = ('sale__code', 'product__name')
     list_filter = ('sale__date_added',)
 
+class SequenceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'value')
+    search_fields = ('name',)
+
+class ProductTombstoneAdmin(admin.ModelAdmin):
+    list_display = ('code', 'product_id', 'date_deleted')
+    search_fields = ('code',)
+
+class StockHoldAdmin(admin.ModelAdmin):
+    list_display = ('cart', 'product', 'qty', 'expires_at')
+    search_fields = ('cart', 'product__name')
+
 admin.site.register(Sales, SalesAdmin)
 admin.site.register(salesItems, SalesItemsAdmin)
+admin.site.register(Sequence, SequenceAdmin)
+admin.site.register(ProductTombstone, ProductTombstoneAdmin)
+admin.site.register(StockHold, StockHoldAdmin)
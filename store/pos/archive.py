@@ -0,0 +1,126 @@
+import heapq
+import re
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Sum
+
+from inventory.models import Category, Products
+from .models import Sales, salesItems, sum_amount
+
+# Modelos que se copian a cada archivo anual; Products y Category solo con los
+# registros que usan las ventas del año (una foto al momento de archivar).
+ARCHIVE_MODELS = (Category, Products, Sales, salesItems)
+ARCHIVE_NAME = re.compile(r'^sales-(\d{4})\.sqlite3$')
+
+
+def archive_dir():
+    return Path(getattr(settings, 'POS_ARCHIVE_DIR', settings.BASE_DIR / 'archive'))
+
+
+def archive_path(year):
+    return archive_dir() / f'sales-{year}.sqlite3'
+
+
+def archived_years():
+    directory = archive_dir()
+    if not directory.is_dir():
+        return []
+    years = [ARCHIVE_NAME.match(path.name) for path in directory.iterdir()]
+    return sorted(int(match.group(1)) for match in years if match)
+
+
+def archive_alias(year, writable=False):
+    """
+    Registra el archivo del año como una base de datos mas y devuelve su alias.
+    Para consultar se abre en solo lectura; `writable` es solo para el comando
+    que lo crea.
+    """
+    alias = f'archive_{year}' + ('_rw' if writable else '')
+    if alias not in connections.settings:
+        path = archive_path(year)
+        connections.settings[alias] = {
+            **connections.settings[DEFAULT_DB_ALIAS],
+            'NAME': str(path) if writable else f'file:{path.as_posix()}?mode=ro',
+            'OPTIONS': {} if writable else {'uri': True},
+        }
+    return alias
+
+
+def sales_querysets(start=None, end=None):
+    """
+    Ventas del rango [start, end] como una lista de querysets: la base principal
+    y, solo si el rango incluye años archivados, el archivo de cada uno de esos
+    años. Sin rango se incluyen todos los archivos.
+    """
+    querysets = [Sales.objects.using(archive_alias(year)) for year in archived_years_between(start, end)]
+    querysets.append(Sales.objects.all())
+    if start:
+        querysets = [queryset.filter(date_added__gte=start) for queryset in querysets]
+    if end:
+        querysets = [queryset.filter(date_added__lte=end) for queryset in querysets]
+    return querysets
+
+
+def iter_sales(querysets):
+    """Recorre las ventas de todos los querysets ordenadas por fecha."""
+    return heapq.merge(
+        *(queryset.order_by('date_added') for queryset in querysets),
+        key=lambda sale: sale.date_added,
+    )
+
+
+def period_range(year, month=None, day=None):
+    """Primer y ultimo instante del año, del mes o del dia indicado."""
+    year = int(year)
+    if day:
+        start = datetime(year, int(month), int(day))
+        end = start + timedelta(days=1)
+    elif month:
+        start = datetime(year, int(month), 1)
+        end = datetime(year + int(month) // 12, int(month) % 12 + 1, 1)
+    else:
+        start = datetime(year, 1, 1)
+        end = datetime(year + 1, 1, 1)
+    return start, end - timedelta(microseconds=1)
+
+
+def period_querysets(year, month=None, day=None):
+    """Como sales_querysets(), para un año, un mes o un dia."""
+    return sales_querysets(*period_range(year, month, day))
+
+
+def count_sales(querysets):
+    return sum(queryset.count() for queryset in querysets)
+
+
+def sum_sales(querysets, field='grand_total'):
+    return sum((sum_amount(queryset, field) for queryset in querysets), Decimal(0))
+
+
+def sum_sold_qty(querysets):
+    """Unidades vendidas; las lineas de cada venta estan en la misma base que la venta."""
+    return sum(
+        salesItems.objects.using(queryset.db).filter(sale__in=queryset).aggregate(total=Sum('qty'))['total'] or 0
+        for queryset in querysets
+    )
+
+
+def archived_years_between(start=None, end=None):
+    """Años archivados dentro del rango; sus ventas ya no estan en la base principal."""
+    return [
+        year for year in archived_years()
+        if (start is None or start.year <= year) and (end is None or end.year >= year)
+    ]
+
+
+def find_archived_sale(sale_id):
+    """Venta `sale_id` buscada en los archivos, del mas nuevo al mas viejo, o None."""
+    for year in reversed(archived_years()):
+        sale = Sales.objects.using(archive_alias(year)).filter(pk=sale_id).first()
+        if sale is not None:
+            return sale
+    return None
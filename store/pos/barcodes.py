@@ -0,0 +1,109 @@
+import threading
+import time
+
+from inventory.models import Products
+from . import catalog
+from .catalog import catalog_version, changed_products, deleted_products, parse_cursor, sync_cursor
+
+# Codigos aceptados por peticion en la busqueda por lote.
+MAX_LOOKUP_CODES = 200
+# Segundos que el indice se usa sin revisar la version en la base. Los cambios
+# de este proceso se ven de inmediato; los de otros procesos, despues de este plazo.
+INDEX_MAX_AGE = 2.0
+INDEX_FIELDS = ('id', 'code', 'name', 'price', 'quantity', 'status')
+
+
+def index_entry(product):
+    return {
+        'id': product['id'],
+        'code': product['code'],
+        'name': product['name'],
+        'price': float(product['price']),
+        'quantity': product['quantity'],
+        'active': product['status'] == Products.STATUS_ACTIVE,
+    }
+
+
+class BarcodeIndex:
+    """
+    Indice en memoria del proceso: codigo -> id, precio y stock del producto.
+
+    Se carga en la primera busqueda, nunca al importar el modulo (bajo ASGI el
+    modulo se importa dentro del event loop). La version del catalogo en la
+    base solo se consulta si este proceso confirmo cambios del catalogo o si
+    paso INDEX_MAX_AGE desde la ultima revision; si cambio, se aplican solo los
+    productos modificados desde el cursor anterior, igual que la
+    sincronizacion de los terminales.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.cursor = None
+        self.generation = None
+        self.checked = 0.0
+        self.by_code = {}
+        self.codes = {}
+
+    def is_current(self):
+        return (
+            self.version is not None
+            and self.generation == catalog.local_generation
+            and time.monotonic() - self.checked < INDEX_MAX_AGE
+        )
+
+    def load(self):
+        with self.lock:
+            generation, checked = catalog.local_generation, time.monotonic()
+            version = catalog_version()
+            cursor = sync_cursor()
+            by_code, codes = {}, {}
+            for product in Products.objects.values(*INDEX_FIELDS).iterator():
+                by_code[product['code']] = index_entry(product)
+                codes[product['id']] = product['code']
+            self.by_code, self.codes = by_code, codes
+            self.version, self.cursor = version, cursor
+            self.generation, self.checked = generation, checked
+
+    def refresh(self):
+        if self.is_current():
+            return self.version
+        if self.version is None:
+            self.load()
+            return self.version
+        with self.lock:
+            if self.is_current():
+                return self.version
+            # La generacion se lee antes que la version: un cambio confirmado
+            # mientras tanto vuelve a provocar una revision.
+            generation, checked = catalog.local_generation, time.monotonic()
+            version = catalog_version()
+            if version == self.version:
+                self.generation, self.checked = generation, checked
+                return version
+            since = parse_cursor(self.cursor)
+            cursor = sync_cursor()
+            by_code, codes = dict(self.by_code), dict(self.codes)
+            for product in changed_products(since):
+                old_code = codes.get(product['id'])
+                if old_code is not None and old_code != product['code']:
+                    by_code.pop(old_code, None)
+                by_code[product['code']] = index_entry(product)
+                codes[product['id']] = product['code']
+            for product_id in deleted_products(since):
+                code = codes.pop(product_id, None)
+                if code is not None:
+                    by_code.pop(code, None)
+            self.by_code, self.codes = by_code, codes
+            self.version, self.cursor = version, cursor
+            self.generation, self.checked = generation, checked
+        return version
+
+    def lookup(self, codes):
+        """Devuelve la version del indice y la entrada de cada codigo (None si no existe)."""
+        version = self.refresh()
+        by_code = self.by_code
+        return version, {code: by_code.get(code) for code in codes}
+
+
+barcode_index = BarcodeIndex()
@@ -0,0 +1,199 @@
+import itertools
+import json
+import math
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from inventory.models import Products
+from .models import ProductTombstone, Sequence
+
+CATALOG_SEQUENCE = 'catalog'
+PRUNED_SEQUENCE = 'tombstones_pruned'
+CATALOG_CACHE_KEY = 'pos:catalog'
+# Campos de Products que forman parte del catalogo del POS.
+CATALOG_FIELDS = {'code', 'name', 'price', 'quantity', 'status'}
+# Margen que se resta al cursor para no perder cambios confirmados con una
+# fecha anterior a la consulta. Los terminales aplican los cambios por id.
+SYNC_OVERLAP = timedelta(seconds=5)
+# Tiempo que se guardan los registros de productos eliminados. Un cursor
+# anterior a lo depurado ya no se puede atender con cambios: el terminal
+# recarga el catalogo completo.
+TOMBSTONE_RETENTION = timedelta(days=30)
+
+# Cambios del catalogo confirmados por este proceso. El indice de codigos lo
+# compara en cada busqueda en lugar de consultar la version en la base.
+_local_changes = itertools.count(1)
+local_generation = 0
+
+
+def catalog_version():
+    return Sequence.objects.filter(name=CATALOG_SEQUENCE).values_list('value', flat=True).first() or 0
+
+
+def count_local_change():
+    global local_generation
+    local_generation = next(_local_changes)
+
+
+def bump_catalog_version():
+    transaction.on_commit(count_local_change)
+    return Sequence.next_value(CATALOG_SEQUENCE)
+
+
+def catalog_etag(version):
+    return f'"catalog-{version}"'
+
+
+def serialize_product(product):
+    return {
+        'id': product['id'],
+        'code': product['code'],
+        'name': product['name'],
+        'price': float(product['price']),
+        'quantity': product['quantity'],
+    }
+
+
+def sync_cursor(now=None):
+    return ((now or timezone.now()) - SYNC_OVERLAP).isoformat()
+
+
+def parse_cursor(value):
+    """Fecha del cursor en la misma forma (con o sin zona) que las de la base, o None."""
+    try:
+        value = datetime.fromisoformat(value)
+        if timezone.is_aware(value) and not settings.USE_TZ:
+            value = timezone.make_naive(value)
+        elif timezone.is_naive(value) and settings.USE_TZ:
+            value = timezone.make_aware(value)
+        # cursor_expired() la compara como marca de tiempo.
+        value.timestamp()
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return value
+
+
+def pruned_until():
+    """Marca de tiempo del registro de eliminado mas nuevo que se depuro, o 0."""
+    return Sequence.objects.filter(name=PRUNED_SEQUENCE).values_list('value', flat=True).first() or 0
+
+
+def cursor_expired(since, pruned):
+    """True si se depuraron eliminados posteriores a `since`: esos cambios ya no se pueden informar."""
+    return since.timestamp() <= pruned
+
+
+def prune_tombstones(now=None):
+    """
+    Elimina los registros de productos eliminados mas viejos que
+    TOMBSTONE_RETENTION y guarda hasta donde se depuro, para rechazar los
+    cursores anteriores.
+    """
+    with transaction.atomic():
+        old = ProductTombstone.objects.filter(date_deleted__lt=(now or timezone.now()) - TOMBSTONE_RETENTION)
+        newest = old.aggregate(newest=Max('date_deleted'))['newest']
+        if newest is None:
+            return 0
+        Sequence.objects.update_or_create(
+            name=PRUNED_SEQUENCE, defaults={'value': max(pruned_until(), math.ceil(newest.timestamp()))},
+        )
+        return old.delete()[0]
+
+
+def active_products():
+    return (
+        Products.objects.filter(status=Products.STATUS_ACTIVE)
+        .order_by('name')
+        .values('id', 'code', 'name', 'price', 'quantity')
+    )
+
+
+def changed_products(since):
+    return Products.objects.filter(date_updated__gte=since).values('id', 'code', 'name', 'price', 'quantity', 'status')
+
+
+def deleted_products(since):
+    return ProductTombstone.objects.filter(date_deleted__gte=since).values_list('product_id', flat=True)
+
+
+def catalog_blob(version, cursor, products):
+    return json.dumps({
+        'version': version,
+        'cursor': cursor,
+        'products': [serialize_product(product) for product in products],
+    })
+
+
+def changes_payload(version, cursor, changed, deleted):
+    products, removed = [], []
+    for product in changed:
+        if product['status'] == Products.STATUS_ACTIVE:
+            products.append(serialize_product(product))
+        else:
+            removed.append(product['id'])
+    removed.extend(deleted)
+    return {
+        'version': version,
+        'cursor': cursor,
+        'products': products,
+        'removed': removed,
+    }
+
+
+def build_catalog(version):
+    cursor = sync_cursor()
+    return catalog_blob(version, cursor, active_products())
+
+
+def catalog_changes(since):
+    """
+    Productos modificados desde `since`. Los productos activos se devuelven
+    completos; los desactivados y los eliminados solo por id en `removed`.
+    """
+    cursor = sync_cursor()
+    return changes_payload(catalog_version(), cursor, changed_products(since), deleted_products(since))
+
+
+def catalog_json(version):
+    """
+    Catalogo serializado. El blob se guarda en cache junto con su version y se
+    reconstruye cuando la version actual es distinta.
+    """
+    cached = cache.get(CATALOG_CACHE_KEY)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    blob = build_catalog(version)
+    cache.set(CATALOG_CACHE_KEY, (version, blob), None)
+    return blob
+
+
+# Versiones async para las vistas servidas bajo ASGI.
+
+async def acatalog_version():
+    return await Sequence.objects.filter(name=CATALOG_SEQUENCE).values_list('value', flat=True).afirst() or 0
+
+
+async def apruned_until():
+    return await Sequence.objects.filter(name=PRUNED_SEQUENCE).values_list('value', flat=True).afirst() or 0
+
+
+async def acatalog_changes(since):
+    cursor = sync_cursor()
+    changed = [product async for product in changed_products(since)]
+    deleted = [product_id async for product_id in deleted_products(since)]
+    return changes_payload(await acatalog_version(), cursor, changed, deleted)
+
+
+async def acatalog_json(version):
+    cached = await cache.aget(CATALOG_CACHE_KEY)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    cursor = sync_cursor()
+    blob = catalog_blob(version, cursor, [product async for product in active_products()])
+    await cache.aset(CATALOG_CACHE_KEY, (version, blob), None)
+    return blob
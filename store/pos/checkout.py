@@ -0,0 +1,307 @@
+import math
+from collections import defaultdict
+from datetime import datetime
+from decimal import InvalidOperation
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+
+from core.sqlite import retry_on_busy
+from inventory.models import Category, Products
+from .catalog import bump_catalog_version
+from .models import Sales, StockHold, from_cents, salesItems, to_cents
+
+
+# Ventas aplicadas por transaccion al subir un lote desde un terminal.
+UPLOAD_CHUNK_SIZE = 50
+UPLOAD_FIELDS = ('sub_total', 'tax', 'tax_amount', 'grand_total', 'tendered_amount', 'amount_change')
+
+
+class CheckoutError(Exception):
+    pass
+
+
+class InsufficientStock(CheckoutError):
+    pass
+
+
+def parse_lines(lines):
+    """Convierte las lineas (producto, cantidad, precio) recibidas del POS."""
+    parsed = []
+    for product_id, qty, price in lines:
+        try:
+            product_id = int(product_id)
+            qty = int(qty)
+            price = float(price) if price not in (None, '') else None
+        except (TypeError, ValueError):
+            raise CheckoutError("Cantidad inválida.")
+        if qty <= 0:
+            raise CheckoutError("Cantidad inválida.")
+        if price is not None and not (math.isfinite(price) and price >= 0):
+            raise CheckoutError("Precio inválido.")
+        parsed.append((product_id, qty, price))
+    if not parsed:
+        raise CheckoutError("Primero, agregue al menos 1 producto!")
+    return parsed
+
+
+def decrease_stock(product_id, qty, now, held=0):
+    """
+    Descuenta `qty` unidades con un solo UPDATE condicional y recalcula el
+    estado del producto en la misma sentencia. Las `held` unidades reservadas
+    por otros carritos no se pueden vender. Devuelve False si no alcanza.
+    """
+    return Products.objects.filter(pk=product_id, quantity__gte=qty + held).update(
+        quantity=F('quantity') - qty,
+        status=Case(
+            When(quantity__gt=qty, cost__gt=0, price__gt=0, then=Value(Products.STATUS_ACTIVE)),
+            default=Value(Products.STATUS_INACTIVE),
+        ),
+        date_updated=now,
+    ) == 1
+
+
+@retry_on_busy
+def create_sale(lines, code=None, cart=None, **fields):
+    """
+    Registra una venta completa dentro de una sola transaccion.
+
+    `lines` es una lista de (product_id, qty, price); si price es None se usa el
+    precio actual del producto. `fields` son los totales de `Sales`; si no se
+    envia `sub_total` se calcula a partir de las lineas. Si algun producto no
+    tiene stock suficiente se lanza `InsufficientStock` y no se guarda nada.
+    El stock reservado por otros carritos no cuenta como disponible; las
+    reservas del carrito `cart` se liberan con la venta.
+    """
+    lines = parse_lines(lines)
+
+    with transaction.atomic():
+        products = Products.objects.in_bulk({product_id for product_id, _, _ in lines})
+        missing = [product_id for product_id, _, _ in lines if product_id not in products]
+        if missing:
+            raise CheckoutError(f"Producto no encontrado: {missing[0]}")
+
+        lines = [
+            (product_id, qty, float(products[product_id].price) if price is None else price)
+            for product_id, qty, price in lines
+        ]
+
+        wanted = defaultdict(int)
+        for product_id, qty, _ in lines:
+            wanted[product_id] += qty
+
+        now = timezone.now()
+        held = StockHold.held(wanted, now, exclude_cart=cart)
+        # Orden fijo de ids para que dos ventas concurrentes bloqueen en el mismo orden.
+        for product_id in sorted(wanted):
+            if not decrease_stock(product_id, wanted[product_id], now, held.get(product_id, 0)):
+                raise InsufficientStock(
+                    f"No hay suficiente cantidad de '{products[product_id].name}' para vender."
+                )
+        update_category_counts(
+            {product_id: (product.category_id, product.status) for product_id, product in products.items()},
+        )
+        bump_catalog_version()
+
+        if 'sub_total' not in fields:
+            # Suma exacta de las lineas: sumar los float puede perder un centavo.
+            sub_total = float(from_cents(sum(to_cents(qty * price) for _, qty, price in lines)))
+            tax = float(fields.get('tax', 0))
+            tax_amount = sub_total * (tax / 100)
+            fields.update(
+                sub_total=sub_total,
+                tax=tax,
+                tax_amount=tax_amount,
+                grand_total=sub_total + tax_amount,
+            )
+
+        sale = Sales(code=code or Sales.next_code(), **fields)
+        sale.save()
+
+        items = [
+            salesItems(
+                sale=sale,
+                product=products[product_id],
+                qty=qty,
+                price=price,
+                total=qty * price,
+            )
+            for product_id, qty, price in lines
+        ]
+        # bulk_create no llama a save(); las columnas en centavos se llenan aqui.
+        for item in items:
+            item.sync_cents()
+        salesItems.objects.bulk_create(items)
+        if cart:
+            StockHold.objects.filter(cart=cart).delete()
+
+    return sale
+
+
+@retry_on_busy
+def upload_sales(sales):
+    """
+    Registra un lote de ventas encoladas por un terminal.
+
+    Cada venta trae una clave `key` generada en el terminal; las claves que ya
+    existen no se vuelven a registrar. Las ventas se aplican en bloques de
+    `UPLOAD_CHUNK_SIZE` por transaccion y cada una dentro de su propio
+    savepoint, asi una venta rechazada no afecta al resto. Devuelve un
+    resultado por venta, en el mismo orden.
+    """
+    results = []
+    for start in range(0, len(sales), UPLOAD_CHUNK_SIZE):
+        chunk = sales[start:start + UPLOAD_CHUNK_SIZE]
+        with transaction.atomic():
+            existing = existing_keys(chunk)
+            for sale in chunk:
+                results.append(upload_sale(sale, existing))
+    return results
+
+
+def existing_keys(sales):
+    """{clave: id de venta} de las ventas subidas que ya estan registradas."""
+    keys = [sale['key'] for sale in sales if isinstance(sale, dict) and isinstance(sale.get('key'), str)]
+    return dict(Sales.objects.filter(idempotency_key__in=keys).values_list('idempotency_key', 'id'))
+
+
+def upload_sale(sale, existing):
+    """
+    Registra una venta subida. Una venta mal formada se informa como `failed`
+    sin afectar a las demas ventas del lote.
+
+    Las claves se agregan a `existing` recien cuando la transaccion se
+    confirma: si se deshace (un reintento por bloqueo) la venta no existe y
+    debe volver a registrarse. Una clave repetida antes de confirmar la
+    detecta la restriccion unica de idempotency_key.
+    """
+    key = sale.get('key') if isinstance(sale, dict) else None
+    if not key or not isinstance(key, str):
+        return {'key': key if isinstance(key, str) else None, 'status': 'failed', 'msg': "Falta la clave de la venta."}
+    if key in existing:
+        return {'key': key, 'status': 'duplicate', 'sale': existing[key]}
+
+    try:
+        fields, lines = parse_upload(sale)
+        created = create_sale(lines, cart=sale.get('cart'), idempotency_key=key, **fields)
+    except CheckoutError as e:
+        return {'key': key, 'status': 'failed', 'msg': str(e)}
+    except ValidationError as e:
+        return {'key': key, 'status': 'failed', 'msg': '; '.join(e.messages)}
+    except (TypeError, ValueError, InvalidOperation):
+        return {'key': key, 'status': 'failed', 'msg': "Datos de la venta inválidos."}
+    except IntegrityError:
+        # Otro envio del mismo terminal registro la venta al mismo tiempo.
+        sale_id = Sales.objects.filter(idempotency_key=key).values_list('id', flat=True).first()
+        if sale_id is None:
+            raise
+        remember_key(existing, key, sale_id)
+        return {'key': key, 'status': 'duplicate', 'sale': sale_id}
+
+    remember_key(existing, key, created.pk)
+    return {'key': key, 'status': 'created', 'sale': created.pk}
+
+
+def remember_key(existing, key, sale_id):
+    transaction.on_commit(lambda: existing.setdefault(key, sale_id))
+
+
+def parse_upload(sale):
+    """Valida los totales y las lineas de una venta subida; devuelve (fields, lines)."""
+    fields = {}
+    for name in UPLOAD_FIELDS:
+        if name in sale:
+            try:
+                value = float(sale[name])
+            except (TypeError, ValueError):
+                raise CheckoutError(f"Valor inválido en {name}.")
+            if not math.isfinite(value):
+                raise CheckoutError(f"Valor inválido en {name}.")
+            fields[name] = value
+    date_added = parse_date(sale.get('date_added'))
+    if date_added:
+        fields['date_added'] = date_added
+
+    items = sale.get('items', [])
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise CheckoutError("Líneas de venta inválidas.")
+    lines = [(item.get('product'), item.get('qty'), item.get('price')) for item in items]
+    return fields, lines
+
+
+def parse_date(value):
+    try:
+        value = datetime.fromisoformat(value)
+        if timezone.is_aware(value) and not settings.USE_TZ:
+            value = timezone.make_naive(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return value
+
+
+def refresh_status(product_ids):
+    """Recalcula en un solo UPDATE el estado de los productos indicados."""
+    return Products.objects.filter(pk__in=product_ids).update(
+        status=Case(
+            When(quantity__gt=0, cost__gt=0, price__gt=0, then=Value(Products.STATUS_ACTIVE)),
+            default=Value(Products.STATUS_INACTIVE),
+        ),
+    )
+
+
+def update_category_counts(before):
+    """
+    Ajusta los contadores de productos activos de las categorias despues de un
+    UPDATE en bloque. `before` es {product_id: (category_id, status)} leido
+    antes del UPDATE.
+    """
+    deltas = defaultdict(int)
+    for product_id, status in Products.objects.filter(pk__in=before).values_list('pk', 'status'):
+        category_id, old_status = before[product_id]
+        if status != old_status:
+            deltas[category_id] += 1 if status == Products.STATUS_ACTIVE else -1
+    Category.adjust_active_counts(deltas)
+
+
+@retry_on_busy
+def void_sales(sales):
+    """
+    Anula las ventas del queryset `sales` y devuelve al stock lo vendido.
+
+    Se hace un UPDATE por producto con la cantidad agrupada de todas las
+    lineas, un solo UPDATE para recalcular el estado de esos productos y un
+    solo DELETE para las lineas. Devuelve la cantidad de ventas anuladas.
+    """
+    with transaction.atomic():
+        sale_ids = list(sales.values_list('pk', flat=True))
+        if not sale_ids:
+            return 0
+
+        items = salesItems.objects.filter(sale_id__in=sale_ids)
+        restored = items.order_by().values('product').annotate(qty=Sum('qty'))
+        now = timezone.now()
+        product_ids = []
+        for row in sorted(restored, key=lambda row: row['product']):
+            if row['qty']:
+                Products.objects.filter(pk=row['product']).update(
+                    quantity=F('quantity') + row['qty'],
+                    date_updated=now,
+                )
+                product_ids.append(row['product'])
+        if product_ids:
+            before = {
+                product_id: (category_id, status)
+                for product_id, category_id, status in
+                Products.objects.filter(pk__in=product_ids).values_list('pk', 'category_id', 'status')
+            }
+            refresh_status(product_ids)
+            update_category_counts(before)
+            bump_catalog_version()
+
+        items.delete()
+        Sales.objects.filter(pk__in=sale_ids).delete()
+    return len(sale_ids)
+
@@ -0,0 +1,64 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from inventory.models import Products
+from .checkout import CheckoutError, InsufficientStock
+from .models import StockHold
+
+# Tiempo que dura una reserva sin actividad del carrito.
+HOLD_TTL = timedelta(minutes=15)
+
+
+def available(product_ids, cart=None):
+    """Stock disponible por producto: cantidad menos las reservas vigentes de otros carritos."""
+    now = timezone.now()
+    held = StockHold.held(product_ids, now, exclude_cart=cart)
+    quantities = Products.objects.filter(pk__in=product_ids).values_list('pk', 'quantity')
+    return {product_id: quantity - held.get(product_id, 0) for product_id, quantity in quantities}
+
+
+def hold(cart, product_id, qty):
+    """
+    Reserva `qty` unidades del producto para el carrito (reemplaza la reserva
+    anterior del mismo producto; 0 la elimina) y renueva el vencimiento de
+    todas las reservas del carrito. Devuelve lo que queda disponible.
+    """
+    try:
+        product_id = int(product_id)
+        qty = int(qty)
+    except (TypeError, ValueError):
+        raise CheckoutError("Cantidad inválida.")
+    if not cart or qty < 0:
+        raise CheckoutError("Cantidad inválida.")
+
+    now = timezone.now()
+    with transaction.atomic():
+        product = Products.objects.filter(pk=product_id).values('name', 'quantity').first()
+        if product is None:
+            raise CheckoutError(f"Producto no encontrado: {product_id}")
+        free = product['quantity'] - StockHold.held([product_id], now, exclude_cart=cart).get(product_id, 0)
+        if qty > free:
+            raise InsufficientStock(f"Solo quedan {max(free, 0)} unidades de '{product['name']}' disponibles.")
+
+        if qty:
+            StockHold.objects.update_or_create(
+                cart=cart, product_id=product_id, defaults={'qty': qty, 'expires_at': now + HOLD_TTL},
+            )
+        else:
+            StockHold.objects.filter(cart=cart, product_id=product_id).delete()
+        StockHold.objects.filter(cart=cart).update(expires_at=now + HOLD_TTL)
+    return free - qty
+
+
+def release(cart, product_id=None):
+    holds = StockHold.objects.filter(cart=cart)
+    if product_id is not None:
+        holds = holds.filter(product_id=product_id)
+    return holds.delete()[0]
+
+
+def sweep(now=None):
+    """Elimina las reservas vencidas; ya no cuentan, solo ocupan lugar."""
+    return StockHold.objects.filter(expires_at__lte=now or timezone.now()).delete()[0]
@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from inventory.models import Category, Products
+from pos.archive import ARCHIVE_MODELS, archive_alias, archive_path
+from pos.models import Sales, salesItems
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve las ventas de un año cerrado a un archivo SQLite propio "
+        "(archive/sales-<año>.sqlite3) con una foto de los productos y categorias "
+        "que usan. Los reportes leen el archivo en solo lectura cuando el rango lo incluye."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('year', type=int, help="Año a archivar.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--vacuum', action='store_true', help="Compactar la base principal al terminar.")
+
+    def handle(self, *args, **options):
+        year = options['year']
+        if year >= timezone.now().year:
+            raise CommandError("Solo se pueden archivar años cerrados.")
+        path = archive_path(year)
+        if path.exists():
+            raise CommandError(f"El archivo {path} ya existe.")
+
+        sales = Sales.objects.filter(date_added__year=year)
+        items = salesItems.objects.filter(sale__date_added__year=year)
+        products = Products.objects.filter(pk__in=items.values('product'))
+        categories = Category.objects.filter(pk__in=products.values('category'))
+        expected = {Sales: sales.count(), salesItems: items.count()}
+        if not expected[Sales]:
+            self.stdout.write(f"No hay ventas de {year}.")
+            return
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        alias = archive_alias(year, writable=True)
+        try:
+            with connections[alias].schema_editor() as editor:
+                for model in ARCHIVE_MODELS:
+                    editor.create_model(model)
+            with transaction.atomic(using=alias):
+                for model, queryset in ((Category, categories), (Products, products), (Sales, sales), (salesItems, items)):
+                    self.copy(model, queryset, alias, options['batch_size'])
+            for model, count in expected.items():
+                if model.objects.using(alias).count() != count:
+                    raise CommandError(f"El archivo no tiene todas las filas de {model._meta.db_table}.")
+        except BaseException:
+            connections[alias].close()
+            path.unlink(missing_ok=True)
+            raise
+        connections[alias].close()
+
+        with transaction.atomic():
+            items.delete()
+            sales.delete()
+        if options['vacuum']:
+            with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+                cursor.execute('VACUUM')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{expected[Sales]} ventas y {expected[salesItems]} lineas de {year} archivadas en {path}."
+        ))
+
+    def copy(self, model, queryset, alias, batch_size):
+        batch = []
+        for obj in queryset.order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(obj)
+            if len(batch) == batch_size:
+                model.objects.using(alias).bulk_create(batch)
+                batch = []
+        if batch:
+            model.objects.using(alias).bulk_create(batch)
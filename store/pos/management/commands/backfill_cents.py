@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.functions import Cast, Round
+
+from pos.models import Sales, salesItems
+
+
+def cents(field):
+    # Igual que to_cents(): primero al centavo, porque 1.005 * 100 es 100.4999...
+    return Cast(Round(Round(F(field), 2) * 100), models.BigIntegerField())
+
+
+class Command(BaseCommand):
+    help = (
+        "Llena las columnas en centavos de ventas y lineas de venta a partir de "
+        "los importes guardados. Se ejecuta una vez despues de migrar; las ventas "
+        "nuevas ya se guardan con los centavos."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for model in (Sales, salesItems):
+                updated = model.objects.update(**{
+                    f'{field}_cents': cents(field) for field in model.CENTS_FIELDS
+                })
+                self.stdout.write(f"{model._meta.verbose_name_plural}: {updated}")
+        self.stdout.write(self.style.SUCCESS("Columnas en centavos actualizadas."))
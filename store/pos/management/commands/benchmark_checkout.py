@@ -0,0 +1,66 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from pos.models import Sales
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la latencia de asignar el codigo y registrar una venta a medida que "
+        "crece la tabla de ventas. Todo se ejecuta dentro de una transaccion que "
+        "se revierte al final, la base de datos no se modifica."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--checkpoints', default='10,1000,10000,100000',
+            help="Cantidad de ventas existentes en las que se mide (separadas por coma).",
+        )
+        parser.add_argument('--samples', type=int, default=200, help="Ventas medidas en cada punto.")
+
+    def handle(self, *args, **options):
+        checkpoints = sorted(int(n) for n in options['checkpoints'].split(','))
+        samples = options['samples']
+
+        with transaction.atomic():
+            existing = Sales.objects.count()
+            for checkpoint in checkpoints:
+                missing = checkpoint - existing
+                if missing > 0:
+                    self.fill(missing)
+                    existing = checkpoint
+
+                code_timings, sale_timings = [], []
+                for _ in range(samples):
+                    start = time.perf_counter()
+                    code = Sales.next_code()
+                    allocated = time.perf_counter()
+                    Sales(code=code).save()
+                    end = time.perf_counter()
+                    code_timings.append((allocated - start) * 1000)
+                    sale_timings.append((end - start) * 1000)
+                existing += samples
+
+                self.stdout.write(
+                    f"{checkpoint:>8} ventas: codigo {self.summary(code_timings)} | "
+                    f"venta completa {self.summary(sale_timings)}"
+                )
+            transaction.set_rollback(True)
+
+    def summary(self, timings):
+        timings = sorted(timings)
+        p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+        return f"media {statistics.mean(timings):.3f} ms, p95 {p95:.3f} ms"
+
+    def fill(self, count, batch_size=5000):
+        # Ventas de relleno insertadas en bloque.
+        while count > 0:
+            size = min(batch_size, count)
+            Sales.objects.bulk_create(
+                [Sales(code=f'BENCH{count - i}', cliente='benchmark') for i in range(size)],
+                batch_size=batch_size,
+            )
+            count -= size
@@ -0,0 +1,86 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from inventory.models import Category, Products
+from pos import checkout
+from pos.models import Sales, salesItems
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el costo de escritura por linea de venta (consultas y milisegundos) "
+        "por el camino del modelo salesItems.save(), el descuento directo del "
+        "producto y el motor de cobro. Los dos primeros se miden tambien por el "
+        "camino anterior (save validado y estado en un segundo save) para "
+        "comparar antes y despues. Todo se revierte al final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=500, help="Lineas medidas por camino.")
+
+    def handle(self, *args, **options):
+        lines = options['lines']
+        with transaction.atomic():
+            category = Category.objects.create(name='benchmark', description='')
+            product = Products.objects.create(
+                code='BENCH-LINE', name='benchmark', category=category, price=10, cost=5, quantity=lines * 10,
+            )
+            sale = Sales(code='BENCH-LINE')
+            sale.save()
+
+            def legacy_quantity_on_sale(qty):
+                # Camino anterior: full_clean en cada save y el estado en un segundo save().
+                product.quantity -= qty
+                status = product.status
+                product.save(update_fields=['quantity'])
+                if product.status != status:
+                    product.save(update_fields=['status'])
+
+            def legacy_model_line():
+                item = salesItems(sale=sale, product=product, qty=1, price=10, total=10)
+                item.update_product_quantity = lambda: legacy_quantity_on_sale(item.qty)
+                item.save()
+
+            def legacy_product_update():
+                legacy_quantity_on_sale(1)
+
+            def model_line():
+                salesItems(sale=sale, product=product, qty=1, price=10, total=10).save()
+
+            def product_update():
+                product.update_quantity_on_sale(1)
+
+            def engine_line():
+                checkout.create_sale([(product.pk, 1, None)], code='BENCH-LINE')
+
+            for name, write in (
+                ('salesItems.save() antes', legacy_model_line),
+                ('salesItems.save()', model_line),
+                ('update_quantity_on_sale() antes', legacy_product_update),
+                ('update_quantity_on_sale()', product_update),
+                ('checkout.create_sale()', engine_line),
+            ):
+                self.measure(name, write, lines)
+            transaction.set_rollback(True)
+
+    def measure(self, name, write, lines):
+        timings = []
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            for _ in range(lines):
+                start = time.perf_counter()
+                write()
+                timings.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(
+            f"{name:>34}: {queries / lines:.1f} consultas/linea, "
+            f"media {statistics.mean(timings):.3f} ms, mediana {statistics.median(timings):.3f} ms"
+        )
@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.sqlite import BUSY_ERRORS, DEFAULT_PRAGMAS, pragma_statements
+
+# Configuracion por defecto de Django: journal DELETE, transacciones diferidas
+# y 5 segundos de espera por bloqueo.
+PROFILES = {
+    'default': {'pragmas': {}, 'begin': 'BEGIN', 'timeout': 5},
+    'tuned': {'pragmas': DEFAULT_PRAGMAS, 'begin': 'BEGIN IMMEDIATE', 'timeout': 5},
+}
+
+SCHEMA = """
+CREATE TABLE products (id INTEGER PRIMARY KEY, price REAL, quantity INTEGER);
+CREATE TABLE sales (id INTEGER PRIMARY KEY, grand_total REAL, date_added TEXT);
+CREATE TABLE sales_items (id INTEGER PRIMARY KEY, sale_id INTEGER, product_id INTEGER, qty INTEGER, total REAL);
+CREATE INDEX sales_items_sale ON sales_items (sale_id);
+"""
+
+REPORT_QUERY = """
+SELECT p.id, SUM(i.qty), SUM(i.total)
+FROM sales_items i JOIN products p ON p.id = i.product_id
+GROUP BY p.id
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara el rendimiento de lectura y escritura concurrente de SQLite con la "
+        "configuracion por defecto y con los pragmas de core/sqlite.py. Usa una base "
+        "temporal con el mismo patron de escrituras que el cobro; no toca la base del proyecto."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4, help="Hilos que registran ventas.")
+        parser.add_argument('--readers', type=int, default=2, help="Hilos que leen como un reporte.")
+        parser.add_argument('--duration', type=float, default=10, help="Segundos por configuracion.")
+        parser.add_argument('--products', type=int, default=200)
+        parser.add_argument('--sales', type=int, default=20000, help="Ventas existentes antes de medir.")
+
+    def handle(self, *args, **options):
+        for name, profile in PROFILES.items():
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self.prepare(path, profile, options['products'], options['sales'])
+                result = self.run(path, profile, options)
+            self.stdout.write(
+                f"{name:>8}: {result['writes'] / options['duration']:.1f} ventas/s, "
+                f"{result['reads'] / options['duration']:.1f} lecturas/s, "
+                f"{result['locked']} errores 'database is locked'"
+            )
+
+    def connect(self, path, profile):
+        conn = sqlite3.connect(path, timeout=profile['timeout'], isolation_level=None, check_same_thread=False)
+        for statement in pragma_statements(profile['pragmas']):
+            conn.execute(statement)
+        return conn
+
+    def prepare(self, path, profile, products, sales):
+        conn = self.connect(path, profile)
+        conn.executescript(SCHEMA)
+        conn.execute('BEGIN')
+        conn.executemany(
+            'INSERT INTO products (id, price, quantity) VALUES (?, 10, 1000000)',
+            [(i,) for i in range(1, products + 1)],
+        )
+        for sale_id in range(1, sales + 1):
+            conn.execute("INSERT INTO sales (id, grand_total, date_added) VALUES (?, 20, datetime('now'))", (sale_id,))
+            conn.execute(
+                'INSERT INTO sales_items (sale_id, product_id, qty, total) VALUES (?, ?, 2, 20)',
+                (sale_id, sale_id % products + 1),
+            )
+        conn.execute('COMMIT')
+        conn.close()
+
+    def run(self, path, profile, options):
+        deadline = time.monotonic() + options['duration']
+        counts = {'writes': 0, 'reads': 0, 'locked': 0}
+        lock = threading.Lock()
+        products = options['products']
+
+        def count(name):
+            with lock:
+                counts[name] += 1
+
+        def writer(seed):
+            conn = self.connect(path, profile)
+            n = seed
+            while time.monotonic() < deadline:
+                n += 1
+                try:
+                    # Mismo patron que el cobro: leer precio, descontar stock, insertar venta y lineas.
+                    conn.execute(profile['begin'])
+                    product_id = n % products + 1
+                    conn.execute('SELECT price FROM products WHERE id = ?', (product_id,)).fetchone()
+                    conn.execute(
+                        'UPDATE products SET quantity = quantity - 1 WHERE id = ? AND quantity >= 1', (product_id,)
+                    )
+                    sale_id = conn.execute(
+                        "INSERT INTO sales (grand_total, date_added) VALUES (10, datetime('now'))"
+                    ).lastrowid
+                    conn.execute(
+                        'INSERT INTO sales_items (sale_id, product_id, qty, total) VALUES (?, ?, 1, 10)',
+                        (sale_id, product_id),
+                    )
+                    conn.execute('COMMIT')
+                    count('writes')
+                except sqlite3.OperationalError as e:
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                    if not any(message in str(e) for message in BUSY_ERRORS):
+                        raise
+                    count('locked')
+            conn.close()
+
+        def reader():
+            conn = self.connect(path, profile)
+            while time.monotonic() < deadline:
+                try:
+                    conn.execute(REPORT_QUERY).fetchall()
+                    count('reads')
+                except sqlite3.OperationalError as e:
+                    if not any(message in str(e) for message in BUSY_ERRORS):
+                        raise
+                    count('locked')
+            conn.close()
+
+        threads = [threading.Thread(target=writer, args=(i * 1000003,)) for i in range(options['writers'])]
+        threads += [threading.Thread(target=reader) for _ in range(options['readers'])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts
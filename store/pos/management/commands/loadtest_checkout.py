@@ -0,0 +1,349 @@
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from inventory.models import Category, Products
+from pos.models import Sales, salesItems
+
+LOADTEST_PREFIX = 'LOADTEST-'
+# Paginas que consultan los usuarios de reportes mientras se vende.
+REPORT_PATHS = (
+    '/report/sales_report/?draw=1&start=0&length=25&order[0][column]=3&order[0][dir]=desc',
+    '/report/profit-report/',
+    '/report/mix-report/',
+    '/',
+)
+
+
+class ClientTransport:
+    """Peticiones con el cliente de pruebas de Django, en el mismo proceso."""
+
+    def __init__(self, user, host):
+        # Los errores de las vistas vuelven como respuestas 500. got_request_exception
+        # es global al proceso: si el cliente relanzara la excepcion, el error de un
+        # reporte en otro hilo apareceria como un cobro fallido en este.
+        self.client = Client(HTTP_HOST=host, raise_request_exception=False)
+        self.client.force_login(user)
+
+    def result(self, response):
+        body = response.content
+        if response.status_code == 500 and response.exc_info:
+            # Sin DEBUG la pagina 500 no dice la causa; el texto de la excepcion
+            # solo se usa para distinguir los bloqueos de los demas errores.
+            body = str(response.exc_info[1]).encode()
+        return response.status_code, body
+
+    def get(self, path):
+        return self.result(self.client.get(path))
+
+    def post_json(self, path, payload):
+        return self.result(self.client.post(path, json.dumps(payload), content_type='application/json'))
+
+    def close(self):
+        connection.close()
+
+
+class HttpTransport:
+    """Peticiones HTTP contra un servidor en marcha, con las cookies de sesion y CSRF indicadas."""
+
+    def __init__(self, base_url, sessionid, csrftoken):
+        self.base_url = base_url.rstrip('/')
+        self.headers = {'Cookie': f'sessionid={sessionid}; csrftoken={csrftoken}', 'X-CSRFToken': csrftoken}
+
+    def request(self, path, body=None, headers=None):
+        request = urllib.request.Request(self.base_url + path, data=body, headers={**self.headers, **(headers or {})})
+        try:
+            with urllib.request.urlopen(request, timeout=60) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def get(self, path):
+        return self.request(path)
+
+    def post_json(self, path, payload):
+        return self.request(path, json.dumps(payload).encode(), {'Content-Type': 'application/json'})
+
+    def close(self):
+        pass
+
+
+def percentiles(timings):
+    if not timings:
+        return {'p50': None, 'p95': None, 'p99': None}
+    if len(timings) == 1:
+        return {'p50': timings[0], 'p95': timings[0], 'p99': timings[0]}
+    cuts = statistics.quantiles(timings, n=100, method='inclusive')
+    return {'p50': round(cuts[49], 3), 'p95': round(cuts[94], 3), 'p99': round(cuts[98], 3)}
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga del cobro: N cajeros suben ventas por upload-sales (el camino "
+        "del POS) al mismo tiempo que M usuarios consultan reportes. Mide ventas por "
+        "segundo, latencias p50/p95/p99, errores 'database is locked' y verifica que no "
+        "se venda mas stock del que habia. Con el cliente de pruebas corre sobre una "
+        "copia temporal de la base, porque las ventas consumen codigos y numeros de "
+        "cliente; con --url escribe en la base del servidor y solo se permite con DEBUG."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cashiers', type=int, default=4, help="Cajeros concurrentes.")
+        parser.add_argument('--reporters', type=int, default=1, help="Usuarios de reportes concurrentes.")
+        parser.add_argument('--duration', type=float, default=30, help="Duracion de la prueba en segundos.")
+        parser.add_argument('--products', type=int, default=20, help="Productos de prueba.")
+        parser.add_argument('--stock', type=int, default=200, help="Stock inicial de cada producto de prueba.")
+        parser.add_argument('--lines', type=int, default=3, help="Lineas por venta.")
+        parser.add_argument('--seed', type=int, default=1, help="Semilla para que la carga sea reproducible.")
+        parser.add_argument('--user', help="Usuario con el que se vende (por defecto el primer superusuario).")
+        parser.add_argument('--host', default='localhost', help="Host de las peticiones del cliente de pruebas.")
+        parser.add_argument('--url', help="URL de un servidor en marcha; sin ella se usa el cliente de pruebas.")
+        parser.add_argument('--sessionid', help="Cookie de sesion para --url.")
+        parser.add_argument('--csrftoken', help="Cookie CSRF de la misma sesion para --url.")
+        parser.add_argument('--output', default='loadtest-{date}.json', help="Archivo del reporte JSON.")
+        parser.add_argument(
+            '--group-commit', action='store_true',
+            help="Activa POS_GROUP_COMMIT durante la prueba (solo con el cliente de pruebas).",
+        )
+        parser.add_argument(
+            '--keep', action='store_true',
+            help="No eliminar la copia de la base (o, con --url, las ventas y productos de prueba).",
+        )
+
+    def handle(self, *args, **options):
+        scratch = None
+        if options['url']:
+            if not options['sessionid'] or not options['csrftoken']:
+                raise CommandError("--url requiere --sessionid y --csrftoken.")
+            if not settings.DEBUG:
+                raise CommandError("Con --url la prueba escribe en la base del servidor; solo se permite con DEBUG activo.")
+        else:
+            scratch = self.use_scratch_database()
+        user = self.get_user(options['user']) if not options['url'] else None
+
+        product_ids = self.create_products(options['products'], options['stock'])
+        self.upload_url = reverse('pos:upload-sales')
+        self.deadline = time.monotonic() + options['duration']
+        self.lock = threading.Lock()
+        self.results = {'checkout': [], 'reports': []}
+
+        def transport():
+            if options['url']:
+                return HttpTransport(options['url'], options['sessionid'], options['csrftoken'])
+            return ClientTransport(user, options['host'])
+
+        threads = [
+            threading.Thread(target=self.cashier, args=(transport, product_ids, options['lines'], options['seed'] + i))
+            for i in range(options['cashiers'])
+        ] + [
+            threading.Thread(target=self.reporter, args=(transport, options['seed'] + 1000 + i))
+            for i in range(options['reporters'])
+        ]
+        with override_settings(POS_GROUP_COMMIT=options['group_commit'] or settings.POS_GROUP_COMMIT):
+            started = time.monotonic()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.monotonic() - started
+
+        report = {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'scratch': scratch is not None,
+            'config': {
+                name: options[name]
+                for name in ('cashiers', 'reporters', 'duration', 'products', 'stock', 'lines', 'seed', 'url', 'group_commit')
+            },
+            'elapsed': round(elapsed, 3),
+            'checkout': self.summary(self.results['checkout'], elapsed),
+            'reports': self.summary(self.results['reports'], elapsed),
+            'stock': self.check_stock(product_ids, options['stock']),
+        }
+        output = options['output'].format(date=datetime.now().strftime('%Y%m%d-%H%M%S'))
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+        if scratch is not None:
+            self.drop_scratch_database(scratch, options['keep'])
+        elif not options['keep']:
+            self.cleanup(product_ids)
+
+        checkout_summary = report['checkout']
+        self.stdout.write(
+            f"Ventas: {checkout_summary['ok']} ({checkout_summary['throughput']} por segundo), "
+            f"p50 {checkout_summary['p50']} ms, p95 {checkout_summary['p95']} ms, p99 {checkout_summary['p99']} ms, "
+            f"bloqueos {checkout_summary['locked']}, errores {checkout_summary['errors']}"
+        )
+        if report['stock']['oversold']:
+            self.stdout.write(self.style.ERROR(f"Stock vendido de mas en: {report['stock']['oversold']}"))
+        self.stdout.write(self.style.SUCCESS(f"Reporte guardado en {output}"))
+
+    def use_scratch_database(self):
+        """
+        Copia la base SQLite a un archivo temporal y la usa en lugar de la real
+        en todas las conexiones de este proceso (tambien las de los hilos).
+        """
+        if connection.vendor != 'sqlite':
+            raise CommandError("La copia temporal de la base solo funciona con SQLite; use --url con DEBUG.")
+        fd, path = tempfile.mkstemp(prefix='loadtest-', suffix='.sqlite3')
+        os.close(fd)
+        source = sqlite3.connect(str(connection.settings_dict['NAME']))
+        target = sqlite3.connect(path)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+        connection.close()
+        # Es el mismo diccionario de connections.settings: las conexiones nuevas usan la copia.
+        connection.settings_dict['NAME'] = path
+        self.stdout.write(f"Prueba sobre una copia de la base: {path}")
+        return path
+
+    def drop_scratch_database(self, path, keep):
+        connection.close()
+        if keep:
+            self.stdout.write(f"Copia de la base conservada en {path}")
+            return
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    def get_user(self, username):
+        User = get_user_model()
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"No existe el usuario {username}.")
+        user = User.objects.filter(is_superuser=True).order_by('pk').first()
+        if user is None:
+            raise CommandError("Se necesita un superusuario o --user.")
+        return user
+
+    def create_products(self, count, stock):
+        category, _ = Category.objects.get_or_create(name=f'{LOADTEST_PREFIX}categoria', defaults={'description': ''})
+        ids = []
+        for i in range(count):
+            product, _ = Products.objects.update_or_create(
+                code=f'{LOADTEST_PREFIX}{i}',
+                defaults={
+                    'name': f'Producto de carga {i}',
+                    'category': category,
+                    'price': 10,
+                    'cost': 5,
+                    'quantity': stock,
+                    'status': Products.STATUS_ACTIVE,
+                },
+            )
+            ids.append(product.pk)
+        return ids
+
+    def record(self, kind, elapsed, outcome):
+        with self.lock:
+            self.results[kind].append((elapsed, outcome))
+
+    def cashier(self, transport, product_ids, lines, seed):
+        rng = random.Random(seed)
+        conn = transport()
+        try:
+            while time.monotonic() < self.deadline:
+                picked = rng.sample(product_ids, min(lines, len(product_ids)))
+                qtys = [rng.randint(1, 3) for _ in picked]
+                total = sum(qtys) * 10
+                sale = {
+                    'key': str(uuid.uuid4()),
+                    'items': [{'product': product, 'qty': qty, 'price': 10} for product, qty in zip(picked, qtys)],
+                    'sub_total': total, 'tax': 0, 'tax_amount': 0, 'grand_total': total,
+                    'tendered_amount': total, 'amount_change': 0,
+                }
+                start = time.perf_counter()
+                try:
+                    status, body = conn.post_json(self.upload_url, {'sales': [sale]})
+                    outcome = self.checkout_outcome(status, body)
+                except Exception:
+                    # Errores de red o respuestas que no se pueden leer.
+                    outcome = 'error'
+                self.record('checkout', (time.perf_counter() - start) * 1000, outcome)
+        finally:
+            conn.close()
+
+    def failure_outcome(self, status, body):
+        return 'locked' if status == 500 and b'database is locked' in body else 'error'
+
+    def checkout_outcome(self, status, body):
+        if status != 200:
+            return self.failure_outcome(status, body)
+        result = json.loads(body)['results'][0]
+        if result['status'] == 'created':
+            return 'ok'
+        if 'No hay suficiente cantidad' in result.get('msg', ''):
+            return 'rejected'
+        return 'error'
+
+    def reporter(self, transport, seed):
+        rng = random.Random(seed)
+        conn = transport()
+        try:
+            while time.monotonic() < self.deadline:
+                start = time.perf_counter()
+                try:
+                    status, body = conn.get(rng.choice(REPORT_PATHS))
+                    outcome = 'ok' if status == 200 else self.failure_outcome(status, body)
+                except Exception:
+                    # Errores de red o respuestas que no se pueden leer.
+                    outcome = 'error'
+                self.record('reports', (time.perf_counter() - start) * 1000, outcome)
+        finally:
+            conn.close()
+
+    def summary(self, results, elapsed):
+        timings = sorted(ms for ms, _ in results)
+        outcomes = [outcome for _, outcome in results]
+        ok = outcomes.count('ok')
+        return {
+            'requests': len(results),
+            'ok': ok,
+            'rejected': outcomes.count('rejected'),
+            'locked': outcomes.count('locked'),
+            'errors': outcomes.count('error'),
+            'throughput': round(ok / elapsed, 2) if elapsed else None,
+            **percentiles(timings),
+        }
+
+    def check_stock(self, product_ids, stock):
+        """El stock final debe ser el inicial menos lo vendido, y nunca negativo."""
+        sold = dict(
+            salesItems.objects.filter(product_id__in=product_ids)
+            .values('product').annotate(qty=Sum('qty')).values_list('product', 'qty')
+        )
+        quantities = dict(Products.objects.filter(pk__in=product_ids).values_list('pk', 'quantity'))
+        oversold = [
+            product_id for product_id in product_ids
+            if sold.get(product_id, 0) > stock or quantities[product_id] != stock - sold.get(product_id, 0)
+        ]
+        return {'sold': sum(sold.values()), 'oversold': oversold}
+
+    def cleanup(self, product_ids):
+        sales = Sales.objects.filter(salesitems__product_id__in=product_ids).distinct()
+        Sales.objects.filter(pk__in=list(sales.values_list('pk', flat=True))).delete()
+        Products.objects.filter(pk__in=product_ids).delete()
+        Category.objects.filter(name=f'{LOADTEST_PREFIX}categoria').delete()
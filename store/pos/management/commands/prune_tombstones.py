@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from pos import catalog
+
+
+class Command(BaseCommand):
+    help = (
+        "Elimina los registros de productos eliminados mas viejos que "
+        "TOMBSTONE_RETENTION. Los terminales con un cursor anterior recargan "
+        "el catalogo completo; se puede programar en cron una vez al dia."
+    )
+
+    def handle(self, *args, **options):
+        deleted = catalog.prune_tombstones()
+        self.stdout.write(self.style.SUCCESS(f"Registros de productos eliminados depurados: {deleted}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from pos import holds
+
+
+class Command(BaseCommand):
+    help = (
+        "Elimina las reservas de stock vencidas. Las reservas vencidas ya no "
+        "descuentan disponibilidad; se puede programar en cron cada pocos minutos."
+    )
+
+    def handle(self, *args, **options):
+        deleted = holds.sweep()
+        self.stdout.write(self.style.SUCCESS(f"Reservas vencidas eliminadas: {deleted}"))
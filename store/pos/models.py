@@ -1,18 +1,113 @@
 from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
 from unicodedata import category
 from django.db import models
 from django.utils import timezone
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import IntegrityError, transaction
+from django.db.models import F, Max, Sum
+from django.db.models.functions import Cast, Coalesce, Round, Substr
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 from inventory.models import *
 
-class Sales(models.Model):
+
+def to_cents(value):
+    """
+    Convierte un importe a centavos enteros, redondeando al centavo. Un float se
+    convierte por su texto: Decimal(1.005) es 1.00499999..., Decimal('1.005') no.
+    """
+    if isinstance(value, float):
+        value = str(value)
+    return int(Decimal(value or 0).scaleb(2).quantize(Decimal(1), ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return Decimal(cents or 0).scaleb(-2)
+
+
+def cents_expression(field):
+    """
+    Centavos de `field` en SQL. Las filas anteriores a las columnas en centavos
+    las tienen en NULL hasta correr backfill_cents; mientras tanto se usa el importe.
+    """
+    # Se redondea primero al centavo, como to_cents(): 1.005 * 100 es 100.4999...
+    return Coalesce(f'{field}_cents', Cast(Round(Round(F(field), 2) * 100), models.BigIntegerField()))
+
+
+def sum_amount(queryset, field):
+    """Suma exacta en SQL de la columna en centavos de `field`; devuelve Decimal."""
+    return from_cents(queryset.aggregate(total=Sum(cents_expression(field)))['total'])
+
+
+class CentsMixin:
+    """
+    Los importes se guardan tambien en centavos enteros (`<campo>_cents`), que
+    es lo que se suma en los reportes. `CENTS_FIELDS` lista los campos
+    duplicados; las columnas en centavos se recalculan en cada save().
+    """
+    CENTS_FIELDS = ()
+
+    def sync_cents(self):
+        for field in self.CENTS_FIELDS:
+            setattr(self, f'{field}_cents', to_cents(getattr(self, field)))
+
+    def amount(self, field):
+        """Importe exacto de `field` como Decimal."""
+        cents = getattr(self, f'{field}_cents')
+        if cents is None:
+            # Fila anterior a las columnas en centavos, aun sin backfill_cents.
+            cents = to_cents(getattr(self, field))
+        return from_cents(cents)
+
+    def cents_update_fields(self, update_fields):
+        if update_fields is None:
+            return None
+        update_fields = set(update_fields)
+        return update_fields | {f'{field}_cents' for field in self.CENTS_FIELDS if field in update_fields}
+
+
+class Sequence(models.Model):
+    """Contador con nombre que se incrementa de forma atomica en la base de datos."""
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    @classmethod
+    def next_value(cls, name, seed=None):
+        """
+        Incrementa el contador `name` y devuelve el nuevo valor.
+
+        El costo es constante (un UPDATE y un SELECT por la clave unica). Si el
+        contador aun no existe se crea con el valor devuelto por `seed()`, que
+        solo se ejecuta una vez por contador.
+        """
+        with transaction.atomic():
+            if not cls.objects.filter(name=name).update(value=F('value') + 1):
+                start = seed() if seed else 0
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(name=name, value=start + 1)
+                    return start + 1
+                except IntegrityError:
+                    # Otro terminal creo el contador al mismo tiempo.
+                    cls.objects.filter(name=name).update(value=F('value') + 1)
+            return cls.objects.values_list('value', flat=True).get(name=name)
+
+
+class Sales(CentsMixin, models.Model):
+    CENTS_FIELDS = ('sub_total', 'grand_total', 'tax_amount')
+
     code = models.CharField(max_length=100)
     sub_total = models.FloatField(default=0)
     grand_total = models.FloatField(default=0)
     tax_amount = models.FloatField(default=0)
+    # NULL solo en ventas anteriores a estas columnas (ver backfill_cents).
+    sub_total_cents = models.BigIntegerField(null=True)
+    grand_total_cents = models.BigIntegerField(null=True)
+    tax_amount_cents = models.BigIntegerField(null=True)
     tax = models.FloatField(default=0)
     tendered_amount = models.FloatField(default=0)
     amount_change = models.FloatField(default=0)
@@ -20,30 +115,63 @@ class Sales(models.Model):
     date_updated = models.DateTimeField(auto_now=True) 
 
     cliente = models.CharField(max_length=100, blank=True)  
+    # Clave generada por el terminal para no registrar dos veces la misma venta.
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True)
 
     def save(self, *args, **kwargs):
-        if not self.pk or self.cliente == "Cliente 1": 
-            
-            ventas_hoy = Sales.objects.filter(date_added__date=timezone.now().date()).count()
-            
-            self.cliente = f"Cliente {ventas_hoy + 1}"
-            print("Cliente:", self.cliente) 
-        super().save(*args, **kwargs)
+        self.sync_cents()
+        kwargs['update_fields'] = self.cents_update_fields(kwargs.get('update_fields'))
+        with transaction.atomic():
+            if not self.pk:
+                self.cliente = f"Cliente {self.next_customer_number()}"
+            super().save(*args, **kwargs)
+
+    @classmethod
+    def next_customer_number(cls):
+        """Numero de cliente del dia, tomado de un contador diario."""
+        today = timezone.now().date()
+
+        def sales_today():
+            # Solo se ejecuta la primera vez del dia.
+            start = datetime.combine(today, datetime.min.time())
+            return cls.objects.filter(date_added__gte=start).count()
+
+        return Sequence.next_value(f'cliente-{today.isoformat()}', seed=sales_today)
     
     def __str__(self):
         return self.code
 
+    @classmethod
+    def next_code(cls):
+        """Asigna el siguiente codigo de venta del año usando un contador por año."""
+        year = datetime.now().year
+        pref = str(year + year)
+
+        def last_number():
+            # Continua la numeracion de las ventas registradas antes del contador.
+            # El maximo se toma sobre el numero: como texto '100000' < '99999'.
+            number = Cast(Substr('code', len(pref) + 1), models.BigIntegerField())
+            return cls.objects.filter(code__startswith=pref).aggregate(last=Max(number))['last'] or 0
+
+        number = Sequence.next_value(f'sales-code-{year}', seed=last_number)
+        return pref + '{:0>5}'.format(number)
+
         
-class salesItems(models.Model):
-    
+class salesItems(CentsMixin, models.Model):
+    CENTS_FIELDS = ('price', 'total')
+
     sale = models.ForeignKey(Sales,on_delete=models.CASCADE)
     product = models.ForeignKey(Products,on_delete=models.CASCADE)
     price = models.FloatField(default=0)
     qty = models.IntegerField(default=0)
     total = models.FloatField(default=0)
+    price_cents = models.BigIntegerField(null=True)
+    total_cents = models.BigIntegerField(null=True)
 
     def save(self, *args, **kwargs):
         print(f"Guardando SalesItem: Producto: {self.product.name}, Cantidad Vendida: {self.qty}")
+        self.sync_cents()
+        kwargs['update_fields'] = self.cents_update_fields(kwargs.get('update_fields'))
         super().save(*args, **kwargs)
         self.update_product_quantity()
         
@@ -55,4 +183,88 @@ class salesItems(models.Model):
     def delete(self, *args, **kwargs):
         print(f"Eliminando SalesItem: Producto: {self.product.name}, Cantidad Vendida: {self.qty}")
         self.product.increase_quantity(self.qty)
-        super().delete(*args, **kwargs)
\ No newline at end of file
+        super().delete(*args, **kwargs)
+
+
+class ReceiptSnapshot(models.Model):
+    """Recibo ya renderizado de una venta; se borra junto con la venta."""
+    sale = models.OneToOneField(Sales, on_delete=models.CASCADE, primary_key=True)
+    html = models.TextField()
+    payload = models.JSONField()
+    date_added = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.payload.get('code', '')
+
+
+class ProductTombstone(models.Model):
+    """Registro de un producto eliminado, para que los terminales lo quiten del catalogo."""
+    product_id = models.BigIntegerField()
+    code = models.CharField(max_length=100)
+    date_deleted = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return self.code
+
+
+class StockHold(models.Model):
+    """Reserva temporal de stock para un carrito abierto en un terminal."""
+    cart = models.CharField(max_length=64)
+    product = models.ForeignKey(Products, on_delete=models.CASCADE)
+    qty = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('cart', 'product')
+        indexes = [
+            models.Index(fields=['product', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.cart}: {self.product_id} x {self.qty}"
+
+    @classmethod
+    def held(cls, product_ids, now, exclude_cart=None):
+        """
+        Cantidad reservada por producto en reservas vigentes. Usa el indice
+        (product, expires_at), asi solo lee las reservas de esos productos.
+        """
+        holds = cls.objects.filter(product_id__in=product_ids, expires_at__gt=now)
+        if exclude_cart:
+            holds = holds.exclude(cart=exclude_cart)
+        return dict(holds.order_by().values('product').annotate(qty=Sum('qty')).values_list('product', 'qty'))
+
+
+@receiver(post_save, sender=Products)
+def products_saved(sender, instance, update_fields=None, **kwargs):
+    from .catalog import CATALOG_FIELDS, bump_catalog_version
+    if update_fields is None or CATALOG_FIELDS.intersection(update_fields):
+        bump_catalog_version()
+
+
+@receiver(products_bulk_saved)
+def products_imported(sender, created, updated, **kwargs):
+    from .catalog import bump_catalog_version
+    if created or updated:
+        bump_catalog_version()
+
+
+@receiver(post_delete, sender=Products)
+def products_deleted(sender, instance, **kwargs):
+    from .catalog import bump_catalog_version
+    ProductTombstone.objects.create(product_id=instance.pk, code=instance.code)
+    bump_catalog_version()
+
+
+@receiver(post_save, sender=Sales)
+def sales_saved(sender, instance, created, **kwargs):
+    if not created:
+        ReceiptSnapshot.objects.filter(sale=instance).delete()
+
+
+# Sin post_delete: al anular ventas las lineas se borran con un solo DELETE y
+# el recibo se elimina en cascada con la venta.
+@receiver(post_save, sender=salesItems)
+def sales_items_changed(sender, instance, **kwargs):
+    ReceiptSnapshot.objects.filter(sale_id=instance.sale_id).delete()
+
@@ -0,0 +1,65 @@
+from django.db import IntegrityError, transaction
+from django.template.loader import render_to_string
+from django.utils import translation
+from django.utils.dateformat import DateFormat
+
+from .archive import find_archived_sale
+from .models import ReceiptSnapshot, Sales
+
+RECEIPT_FIELDS = ('code', 'cliente', 'sub_total', 'grand_total', 'tax', 'tax_amount', 'tendered_amount', 'amount_change')
+
+
+def receipt_payload(sale):
+    payload = {field: getattr(sale, field) for field in RECEIPT_FIELDS}
+    payload['tax_amount'] = format(float(payload['tax_amount']))
+    payload['date_added'] = sale.date_added.isoformat()
+    # Cambiar el idioma a español para la fecha
+    with translation.override('es'):
+        payload['formatted_date'] = DateFormat(sale.date_added).format('d \\de F Y')
+    payload['items'] = [
+        {'product': name, 'qty': qty, 'price': price, 'total': total}
+        for name, qty, price, total in sale.salesitems_set
+        .order_by('pk')
+        .values_list('product__name', 'qty', 'price', 'total')
+    ]
+    return payload
+
+
+def render_receipt(payload):
+    context = {
+        "transaction": payload,
+        "salesItems": payload['items'],
+        "formatted_date": payload['formatted_date'],
+    }
+    return render_to_string('pos/receipt.html', context)
+
+
+def receipt_snapshot(sale_id):
+    """
+    Recibo de la venta. La primera vez se arma y se guarda; despues se sirve el
+    mismo snapshot. Devuelve None si la venta no existe.
+    """
+    snapshot = ReceiptSnapshot.objects.filter(sale_id=sale_id).first()
+    if snapshot is not None:
+        return snapshot
+
+    sale = Sales.objects.filter(id=sale_id).first()
+    if sale is None:
+        return None
+    payload = receipt_payload(sale)
+    snapshot = ReceiptSnapshot(sale=sale, html=render_receipt(payload), payload=payload)
+    try:
+        with transaction.atomic():
+            snapshot.save(force_insert=True)
+    except IntegrityError:
+        # Otra peticion guardo el mismo recibo al mismo tiempo.
+        pass
+    return snapshot
+
+
+def archived_receipt(sale_id):
+    """Recibo de una venta archivada; no se guarda snapshot porque el archivo es de solo lectura."""
+    sale = find_archived_sale(sale_id)
+    if sale is None:
+        return None
+    return render_receipt(receipt_payload(sale))
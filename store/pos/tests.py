@@ -1,3 +1,534 @@
-from django.test import TestCase
+import importlib
+import json
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connections
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.models import Category, Products
+from . import archive, barcodes, catalog, checkout, group_commit, holds, receipts
+from .models import ReceiptSnapshot, Sales, Sequence, StockHold, salesItems, sum_amount, to_cents
+
+
+class CheckoutTestCase(TestCase):
+    """Categoria con dos productos activos para registrar ventas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Abarrotes', description='')
+        cls.rice = Products.objects.create(code='100', name='Arroz', category=cls.category, price=10, cost=5, quantity=5)
+        cls.beans = Products.objects.create(code='101', name='Frijol', category=cls.category, price=20, cost=8, quantity=3)
+
+    def quantity(self, product):
+        return Products.objects.get(pk=product.pk).quantity
+
+    def active_count(self, category=None):
+        return Category.objects.get(pk=(category or self.category).pk).active_product_count
+
+    def login(self, *codenames):
+        user = User.objects.create_user('cajero', password='x')
+        user.user_permissions.add(*Permission.objects.filter(codename__in=codenames))
+        self.client.force_login(user)
+
+    def upload(self, key, *lines, **fields):
+        return {'key': key, 'items': [{'product': p.pk, 'qty': qty, 'price': 10} for p, qty in lines], **fields}
+
+
+class SaleCodeTests(TestCase):
+    def test_codes_follow_the_counter(self):
+        first, second = Sales.next_code(), Sales.next_code()
+        self.assertEqual(int(second), int(first) + 1)
+
+    def test_seed_takes_the_numeric_maximum(self):
+        year = datetime.now().year
+        pref = str(year + year)
+        for number in ('00007', '99999', '100000'):
+            Sales.objects.create(code=pref + number)
+        self.assertFalse(Sequence.objects.filter(name=f'sales-code-{year}').exists())
+        self.assertEqual(Sales.next_code(), pref + '100001')
+
+
+class CreateSaleTests(CheckoutTestCase):
+    def test_decrements_stock_and_saves_lines(self):
+        sale = checkout.create_sale([(self.rice.pk, 2, None), (self.beans.pk, 1, None)])
+        self.assertEqual(self.quantity(self.rice), 3)
+        self.assertEqual(self.quantity(self.beans), 2)
+        self.assertEqual(sale.grand_total, 40)
+        self.assertEqual(sale.salesitems_set.count(), 2)
+
+    def test_insufficient_stock_rolls_back_the_whole_sale(self):
+        with self.assertRaises(checkout.InsufficientStock):
+            checkout.create_sale([(self.rice.pk, 2, None), (self.beans.pk, 4, None)])
+        self.assertEqual(self.quantity(self.rice), 5)
+        self.assertEqual(self.quantity(self.beans), 3)
+        self.assertFalse(Sales.objects.exists())
+        self.assertFalse(salesItems.objects.exists())
+
+    def test_repeated_product_lines_add_up(self):
+        with self.assertRaises(checkout.InsufficientStock):
+            checkout.create_sale([(self.beans.pk, 2, None), (self.beans.pk, 2, None)])
+        self.assertEqual(self.quantity(self.beans), 3)
+
+    def test_invalid_lines(self):
+        for lines in ([], [(self.rice.pk, 0, None)], [(self.rice.pk, 1, 'nan')], [(999, 1, None)]):
+            with self.subTest(lines=lines), self.assertRaises(checkout.CheckoutError):
+                checkout.create_sale(lines)
+
+
+class CustomerNumberTests(CheckoutTestCase):
+    def test_numbers_follow_the_day(self):
+        first = checkout.create_sale([(self.rice.pk, 1, None)])
+        second = checkout.create_sale([(self.rice.pk, 1, None)])
+        self.assertEqual((first.cliente, second.cliente), ("Cliente 1", "Cliente 2"))
+
+        tomorrow = timezone.now() + timedelta(days=1)
+        with mock.patch('pos.models.timezone.now', return_value=tomorrow):
+            third = checkout.create_sale([(self.rice.pk, 1, None)])
+        self.assertEqual(third.cliente, "Cliente 1")
+
+    def test_voided_sales_do_not_reuse_numbers(self):
+        first = checkout.create_sale([(self.rice.pk, 1, None)])
+        checkout.void_sales(Sales.objects.filter(pk=first.pk))
+        second = checkout.create_sale([(self.rice.pk, 1, None)])
+        self.assertEqual(second.cliente, "Cliente 2")
+
+
+class CatalogTests(CheckoutTestCase):
+    def setUp(self):
+        cache.clear()
+        self.login('view_sales')
+        self.url = reverse('pos:catalog')
+
+    def test_lists_active_products(self):
+        Products.objects.create(code='102', name='Azucar', category=self.category, price=10, quantity=5)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['version'], catalog.catalog_version())
+        self.assertEqual([product['name'] for product in data['products']], ['Arroz', 'Frijol'])
+        self.assertEqual(data['products'][0], {'id': self.rice.pk, 'code': '100', 'name': 'Arroz', 'price': 10.0, 'quantity': 5})
+
+    def test_etag_revalidation(self):
+        response = self.client.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        checkout.create_sale([(self.rice.pk, 2, None)])
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['products'][0]['quantity'], 3)
+
+    def test_version_follows_catalog_fields_only(self):
+        version = catalog.catalog_version()
+        self.rice.description = 'Grano largo'
+        self.rice.save(update_fields=['description'])
+        self.assertEqual(catalog.catalog_version(), version)
+        self.rice.price = 12
+        self.rice.save()
+        self.assertGreater(catalog.catalog_version(), version)
+
+
+class CatalogChangesTests(CheckoutTestCase):
+    def setUp(self):
+        self.login('view_sales')
+        self.since = timezone.now()
+
+    def changes(self, since):
+        return self.client.get(reverse('pos:catalog-changes'), {'since': since.isoformat()})
+
+    def test_changed_and_removed_products(self):
+        self.rice.price = 12
+        self.rice.save()
+        checkout.create_sale([(self.beans.pk, 3, None)])
+        gone = Products.objects.create(code='102', name='Azucar', category=self.category, price=10, cost=5, quantity=5)
+        gone_id = gone.pk
+        gone.delete()
+
+        data = self.changes(self.since).json()
+        self.assertEqual([product['id'] for product in data['products']], [self.rice.pk])
+        self.assertEqual(data['products'][0]['price'], 12.0)
+        self.assertEqual(sorted(data['removed']), sorted([self.beans.pk, gone_id]))
+        self.assertIsNotNone(catalog.parse_cursor(data['cursor']))
+
+    def test_invalid_cursor(self):
+        for since in ('ayer', '0001-01-01T00:00:00+14:00'):
+            response = self.client.get(reverse('pos:catalog-changes'), {'since': since})
+            self.assertEqual(response.status_code, 400)
+
+    def test_pruned_cursor_asks_for_a_reload(self):
+        Products.objects.create(code='102', name='Azucar', category=self.category, price=10, cost=5, quantity=5).delete()
+        self.assertEqual(catalog.prune_tombstones(now=timezone.now() + catalog.TOMBSTONE_RETENTION + timedelta(days=1)), 1)
+        response = self.changes(self.since)
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()['reload'])
+        self.assertEqual(self.changes(timezone.now() + timedelta(seconds=2)).status_code, 200)
+
+
+class UploadSalesTests(CheckoutTestCase):
+    def test_upload_is_idempotent(self):
+        batch = [self.upload('a', (self.rice, 2)), self.upload('b', (self.beans, 1))]
+        results = checkout.upload_sales(batch)
+        self.assertEqual([r['status'] for r in results], ['created', 'created'])
+
+        again = checkout.upload_sales(batch)
+        self.assertEqual([r['status'] for r in again], ['duplicate', 'duplicate'])
+        self.assertEqual([r['sale'] for r in again], [r['sale'] for r in results])
+        self.assertEqual(Sales.objects.count(), 2)
+        self.assertEqual(self.quantity(self.rice), 3)
+
+    def test_repeated_key_in_the_same_batch(self):
+        results = checkout.upload_sales([self.upload('a', (self.rice, 1)), self.upload('a', (self.rice, 1))])
+        self.assertEqual([r['status'] for r in results], ['created', 'duplicate'])
+        self.assertEqual(self.quantity(self.rice), 4)
+
+    def test_failed_sales_do_not_affect_the_batch(self):
+        results = checkout.upload_sales([
+            self.upload('a', (self.rice, 9)),
+            'venta',
+            {'items': []},
+            self.upload('b', (self.rice, 1), grand_total='x'),
+            {'key': 'c', 'items': 'x'},
+            self.upload('d', (self.beans, 1), date_added='0001-01-01T00:00:00+14:00'),
+        ])
+        self.assertEqual([r['status'] for r in results], ['failed'] * 5 + ['created'])
+        self.assertIn("No hay suficiente cantidad", results[0]['msg'])
+        self.assertEqual(self.quantity(self.rice), 5)
+        self.assertEqual(list(Sales.objects.values_list('idempotency_key', flat=True)), ['d'])
+
+    def test_upload_view(self):
+        self.login('add_sales')
+        url = reverse('pos:upload-sales')
+        payload = {'sales': [self.upload('a', (self.rice, 1))]}
+
+        for expected in ('created', 'duplicate'):
+            response = self.client.post(url, json.dumps(payload), content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['results'][0]['status'], expected)
+        response = self.client.post(url, json.dumps({'sales': 'x'}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantity(self.rice), 4)
+
+
+class ReceiptTests(CheckoutTestCase):
+    def setUp(self):
+        self.login()
+        self.sale = checkout.create_sale([(self.rice.pk, 2, None)])
+
+    def receipt(self, sale_id):
+        return self.client.get(reverse('pos:receipt-modal'), {'id': sale_id})
+
+    def test_receipt_is_saved_once(self):
+        response = self.receipt(self.sale.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Arroz')
+        snapshot = ReceiptSnapshot.objects.get(sale=self.sale)
+        self.assertEqual(snapshot.payload['code'], self.sale.code)
+        self.assertEqual(snapshot.payload['items'][0]['qty'], 2)
+
+        # El recibo no cambia si despues se renombra el producto.
+        self.rice.name = 'Arroz Premium'
+        self.rice.save()
+        response = self.receipt(self.sale.pk)
+        self.assertContains(response, 'Arroz')
+        self.assertNotContains(response, 'Premium')
+        self.assertEqual(ReceiptSnapshot.objects.count(), 1)
+
+    def test_missing_sale(self):
+        self.assertEqual(self.receipt(self.sale.pk + 1).status_code, 404)
+        self.assertEqual(self.receipt('x').status_code, 404)
+        self.assertFalse(ReceiptSnapshot.objects.exists())
+
+    def test_snapshot_is_deleted_with_the_sale(self):
+        self.receipt(self.sale.pk)
+        checkout.void_sales(Sales.objects.filter(pk=self.sale.pk))
+        self.assertFalse(ReceiptSnapshot.objects.exists())
+
+
+class VoidSalesTests(CheckoutTestCase):
+    def test_void_restores_stock(self):
+        kept = checkout.create_sale([(self.rice.pk, 1, None)])
+        voided = checkout.create_sale([(self.rice.pk, 2, None), (self.beans.pk, 3, None), (self.rice.pk, 1, None)])
+        self.assertEqual(checkout.void_sales(Sales.objects.filter(pk=voided.pk)), 1)
+        self.assertEqual(self.quantity(self.rice), 4)
+        self.assertEqual(self.quantity(self.beans), 3)
+        self.assertEqual(list(Sales.objects.all()), [kept])
+        self.assertFalse(salesItems.objects.filter(sale_id=voided.pk).exists())
+
+    def test_void_nothing(self):
+        self.assertEqual(checkout.void_sales(Sales.objects.none()), 0)
+
+
+class BarcodeIndexTests(CheckoutTestCase):
+    def setUp(self):
+        self.index = barcodes.BarcodeIndex()
+
+    def entry(self, code):
+        return self.index.lookup([code])[1][code]
+
+    def test_loaded_on_first_lookup_only(self):
+        with self.assertNumQueries(0):
+            importlib.reload(importlib.import_module('store.asgi'))
+            importlib.reload(importlib.import_module('store.wsgi'))
+        with self.assertNumQueries(2):
+            version, products = self.index.lookup(['100', 'nada'])
+        self.assertEqual(products['100']['id'], self.rice.pk)
+        self.assertIsNone(products['nada'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.index.lookup(['101'])[0], version)
+
+    def test_follows_local_changes(self):
+        self.assertEqual(self.entry('100')['quantity'], 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            checkout.create_sale([(self.rice.pk, 2, None)])
+        self.assertEqual(self.entry('100')['quantity'], 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.beans.code = '201'
+            self.beans.save()
+        self.assertIsNone(self.entry('101'))
+        self.assertEqual(self.entry('201')['id'], self.beans.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.beans.delete()
+        self.assertIsNone(self.entry('201'))
+
+    def test_changes_from_other_processes_after_max_age(self):
+        self.entry('100')
+        # Otro proceso: cambia el stock y la version sin pasar por este.
+        Products.objects.filter(pk=self.rice.pk).update(quantity=1, date_updated=timezone.now())
+        Sequence.objects.filter(name=catalog.CATALOG_SEQUENCE).update(value=F('value') + 1)
+        self.assertEqual(self.entry('100')['quantity'], 5)
+        self.index.checked -= barcodes.INDEX_MAX_AGE
+        self.assertEqual(self.entry('100')['quantity'], 1)
+
+    def test_lookup_view(self):
+        self.login('view_sales')
+        response = self.client.get(reverse('pos:product-lookup'), {'code': ['100', 'nada']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['products']['100']['name'], 'Arroz')
+        self.assertIsNone(response.json()['products']['nada'])
+        self.assertEqual(self.client.get(reverse('pos:product-lookup')).status_code, 400)
+
+
+class CentsTests(CheckoutTestCase):
+    def test_to_cents_rounds_half_cents_up(self):
+        for value, cents in [
+            (1.005, 101), (2.675, 268), (0.285, 29), (-1.005, -101),
+            (Decimal('2.675'), 268), ('1.005', 101), (10, 1000), (None, 0),
+        ]:
+            with self.subTest(value=value):
+                self.assertEqual(to_cents(value), cents)
+
+    def test_sale_stores_exact_cents(self):
+        sale = checkout.create_sale([(self.rice.pk, 1, 1.005), (self.beans.pk, 1, 2.675)])
+        self.assertEqual(sorted(sale.salesitems_set.values_list('total_cents', flat=True)), [101, 268])
+        self.assertEqual(sale.sub_total_cents, 369)
+        self.assertEqual(Sales.objects.get(pk=sale.pk).amount('grand_total'), Decimal('3.69'))
+
+    def test_rows_without_cents(self):
+        sale = checkout.create_sale([(self.rice.pk, 1, 1.005)])
+        Sales.objects.filter(pk=sale.pk).update(grand_total_cents=None)
+        self.assertEqual(Sales.objects.get(pk=sale.pk).amount('grand_total'), Decimal('1.01'))
+        self.assertEqual(sum_amount(Sales.objects.all(), 'grand_total'), Decimal('1.01'))
+
+        call_command('backfill_cents', stdout=StringIO())
+        self.assertEqual(Sales.objects.get(pk=sale.pk).grand_total_cents, 101)
+
+
+@override_settings(POS_GROUP_COMMIT=True, POS_GROUP_COMMIT_WINDOW_MS=200)
+class GroupCommitTests(TransactionTestCase):
+    """TransactionTestCase: el escritor usa su propia conexion en otro hilo."""
+
+    def setUp(self):
+        category = Category.objects.create(name='Abarrotes', description='')
+        self.rice = Products.objects.create(code='100', name='Arroz', category=category, price=10, cost=5, quantity=9)
+
+    def upload(self, key, qty=1):
+        return {'key': key, 'items': [{'product': self.rice.pk, 'qty': qty, 'price': 10}]}
+
+    def test_batch_retried_after_busy_error(self):
+        upload_sale = checkout.upload_sale
+        calls = []
+
+        def busy_once(sale, existing):
+            calls.append(sale['key'])
+            if calls == ['a', 'b']:
+                raise OperationalError('database is locked')
+            return upload_sale(sale, existing)
+
+        with mock.patch.object(checkout, 'upload_sale', busy_once):
+            results = group_commit.upload_sales([self.upload('a'), self.upload('b'), self.upload('a')])
+
+        self.assertEqual(calls[:2], ['a', 'b'])
+        self.assertEqual([r['status'] for r in results], ['created', 'created', 'duplicate'])
+        self.assertEqual(results[2]['sale'], results[0]['sale'])
+        self.assertEqual(
+            sorted(Sales.objects.values_list('idempotency_key', 'pk')),
+            [('a', results[0]['sale']), ('b', results[1]['sale'])],
+        )
+        self.assertEqual(Products.objects.get(pk=self.rice.pk).quantity, 7)
+
+    def test_errors_stay_with_their_sale(self):
+        results = group_commit.upload_sales([self.upload('a', qty=20), self.upload('b'), {'key': 'c', 'items': 'x'}])
+        self.assertEqual([r['status'] for r in results], ['failed', 'created', 'failed'])
+        self.assertEqual(list(Sales.objects.values_list('idempotency_key', flat=True)), ['b'])
+
+    def test_submit_sale(self):
+        sale = group_commit.submit_sale([(self.rice.pk, 2, None)])
+        self.assertEqual(Sales.objects.get().pk, sale.pk)
+        with self.assertRaises(checkout.InsufficientStock):
+            group_commit.submit_sale([(self.rice.pk, 8, None)])
+        self.assertEqual(Products.objects.get(pk=self.rice.pk).quantity, 7)
+
+
+class StockHoldTests(CheckoutTestCase):
+    def test_holds_reduce_what_others_can_take(self):
+        self.assertEqual(holds.hold('carrito-1', self.rice.pk, 3), 2)
+        self.assertEqual(holds.available([self.rice.pk]), {self.rice.pk: 2})
+        self.assertEqual(holds.available([self.rice.pk], cart='carrito-1'), {self.rice.pk: 5})
+        with self.assertRaises(checkout.InsufficientStock):
+            holds.hold('carrito-2', self.rice.pk, 3)
+        # Vender lo reservado por otro carrito tampoco se puede.
+        with self.assertRaises(checkout.InsufficientStock):
+            checkout.create_sale([(self.rice.pk, 3, None)])
+
+    def test_sale_releases_its_own_holds(self):
+        holds.hold('carrito-1', self.rice.pk, 4)
+        checkout.create_sale([(self.rice.pk, 4, None)], cart='carrito-1')
+        self.assertEqual(self.quantity(self.rice), 1)
+        self.assertFalse(StockHold.objects.exists())
+
+    def test_hold_replaces_and_zero_releases(self):
+        holds.hold('carrito-1', self.rice.pk, 2)
+        holds.hold('carrito-1', self.rice.pk, 4)
+        self.assertEqual(StockHold.objects.get().qty, 4)
+        holds.hold('carrito-1', self.rice.pk, 0)
+        self.assertFalse(StockHold.objects.exists())
+        for qty in (-1, 'x'):
+            with self.assertRaises(checkout.CheckoutError):
+                holds.hold('carrito-1', self.rice.pk, qty)
+
+    def test_expired_holds_do_not_count(self):
+        holds.hold('carrito-1', self.rice.pk, 5)
+        later = timezone.now() + holds.HOLD_TTL + timedelta(seconds=1)
+        with mock.patch('pos.holds.timezone.now', return_value=later):
+            self.assertEqual(holds.available([self.rice.pk]), {self.rice.pk: 5})
+        self.assertEqual(holds.sweep(now=later), 1)
+
+    def test_hold_views(self):
+        self.login('add_sales')
+        response = self.client.post(reverse('pos:hold-stock'), {'cart': 'c1', 'product': self.rice.pk, 'qty': 2})
+        self.assertEqual(response.json(), {'status': 'success', 'available': 3})
+        response = self.client.post(reverse('pos:hold-stock'), {'cart': 'c2', 'product': self.rice.pk, 'qty': 4})
+        self.assertEqual(response.json()['status'], 'failed')
+        self.client.post(reverse('pos:release-stock'), {'cart': 'c1'})
+        self.assertFalse(StockHold.objects.exists())
+
+
+class ArchiveTests(TransactionTestCase):
+    """
+    TransactionTestCase: los archivos se registran como bases de datos al
+    usarlos (archive_alias) y TestCase revisa todas sus bases antes de cada prueba.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # No existen en settings.DATABASES; se permiten despues de validar la clase.
+        cls.databases = cls.databases | {'archive_2020', 'archive_2020_rw'}
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.addCleanup(self.close_archives)
+        settings = override_settings(POS_ARCHIVE_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        category = Category.objects.create(name='Abarrotes', description='')
+        rice = Products.objects.create(code='100', name='Arroz', category=category, price=10, cost=5, quantity=5)
+        beans = Products.objects.create(code='101', name='Frijol', category=category, price=20, cost=8, quantity=3)
+        self.old = checkout.create_sale([(rice.pk, 2, None)], date_added=datetime(2020, 3, 5, 10))
+        self.current = checkout.create_sale([(beans.pk, 1, None)])
+        call_command('archive_sales', 2020, stdout=StringIO())
+
+    def close_archives(self):
+        for alias in [alias for alias in connections.settings if alias.startswith('archive_')]:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+
+    def test_archived_sales_leave_the_main_database(self):
+        self.assertEqual(archive.archived_years(), [2020])
+        self.assertEqual(list(Sales.objects.all()), [self.current])
+        self.assertFalse(salesItems.objects.filter(sale_id=self.old.pk).exists())
+
+    def test_reports_read_the_archive(self):
+        querysets = archive.period_querysets(2020)
+        self.assertEqual(archive.count_sales(querysets), 1)
+        self.assertEqual(archive.sum_sales(querysets), Decimal('20'))
+        self.assertEqual(archive.sum_sold_qty(querysets), 2)
+        self.assertEqual(archive.count_sales(archive.period_querysets(2020, 3, 5)), 1)
+        self.assertEqual(archive.count_sales(archive.period_querysets(2020, 4)), 0)
+        self.assertEqual(
+            [sale.code for sale in archive.iter_sales(archive.sales_querysets())],
+            [self.old.code, self.current.code],
+        )
+
+    def test_sales_report_table_includes_archives(self):
+        self.client.force_login(User.objects.create_superuser('admin', password='x'))
+        response = self.client.get(reverse('report:sales_report'), {
+            'draw': 1, 'start': 0, 'length': 10, 'order[0][column]': 1, 'order[0][dir]': 'desc',
+        })
+        data = response.json()
+        self.assertEqual(data['recordsTotal'], 2)
+        self.assertEqual([row[3] for row in data['data']], ['20,00 Bs', '20,00 Bs'])
+        self.assertEqual([row[1][6:10] for row in data['data']], [str(self.current.date_added.year), '2020'])
+
+    def test_archived_receipt(self):
+        self.assertEqual(archive.find_archived_sale(self.old.pk).code, self.old.code)
+        self.assertIsNone(archive.find_archived_sale(self.current.pk))
+        html = receipts.archived_receipt(self.old.pk)
+        self.assertIn(self.old.code, html)
+        self.assertIn('Arroz', html)
+
+
+class CategoryCounterTests(CheckoutTestCase):
+    def test_counter_follows_sales_and_voids(self):
+        self.assertEqual(self.active_count(), 2)
+        sale = checkout.create_sale([(self.beans.pk, 3, None)])
+        self.assertEqual(Products.objects.get(pk=self.beans.pk).status, Products.STATUS_INACTIVE)
+        self.assertEqual(self.active_count(), 1)
+
+        checkout.void_sales(Sales.objects.filter(pk=sale.pk))
+        self.assertEqual(Products.objects.get(pk=self.beans.pk).status, Products.STATUS_ACTIVE)
+        self.assertEqual(self.active_count(), 2)
+
+    def test_counter_matches_a_recount(self):
+        checkout.create_sale([(self.rice.pk, 5, None), (self.beans.pk, 1, None)])
+        category = Category.objects.get(pk=self.category.pk)
+        counted = category.active_product_count
+        category.check_and_update_status()
+        self.assertEqual(counted, category.active_product_count)
+        self.assertEqual(category.status, 1)
+
+    def test_counter_follows_category_moves(self):
+        other = Category.objects.create(name='Bebidas', description='')
+        self.assertEqual(self.active_count(other), 0)
+        self.rice.category = other
+        self.rice.save()
+        self.assertEqual(self.active_count(), 1)
+        self.assertEqual(self.active_count(other), 1)
+        self.assertEqual(Category.objects.get(pk=other.pk).status, 1)
@@ -8,8 +8,15 @@ handler403 = views.error_403
 app_name = 'pos'
 urlpatterns = [
     path('pos', views.pos, name="pos-page"),
+    path('catalog', views.product_catalog, name="catalog"),
+    path('catalog/changes', views.catalog_changes, name="catalog-changes"),
+    path('lookup', views.product_lookup, name="product-lookup"),
+    path('search', views.product_search, name="product-search"),
     path('checkout-modal', views.checkout_modal, name="checkout-modal"),
     path('save-pos', views.save_pos, name="save-pos"),
+    path('upload-sales', views.upload_sales, name="upload-sales"),
+    path('hold', views.hold_stock, name="hold-stock"),
+    path('release', views.release_stock, name="release-stock"),
     path('sales', views.salesList, name="sales-page"),
     path('receipt', views.receipt, name="receipt-modal"),
     path('delete_sale', views.delete_sale, name="delete-sale"),
@@ -1,36 +1,85 @@
-from django.shortcuts import get_object_or_404, render
-from django.http import JsonResponse, HttpResponse
+from django.shortcuts import render
+from django.http import Http404, JsonResponse, HttpResponse
 from django.contrib.auth.decorators import login_required
 from .models import *
+from . import archive, barcodes, catalog, checkout, group_commit, holds, receipts
 from inventory.models import *
 from django.views.decorators.csrf import csrf_exempt
-from datetime import datetime
 import json
+from asgiref.sync import sync_to_async
 from django.contrib import messages
-from django.utils import translation
-from django.utils.dateformat import DateFormat
+from django.utils.cache import get_conditional_response
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+from django.contrib.humanize.templatetags.humanize import intcomma
+from django.db.models import Prefetch
+from django.template.defaultfilters import capfirst, date as date_format, floatformat
+
+from core.datatables import datatable_response
+from inventory.search import search_products
 
 from django.contrib.auth.decorators import login_required, permission_required
 from django.shortcuts import render
 
-from django.db import transaction
+from django.views.decorators.http import require_POST
+
+# Ventas aceptadas en un solo envio desde un terminal.
+MAX_UPLOAD_SALES = 500
+# Productos que devuelve la busqueda del POS.
+MAX_SEARCH_RESULTS = 20
 
 @login_required
 @permission_required('pos.view_sales', raise_exception=True)
 def pos(request):
-    
-    
-    products = Products.objects.filter(status=1).order_by('name')
-    product_json = []
-    for product in products:
-        product_json.append({'id': product.id, 'name': product.name, 'price': float(product.price)})
     context = {
         'page_title': "Point of Sale",
-        'products': products,
-        'product_json': json.dumps(product_json)
     }
     return render(request, 'pos/pos.html', context)
 
+@login_required
+@permission_required('pos.view_sales', raise_exception=True)
+async def product_catalog(request):
+    version = await catalog.acatalog_version()
+    etag = catalog.catalog_etag(version)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(await catalog.acatalog_json(version), content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+@login_required
+@permission_required('pos.view_sales', raise_exception=True)
+async def catalog_changes(request):
+    since = catalog.parse_cursor(request.GET.get('since'))
+    if since is None:
+        return JsonResponse({"error": "Cursor inválido."}, status=400)
+    if catalog.cursor_expired(since, await catalog.apruned_until()):
+        # Los eliminados de ese periodo ya se depuraron: hay que recargar el catalogo.
+        return JsonResponse({"error": "Cursor vencido.", "reload": True}, status=410)
+    return JsonResponse(await catalog.acatalog_changes(since))
+
+@login_required
+@permission_required('pos.view_sales', raise_exception=True)
+def product_lookup(request):
+    codes = [code.strip() for code in request.GET.getlist('code') if code.strip()]
+    if not codes or len(codes) > barcodes.MAX_LOOKUP_CODES:
+        return JsonResponse({"error": "Cantidad de códigos inválida."}, status=400)
+    version, products = barcodes.barcode_index.lookup(codes)
+    return JsonResponse({'version': version, 'products': products})
+
+@login_required
+@permission_required('pos.view_sales', raise_exception=True)
+def product_search(request):
+    products = Products.objects.filter(status=Products.STATUS_ACTIVE)
+    q = request.GET.get('q', '').strip()
+    if q:
+        products = search_products(products, q)
+    else:
+        products = products.order_by('name')
+    products = products.values('id', 'code', 'name', 'price', 'quantity')[:MAX_SEARCH_RESULTS]
+    return JsonResponse({'products': [catalog.serialize_product(product) for product in products]})
+
 @login_required
 def checkout_modal(request):
     grand_total = 0
@@ -44,23 +93,14 @@ def checkout_modal(request):
 @login_required
 @permission_required('pos.add_sales', raise_exception=True)
 @csrf_exempt
-def save_pos(request):
+async def save_pos(request):
     resp = {'status': 'failed', 'msg': ''}
     data = request.POST
 
-    pref = datetime.now().year + datetime.now().year
-    i = 1
-    while True:
-        code = '{:0>5}'.format(i)
-        i += 1
-        check = Sales.objects.filter(code=str(pref) + str(code)).exists()
-        if not check:
-            break
-    code = str(pref) + str(code)
-
     try:
-        sales = Sales(
-            code=code,
+        lines = list(zip(data.getlist('product[]'), data.getlist('qty[]'), data.getlist('price[]')))
+        sales = await group_commit.asubmit_sale(
+            lines,
             sub_total=data['sub_total'],
             tax=data['tax'],
             tax_amount=data['tax_amount'],
@@ -68,24 +108,7 @@ def save_pos(request):
             tendered_amount=data['tendered_amount'],
             amount_change=data['amount_change']
         )
-        sales.save()
-
         sale_id = sales.pk
-        i = 0
-        for prod_id in data.getlist('product[]'):
-            product = get_object_or_404(Products, id=prod_id)
-            qty = data.getlist('qty[]')[i]
-            price = data.getlist('price[]')[i]
-            total = float(qty) * float(price)
-            sales_item = salesItems(
-                sale=sales,
-                product=product,
-                qty=qty,
-                price=price,
-                total=total
-            )
-            sales_item.save()
-            i += 1
 
         resp['status'] = 'success'
         resp['sale'] = sale_id
@@ -95,112 +118,128 @@ def save_pos(request):
 
     return JsonResponse(resp)
 
+@login_required
+@permission_required('pos.add_sales', raise_exception=True)
+@require_POST
+async def upload_sales(request):
+    try:
+        sales = json.loads(request.body)['sales']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'status': 'failed', 'msg': "Lote inválido."}, status=400)
+    if (not isinstance(sales, list) or len(sales) > MAX_UPLOAD_SALES
+            or not all(isinstance(sale, dict) for sale in sales)):
+        return JsonResponse({'status': 'failed', 'msg': "Lote inválido."}, status=400)
+
+    results = await group_commit.aupload_sales(sales)
+    return JsonResponse({'status': 'success', 'results': results})
+
+@login_required
+@permission_required('pos.add_sales', raise_exception=True)
+@require_POST
+def hold_stock(request):
+    try:
+        available = holds.hold(request.POST.get('cart'), request.POST.get('product'), request.POST.get('qty'))
+    except checkout.CheckoutError as e:
+        return JsonResponse({'status': 'failed', 'msg': str(e)})
+    return JsonResponse({'status': 'success', 'available': available})
+
+@login_required
+@permission_required('pos.add_sales', raise_exception=True)
+@require_POST
+def release_stock(request):
+    cart = request.POST.get('cart')
+    if not cart:
+        return JsonResponse({'status': 'failed', 'msg': "Falta el carrito."}, status=400)
+    product = request.POST.get('product') or None
+    if product is not None and not product.isdigit():
+        return JsonResponse({'status': 'failed', 'msg': "Producto inválido."}, status=400)
+    released = holds.release(cart, product)
+    return JsonResponse({'status': 'success', 'released': released})
+
+# Columnas de las tablas de ventas: (campo para ordenar, campo para buscar).
+SALES_TABLE_COLUMNS = [
+    'cliente',
+    'date_added',
+    (None, 'salesitems__product__name'),
+    'grand_total',
+    None,
+    None,
+]
+
+
+def sales_table_queryset(queryset):
+    return queryset.prefetch_related(
+        Prefetch('salesitems_set', queryset=salesItems.objects.select_related('product'))
+    )
+
+
+def sales_table_row(sale, actions=True):
+    products_list = {}
+    for item in sale.salesitems_set.all():
+        products_list[item.product.name] = products_list.get(item.product.name, 0) + item.qty
+    row = [
+        format_html('{}', sale.cliente),
+        date_format(sale.date_added, 'd-m-Y H:i'),
+        format_html_join(mark_safe('<br>'), '{} - {}', (
+            (capfirst(name), qty) for name, qty in products_list.items()
+        )),
+        f"{intcomma(floatformat(sale.grand_total, 2))} Bs",
+        sum(products_list.values()),
+    ]
+    if actions:
+        row.append(format_html(
+            '<button class="mdc-button mdc-button--raised p-1 icon-button filled-button--light mdc-ripple-upgraded view-data" type="button" data-id="{}" title="Vista Recibo">'
+            '<i class="material-icons mdc-button__icon">receipt</i></button> '
+            '<button class="mdc-button mdc-button--raised p-1 icon-button filled-button--danger mdc-ripple-upgraded delete-data" type="button" data-id="{}" data-code="{}" title="Eliminar">'
+            '<i class="material-icons mdc-button__icon">deleteoutline</i></button>',
+            sale.pk, sale.pk, sale.code,
+        ))
+    return row
+
 @login_required
 @permission_required('pos.view_sales', raise_exception=True)
 def salesList(request):
-    sales = Sales.objects.order_by('-date_added').all()
-    sale_data = []
-    for sale in sales:
-        data = {}
-        for field in sale._meta.get_fields(include_parents=False):
-            if field.related_model is None:
-                data[field.name] = getattr(sale, field.name)
-        items = salesItems.objects.filter(sale_id=sale).all()
-        products_list = {}
-        for item in items:
-            product_name = item.product.name
-            if product_name in products_list:
-                products_list[product_name] += item.qty
-            else:
-                products_list[product_name] = item.qty
-        data['products_list'] = products_list
-        data['total_items_sold'] = sum(products_list.values())
-        if 'tax_amount' in data:
-            data['tax_amount'] = format(float(data['tax_amount']), '.2f')
-        sale_data.append(data)
+    if 'draw' in request.GET:
+        sales = sales_table_queryset(Sales.objects.order_by('-date_added'))
+        return datatable_response(request, sales, SALES_TABLE_COLUMNS, sales_table_row)
     context = {
         'page_title': 'Sales Transactions',
-        'sale_data': sale_data,
+        'archived_years': archive.archived_years(),
     }
     return render(request, 'pos/sales.html', context)
 
-@login_required
-@permission_required('pos.add_sales', raise_exception=True)
-def create_sales_item(request, product_id, qty, sale_instance):
-    product = get_object_or_404(Products, id=product_id)
-    try:
-        qty = int(qty)
-        if product.cantidad < qty:
-            return JsonResponse({"error": "No hay suficiente cantidad de producto para vender."}, status=400)
-        sales_item = salesItems.objects.create(
-            product=product,
-            qty=qty,
-            price=product.price,
-            total=product.price * qty,
-            sale=sale_instance
-        )
-        product.update_quantity_on_sale(qty)
-        return JsonResponse({"success": "Item de venta creado exitosamente."})
-    except ValueError:
-        return JsonResponse({"error": "Cantidad inválida."}, status=400)
-
 @login_required
 @permission_required('pos.add_sales', raise_exception=True)
 @csrf_exempt
 def create_sale(request):
     if request.method == "POST":
-        sale_code = request.POST.get('code')
         items = json.loads(request.POST.get('items'))
-
-        sale = Sales.objects.create(
-            code=sale_code,
-            sub_total=0,
-            grand_total=0,
-            tax_amount=0,
-            tax=0,
-            tendered_amount=0,
-            amount_change=0,
-        )
-
-        for item in items:
-            product_id = item['product_id']
-            qty = item['qty']
-            response = create_sales_item(request, product_id, qty, sale)
-            if response.status_code == 400:
-                sale.delete()
-                return response
-
-        sale.sub_total = sum([item.total for item in sale.salesitems_set.all()])
-        sale.tax_amount = sale.sub_total * (sale.tax / 100)
-        sale.grand_total = sale.sub_total + sale.tax_amount
-        sale.save()
+        lines = [(item['product_id'], item['qty'], None) for item in items]
+        try:
+            group_commit.submit_sale(lines, code=request.POST.get('code'))
+        except checkout.CheckoutError as e:
+            return JsonResponse({"error": str(e)}, status=400)
 
         return JsonResponse({"success": "Venta creada exitosamente."})
 
     return JsonResponse({"error": "Método no permitido."}, status=405)
 
 @login_required
-def receipt(request):
-    id = request.GET.get('id')
-    sales = Sales.objects.filter(id=id).first()
-    transaction = {}
-    for field in Sales._meta.get_fields():
-        if field.related_model is None: 
-            transaction[field.name] = getattr(sales, field.name)
-    if 'tax_amount' in transaction:
-        transaction['tax_amount'] = format(float(transaction['tax_amount']))
-    ItemList = salesItems.objects.filter(sale=sales).all()
-    
-        # Cambiar el idioma a español para la fecha
-    with translation.override('es'):
-        formatted_date = DateFormat(sales.date_added).format('d \de F Y')
-    context = {
-        "transaction": transaction,
-        "salesItems": ItemList,
-        
-        "formatted_date": formatted_date,
-    }
-    return render(request, 'pos/receipt.html', context)
+async def receipt(request):
+    try:
+        id = int(request.GET.get('id'))
+    except (TypeError, ValueError):
+        raise Http404
+    snapshot = await ReceiptSnapshot.objects.filter(sale_id=id).afirst()
+    if snapshot is None:
+        snapshot = await sync_to_async(receipts.receipt_snapshot)(id)
+    if snapshot is None:
+        # La venta puede estar en el archivo de un año anterior.
+        html = await sync_to_async(receipts.archived_receipt)(id)
+        if html is None:
+            raise Http404
+        return HttpResponse(html)
+    return HttpResponse(snapshot.html)
 
 @login_required
 @permission_required('pos.delete_sales', raise_exception=True)
@@ -208,15 +247,11 @@ def delete_sale(request):
     resp = {'status': 'failed', 'msg': ''}
     id = request.POST.get('id')
     try:
-        sale = Sales.objects.get(id=id)
-        with transaction.atomic():
-            for item in sale.salesitems_set.all():
-                item.delete()
-            sale.delete()
-        resp['status'] = 'success'
-        messages.success(request, 'El registro de Venta fue eliminado y las cantidades de productos fueron restauradas.')
-    except Sales.DoesNotExist:
-        resp['msg'] = "La venta no existe"
+        if checkout.void_sales(Sales.objects.filter(id=id)):
+            resp['status'] = 'success'
+            messages.success(request, 'El registro de Venta fue eliminado y las cantidades de productos fueron restauradas.')
+        else:
+            resp['msg'] = "La venta no existe"
     except Exception as e:
         resp['msg'] = f"Ocurrió un error: {str(e)}"
     return HttpResponse(json.dumps(resp), content_type='application/json')
@@ -50,16 +50,14 @@ class PurchaseProduct(models.Model):
 
             # Actualizar el producto asociado
             if self.product:
-                self.product.update_quantity_on_purchase(quantity_difference)
-                self.product.update_cost(self.cost)
+                self.product.apply_purchase(quantity_difference, self.cost)
                 
                 
     def delete(self, *args, **kwargs):
         with transaction.atomic():
             if self.product:
                 # Actualizar el producto asociado antes de eliminar la compra
-                self.product.decrease_quantity(self.qty)
-                self.product.update_cost_after_deletion(self.cost)
+                self.product.revert_purchase(self.qty, self.cost)
             super().delete(*args, **kwargs)
             
     def __str__(self):
@@ -10,6 +10,11 @@ from .forms import SupplierForm, PurchaseForm
 from inventory.models import Products 
 
 from django.core.exceptions import ValidationError
+from django.template.defaultfilters import date as date_format
+from django.urls import reverse
+from django.utils.html import format_html
+
+from core.datatables import DataTablesMixin, action_buttons
 
 class SupplierList(LoginRequiredMixin, PermissionRequiredMixin, generic.ListView):
     model = Supplier
@@ -62,12 +67,37 @@ class SupplierDelete(LoginRequiredMixin, SuccessMessageMixin, PermissionRequired
         messages.success(self.request, success_message)
         return self.delete(request, *args, **kwargs)
     
-class PurchaseList(LoginRequiredMixin,PermissionRequiredMixin, generic.ListView):
+class PurchaseList(LoginRequiredMixin,PermissionRequiredMixin, DataTablesMixin, generic.ListView):
     model = PurchaseProduct
     template_name = 'purchases/purchase_list.html'
     context_object_name = 'purchases'
     ordering = ['-date_updated'] 
     permission_required = 'purchase.view_purchaseproduct'
+    datatable_columns = ['product__name', 'supplier__name', 'cost', 'qty', 'total', 'date_updated', None]
+
+    def get_queryset(self):
+        return super().get_queryset().select_related('product', 'supplier')
+
+    def datatable_row(self, purchase):
+        product = ''
+        if purchase.product:
+            product = format_html(
+                '<a href="{}">{}</a>',
+                reverse('inventory:product_detail', args=[purchase.product.pk]),
+                purchase.product.name,
+            )
+        return [
+            product,
+            format_html('{}', purchase.supplier or ''),
+            str(purchase.cost),
+            str(purchase.qty),
+            str(purchase.total),
+            date_format(purchase.date_updated, 'd-m-Y H:i'),
+            action_buttons(
+                reverse('purchase:purchase_update', args=[purchase.pk]),
+                reverse('purchase:purchase_delete', args=[purchase.pk]),
+            ),
+        ]
     
 class PurchaseCreate(LoginRequiredMixin,PermissionRequiredMixin, generic.CreateView):
     model = PurchaseProduct
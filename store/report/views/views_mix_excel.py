@@ -1,4 +1,5 @@
 from purchase.models import *  # Importa el modelo PurchaseProduct
+from pos.archive import count_sales, iter_sales, sales_querysets, sum_sales, sum_sold_qty
 from pos.models import *
 from inventory.models import *
 from report.forms import *
@@ -10,7 +11,6 @@ from io import BytesIO
 import uuid
 
 from django.contrib import messages
-from django.db.models import Sum
 from django.http import HttpResponse, HttpResponseBadRequest
 from django.shortcuts import render
 from django.template.loader import get_template, render_to_string
@@ -187,15 +187,16 @@ class MixExcelSalesDayView(FormView):
             return self.form_invalid(form)
 
     
-        sales = Sales.objects.filter(date_added__gte=start_date, date_added__lt=end_date)
-        total_clientes = sales.values('id').distinct().count()
-        total_items_vendidos = salesItems.objects.filter(sale__in=sales).aggregate(total=Sum('qty'))['total']
-        total_ingresos = sales.aggregate(total=Sum('grand_total'))['total']
+        # Incluye los años archivados; el fin del rango es exclusivo.
+        sale_sets = sales_querysets(start_date, end_date - timedelta(microseconds=1))
+        total_clientes = count_sales(sale_sets)
+        total_items_vendidos = sum_sold_qty(sale_sets)
+        total_ingresos = sum_sales(sale_sets)
 
         sale_details = []
         total_net_profit = Decimal(0)
-        for sale in sales:
-            items = salesItems.objects.filter(sale=sale)
+        for sale in iter_sales(sale_sets):
+            items = sale.salesitems_set.select_related('product')
             products_list = {}
             net_profit_total = Decimal(0)
             for item in items:
@@ -298,15 +299,16 @@ class MixTramoExcelSalesDayView(FormView):
         day_name_end = DAYS_OF_WEEK[day_name_end_english]  
         
     
-        sales = Sales.objects.filter(date_added__gte=start_date, date_added__lt=end_date)
-        total_clientes = sales.values('id').distinct().count()
-        total_items_vendidos = salesItems.objects.filter(sale__in=sales).aggregate(total=Sum('qty'))['total']
-        total_ingresos = sales.aggregate(total=Sum('grand_total'))['total']
+        # Incluye los años archivados; el fin del rango es exclusivo.
+        sale_sets = sales_querysets(start_date, end_date - timedelta(microseconds=1))
+        total_clientes = count_sales(sale_sets)
+        total_items_vendidos = sum_sold_qty(sale_sets)
+        total_ingresos = sum_sales(sale_sets)
 
         sale_details = []
         total_net_profit = Decimal(0)
-        for sale in sales:
-            items = salesItems.objects.filter(sale=sale)
+        for sale in iter_sales(sale_sets):
+            items = sale.salesitems_set.select_related('product')
             products_list = {}
             net_profit_total = Decimal(0)
             for item in items:
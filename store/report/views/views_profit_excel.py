@@ -1,4 +1,4 @@
-from pos.models import Sales
+from pos.archive import iter_sales, period_querysets, sales_querysets, sum_sales
 from purchase.models import PurchaseProduct
 from report.forms import *
 from datetime import datetime
@@ -10,7 +10,6 @@ from django.http import HttpResponse, HttpResponseBadRequest
 from django.views.generic import FormView
 from openpyxl import Workbook
 from openpyxl.styles import Alignment
-from django.db.models import Sum
 
 from django.views import View  
 class GenerateExcelProfitView(View):
@@ -44,27 +43,17 @@ class GenerateExcelProfitView(View):
             return HttpResponseBadRequest("Formulario no válido")
 
     def get_queryset(self, form):
-        queryset = Sales.objects.all()
-
-        if form.is_valid():
-            start_date = form.cleaned_data.get('start_date')
-            end_date = form.cleaned_data.get('end_date')
-
-            if start_date:
-                queryset = queryset.filter(date_added__gte=start_date)
-            if end_date:
-                queryset = queryset.filter(date_added__lte=end_date)
-
-        return queryset
+        # Lista de querysets: la base principal y los años archivados que cubre el rango.
+        return sales_querysets(form.cleaned_data.get('start_date'), form.cleaned_data.get('end_date'))
 
     def calculate_total_ingresos(self, sales_queryset):
-        total_ingresos = sales_queryset.aggregate(total=Sum('grand_total'))['total'] or Decimal('0')
+        total_ingresos = sum_sales(sales_queryset)
         return total_ingresos
 
     def calculate_total_costos(self, sales_queryset):
         total_costos = Decimal('0')
 
-        for sale in sales_queryset:
+        for sale in iter_sales(sales_queryset):
             for item in sale.salesitems_set.all():
                 purchase_product = PurchaseProduct.objects.filter(product=item.product).first()
                 if purchase_product:
@@ -79,9 +68,9 @@ class GenerateExcelProfitView(View):
         sales_data = []
         total_utilidades = Decimal(0)
 
-        for sale in sales_queryset:
+        for sale in iter_sales(sales_queryset):
             sale_cost = self.calculate_sale_cost(sale)
-            sale_profit = Decimal(sale.grand_total) - sale_cost
+            sale_profit = sale.amount('grand_total') - sale_cost
             products_list = []
 
             for item in sale.salesitems_set.all():
@@ -112,7 +101,7 @@ class GenerateExcelProfitView(View):
             sales_data.append({
                 'date_added': sale.date_added,
                 'products_list': products_list,
-                'venta_total': Decimal(sale.grand_total),
+                'venta_total': sale.amount('grand_total'),
                 'costo_total': sale_cost,
                 'ganancia_total': sale_profit,
             })
@@ -210,16 +199,17 @@ class YearlyExcelProfitView(View):
             return HttpResponseBadRequest("Formulario no válido")
 
     def get_queryset(self, year):
-        return Sales.objects.filter(date_added__year=year)
+        # Incluye el archivo del año si ya fue archivado.
+        return period_querysets(year)
 
     def calculate_total_ingresos(self, sales_queryset):
-        total_ingresos = sales_queryset.aggregate(total=Sum('grand_total'))['total'] or Decimal('0')
+        total_ingresos = sum_sales(sales_queryset)
         return total_ingresos
 
     def calculate_total_costos(self, sales_queryset):
         total_costos = Decimal('0')
 
-        for sale in sales_queryset:
+        for sale in iter_sales(sales_queryset):
             for item in sale.salesitems_set.all():
                 purchase_product = PurchaseProduct.objects.filter(product=item.product).first()
                 if purchase_product:
@@ -234,9 +224,9 @@ class YearlyExcelProfitView(View):
         sales_data = []
         total_utilidades = Decimal(0)
 
-        for sale in sales_queryset:
+        for sale in iter_sales(sales_queryset):
             sale_cost = self.calculate_sale_cost(sale)
-            sale_profit = Decimal(sale.grand_total) - sale_cost
+            sale_profit = sale.amount('grand_total') - sale_cost
             products_list = []
 
             for item in sale.salesitems_set.all():
@@ -267,7 +257,7 @@ class YearlyExcelProfitView(View):
             sales_data.append({
                 'date_added': sale.date_added,
                 'products_list': products_list,
-                'venta_total': Decimal(sale.grand_total),
+                'venta_total': sale.amount('grand_total'),
                 'costo_total': sale_cost,
                 'ganancia_total': sale_profit,
             })
@@ -366,16 +356,16 @@ class MonthlyExcelProfitView(FormView):
             return HttpResponseBadRequest("Formulario no válido")
 
     def get_queryset(self, year, month):
-        return Sales.objects.filter(date_added__year=year, date_added__month=month)
+        return period_querysets(year, month)
 
     def calculate_total_ingresos(self, sales_queryset):
-        total_ingresos = sales_queryset.aggregate(total=Sum('grand_total'))['total'] or Decimal('0')
+        total_ingresos = sum_sales(sales_queryset)
         return total_ingresos
 
     def calculate_total_costos(self, sales_queryset):
         total_costos = Decimal('0')
 
-        for sale in sales_queryset:
+        for sale in iter_sales(sales_queryset):
             for item in sale.salesitems_set.all():
                 purchase_product = PurchaseProduct.objects.filter(product=item.product).first()
                 if purchase_product:
@@ -390,9 +380,9 @@ class MonthlyExcelProfitView(FormView):
         sales_data = []
         total_utilidades = Decimal(0)
 
-        for sale in sales_queryset:
+        for sale in iter_sales(sales_queryset):
             sale_cost = self.calculate_sale_cost(sale)
-            sale_profit = Decimal(sale.grand_total) - sale_cost
+            sale_profit = sale.amount('grand_total') - sale_cost
             products_list = []
 
             for item in sale.salesitems_set.all():
@@ -423,7 +413,7 @@ class MonthlyExcelProfitView(FormView):
             sales_data.append({
                 'date_added': sale.date_added,
                 'products_list': products_list,
-                'venta_total': Decimal(sale.grand_total),
+                'venta_total': sale.amount('grand_total'),
                 'costo_total': sale_cost,
                 'ganancia_total': sale_profit,
             })
@@ -523,21 +513,17 @@ class DailyExcelProfitView(FormView):
         return response
 
     def get_queryset(self, year, month, day):
-        queryset = Sales.objects.filter(date_added__year=year, date_added__month=month)
-
-        if day:
-            queryset = queryset.filter(date_added__day=day)
-
-        return queryset
+        # Sin dia, el mes completo.
+        return period_querysets(year, month, day or None)
 
     def calculate_total_ingresos(self, sales_queryset):
-        total_ingresos = sales_queryset.aggregate(total=Sum('grand_total'))['total'] or Decimal('0')
+        total_ingresos = sum_sales(sales_queryset)
         return total_ingresos
 
     def calculate_total_costos(self, sales_queryset):
         total_costos = Decimal('0')
 
-        for sale in sales_queryset:
+        for sale in iter_sales(sales_queryset):
             for item in sale.salesitems_set.all():
                 purchase_product = PurchaseProduct.objects.filter(product=item.product).first()
                 if purchase_product:
@@ -552,9 +538,9 @@ class DailyExcelProfitView(FormView):
         sales_data = []
         total_utilidades = Decimal(0)
 
-        for sale in sales_queryset:
+        for sale in iter_sales(sales_queryset):
             sale_cost = self.calculate_sale_cost(sale)
-            sale_profit = Decimal(sale.grand_total) - sale_cost
+            sale_profit = sale.amount('grand_total') - sale_cost
             products_list = []
 
             for item in sale.salesitems_set.all():
@@ -585,7 +571,7 @@ class DailyExcelProfitView(FormView):
             sales_data.append({
                 'date_added': sale.date_added,
                 'products_list': products_list,
-                'venta_total': Decimal(sale.grand_total),
+                'venta_total': sale.amount('grand_total'),
                 'costo_total': sale_cost,
                 'ganancia_total': sale_profit,
             })
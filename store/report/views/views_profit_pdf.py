@@ -1,4 +1,5 @@
 from purchase.models import PurchaseProduct  # Importa el modelo PurchaseProduct
+from pos.archive import iter_sales, period_querysets, sales_querysets, sum_sales
 from pos.models import Sales, salesItems
 from inventory.models import Products
 from report.forms import *
@@ -49,9 +50,16 @@ class ProfitReportView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
 
         return queryset
 
+    def get_sale_sets(self):
+        """Ventas del rango para los totales, incluyendo los años archivados."""
+        form = self.form_class(self.request.GET)
+        if form.is_valid():
+            return sales_querysets(form.cleaned_data.get('start_date'), form.cleaned_data.get('end_date'))
+        return sales_querysets()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        sales = self.get_queryset()
+        sales = self.get_sale_sets()
 
         total_ingresos = self.calculate_total_ingresos(sales)
         total_costos = self.calculate_total_costos(sales)
@@ -71,12 +79,16 @@ class ProfitReportView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
         return context
 
     def calculate_total_ingresos(self, sales_queryset):
-        total_ingresos = sales_queryset.aggregate(total=Sum('grand_total'))['total']
+        total_ingresos = sum_sales(sales_queryset)
         return total_ingresos or Decimal('0')
 
     def calculate_total_costos(self, sales_queryset):
         total_costos = Decimal('0')
-        sales_items = salesItems.objects.filter(sale__in=sales_queryset)
+        sales_items = (
+            item
+            for queryset in sales_queryset
+            for item in salesItems.objects.using(queryset.db).filter(sale__in=queryset).select_related('product')
+        )
 
         for item in sales_items:
             purchase_product = PurchaseProduct.objects.filter(product=item.product).first()
@@ -88,9 +100,9 @@ class ProfitReportView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
 
     def get_sales_data(self, sales_queryset):
         sales_data = []
-        for sale in sales_queryset:
+        for sale in iter_sales(sales_queryset):
             sale_cost = self.calculate_sale_cost(sale)
-            sale_profit = Decimal(sale.grand_total) - sale_cost if sale.grand_total is not None else Decimal('0')
+            sale_profit = sale.amount('grand_total') - sale_cost if sale.grand_total is not None else Decimal('0')
             for item in sale.salesitems_set.all():
                 purchase_product = PurchaseProduct.objects.filter(product=item.product).first()
                 cost_per_unit = Decimal(purchase_product.cost) if purchase_product else Decimal('0')
@@ -175,27 +187,19 @@ class GeneratePDFProfitView(View):
         return response
 
     def get_queryset(self, form):
-        queryset = Sales.objects.all()
-
+        # Incluye los años archivados dentro del rango.
         if form.is_valid():
-            start_date = form.cleaned_data.get('start_date')
-            end_date = form.cleaned_data.get('end_date')
-
-            if start_date:
-                queryset = queryset.filter(date_added__gte=start_date)
-            if end_date:
-                queryset = queryset.filter(date_added__lte=end_date)
-
-        return queryset
+            return sales_querysets(form.cleaned_data.get('start_date'), form.cleaned_data.get('end_date'))
+        return sales_querysets()
 
     def calculate_total_ingresos(self, sales_queryset):
-        total_ingresos = sales_queryset.aggregate(total=Sum('grand_total'))['total'] or Decimal('0')
+        total_ingresos = sum_sales(sales_queryset)
         return total_ingresos
 
     def calculate_total_costos(self, sales_queryset):
         total_costos = Decimal('0')
 
-        for sale in sales_queryset:
+        for sale in iter_sales(sales_queryset):
             for item in sale.salesitems_set.all():
                 purchase_product = PurchaseProduct.objects.filter(product=item.product).first()
                 if purchase_product:
@@ -211,9 +215,9 @@ class GeneratePDFProfitView(View):
         sales_data = []
         total_utilidades = Decimal(0)
         
-        for sale in sales_queryset:
+        for sale in iter_sales(sales_queryset):
             sale_cost = self.calculate_sale_cost(sale)
-            sale_profit = Decimal(sale.grand_total) - sale_cost
+            sale_profit = sale.amount('grand_total') - sale_cost
             products_list = []
 
             for item in sale.salesitems_set.all():
@@ -245,7 +249,7 @@ class GeneratePDFProfitView(View):
             sales_data.append({
                 'date_added': sale.date_added,
                 'products_list': products_list,
-                'venta_total': Decimal(sale.grand_total),
+                'venta_total': sale.amount('grand_total'),
                 'costo_total': sale_cost,
                 'ganancia_total': sale_profit,
             })
@@ -277,10 +281,11 @@ class YearlyPDFProfitView(FormView):
         year = form.cleaned_data['year']
 
         # Obtener las ventas filtradas por año
-        sales_queryset = Sales.objects.filter(date_added__year=year)
+        # Incluye el archivo del año si ya fue archivado.
+        sales_queryset = period_querysets(year)
 
         # Calcular totales
-        total_ingresos = sales_queryset.aggregate(total=Sum('grand_total'))['total'] or 0
+        total_ingresos = sum_sales(sales_queryset)
         total_costos = self.calculate_total_costos(sales_queryset)
         total_ingresos_decimal = Decimal(total_ingresos)
         total_costos_decimal = Decimal(total_costos)
@@ -327,7 +332,7 @@ class YearlyPDFProfitView(FormView):
     def calculate_total_costos(self, sales_queryset):
         total_costos = 0
 
-        for sale in sales_queryset:
+        for sale in iter_sales(sales_queryset):
             sale_cost = self.calculate_sale_cost(sale)
             total_costos += sale_cost
 
@@ -337,8 +342,8 @@ class YearlyPDFProfitView(FormView):
         sales_data = []
         total_utilidades = Decimal(0)
 
-        for sale in sales_queryset:
-            sale_items = salesItems.objects.filter(sale=sale)
+        for sale in iter_sales(sales_queryset):
+            sale_items = sale.salesitems_set.all()
             products_list = []
 
             for item in sale_items:
@@ -351,7 +356,7 @@ class YearlyPDFProfitView(FormView):
                     total_gasto_compras = cost_per_unit * total_qty_comprada
                     
     
-                    product_ganancia = Decimal(sale.grand_total) - (cost_per_unit * total_qty_vendida)
+                    product_ganancia = sale.amount('grand_total') - (cost_per_unit * total_qty_vendida)
                     
     
                     costo_total = self.calculate_sale_cost(sale)
@@ -373,9 +378,9 @@ class YearlyPDFProfitView(FormView):
             sales_data.append({
                 'date_added': sale.date_added,
                 'products_list': products_list,
-                'venta_total': Decimal(sale.grand_total),
+                'venta_total': sale.amount('grand_total'),
                 'costo_total': self.calculate_sale_cost(sale),
-                'ganancia_total': Decimal(sale.grand_total) - self.calculate_sale_cost(sale),
+                'ganancia_total': sale.amount('grand_total') - self.calculate_sale_cost(sale),
             })
 
         return sales_data, total_utilidades
@@ -408,10 +413,10 @@ class MonthlyPDFProfitView(FormView):
             return HttpResponseBadRequest("El año o el mes proporcionados no son válidos.")
 
     
-        sales_queryset = Sales.objects.filter(date_added__year=year, date_added__month=month)
+        sales_queryset = period_querysets(year, month)
 
 
-        total_ingresos = sales_queryset.aggregate(total=Sum('grand_total'))['total'] or 0
+        total_ingresos = sum_sales(sales_queryset)
         total_costos = self.calculate_total_costos(sales_queryset)
         total_ingresos_decimal = Decimal(total_ingresos)
         total_costos_decimal = Decimal(total_costos)
@@ -459,7 +464,7 @@ class MonthlyPDFProfitView(FormView):
     def calculate_total_costos(self, sales_queryset):
         total_costos = 0
 
-        for sale in sales_queryset:
+        for sale in iter_sales(sales_queryset):
             sale_cost = self.calculate_sale_cost(sale)
             total_costos += sale_cost
 
@@ -470,8 +475,8 @@ class MonthlyPDFProfitView(FormView):
         sales_data = []
         total_utilidades = Decimal(0)
 
-        for sale in sales_queryset:
-            sale_items = salesItems.objects.filter(sale=sale)
+        for sale in iter_sales(sales_queryset):
+            sale_items = sale.salesitems_set.all()
             products_list = []
 
             for item in sale_items:
@@ -484,7 +489,7 @@ class MonthlyPDFProfitView(FormView):
                     total_gasto_compras = cost_per_unit * total_qty_comprada
                     
                 
-                    product_ganancia = Decimal(sale.grand_total) - (cost_per_unit * total_qty_vendida)
+                    product_ganancia = sale.amount('grand_total') - (cost_per_unit * total_qty_vendida)
                     
                 
                     costo_total = self.calculate_sale_cost(sale)
@@ -508,9 +513,9 @@ class MonthlyPDFProfitView(FormView):
             sales_data.append({
                 'date_added': sale.date_added,
                 'products_list': products_list,
-                'venta_total': Decimal(sale.grand_total),
+                'venta_total': sale.amount('grand_total'),
                 'costo_total': self.calculate_sale_cost(sale),
-                'ganancia_total': Decimal(sale.grand_total) - self.calculate_sale_cost(sale),
+                'ganancia_total': sale.amount('grand_total') - self.calculate_sale_cost(sale),
             })
 
         return sales_data, total_utilidades
@@ -543,10 +548,10 @@ class DailyPDFProfitView(FormView):
             return HttpResponseBadRequest("El año o el mes proporcionados no son válidos.")
 
         
-        sales_queryset = Sales.objects.filter(date_added__year=year, date_added__month=month, date_added__day=day)
+        sales_queryset = period_querysets(year, month, day)
 
         
-        total_ingresos = sales_queryset.aggregate(total=Sum('grand_total'))['total'] or 0
+        total_ingresos = sum_sales(sales_queryset)
         total_costos = self.calculate_total_costos(sales_queryset)
         total_ingresos_decimal = Decimal(total_ingresos)
         total_costos_decimal = Decimal(total_costos)
@@ -597,7 +602,7 @@ class DailyPDFProfitView(FormView):
     def calculate_total_costos(self, sales_queryset):
         total_costos = 0
 
-        for sale in sales_queryset:
+        for sale in iter_sales(sales_queryset):
             sale_cost = self.calculate_sale_cost(sale)
             total_costos += sale_cost
 
@@ -607,8 +612,8 @@ class DailyPDFProfitView(FormView):
         sales_data = []
         total_utilidades = Decimal(0)
 
-        for sale in sales_queryset:
-            sale_items = salesItems.objects.filter(sale=sale)
+        for sale in iter_sales(sales_queryset):
+            sale_items = sale.salesitems_set.all()
             products_list = []
 
             for item in sale_items:
@@ -621,7 +626,7 @@ class DailyPDFProfitView(FormView):
                     total_gasto_compras = cost_per_unit * total_qty_comprada
                     
     
-                    product_ganancia = Decimal(sale.grand_total) - (cost_per_unit * total_qty_vendida)
+                    product_ganancia = sale.amount('grand_total') - (cost_per_unit * total_qty_vendida)
                     
     
                     costo_total = self.calculate_sale_cost(sale)
@@ -645,9 +650,9 @@ class DailyPDFProfitView(FormView):
             sales_data.append({
                 'date_added': sale.date_added,
                 'products_list': products_list,
-                'venta_total': Decimal(sale.grand_total),
+                'venta_total': sale.amount('grand_total'),
                 'costo_total': self.calculate_sale_cost(sale),
-                'ganancia_total': Decimal(sale.grand_total) - self.calculate_sale_cost(sale),
+                'ganancia_total': sale.amount('grand_total') - self.calculate_sale_cost(sale),
             })
 
         return sales_data, total_utilidades
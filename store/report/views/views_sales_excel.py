@@ -20,6 +20,7 @@ from openpyxl.styles import Alignment
 from xhtml2pdf import pisa
 
 from inventory.models import *
+from pos.archive import count_sales, iter_sales, period_querysets, sales_querysets, sum_sales, sum_sold_qty
 from pos.models import *
 from django.views.generic import ListView, FormView
 from report.forms import ReportForm, YearReportForm, MonthReportForm, DayReportForm
@@ -54,7 +55,7 @@ class SalesListView(ListView):
         context = super().get_context_data(**kwargs)
         context['total_clientes'] = Sales.objects.values('id').distinct().count()
         context['total_items_vendidos'] = SalesItems.objects.aggregate(total=Sum('qty'))['total']
-        context['total_ingresos'] = Sales.objects.aggregate(total=Sum('grand_total'))['total']
+        context['total_ingresos'] = sum_amount(Sales.objects, 'grand_total')
         return context
     
     
@@ -62,17 +63,17 @@ class GenerateExcelSalesView(View):
     def post(self, request, *args, **kwargs):
         form = ReportForm(request.POST)
         if form.is_valid():
-            
-            sales = Sales.objects.all()
+            # Incluye las ventas de los años archivados.
+            sale_sets = sales_querysets()
 
             
-            total_clientes = Sales.objects.values('id').distinct().count()
+            total_clientes = count_sales(sale_sets)
 
             
-            total_items_vendidos = salesItems.objects.aggregate(total=Sum('qty'))['total']
+            total_items_vendidos = sum_sold_qty(sale_sets)
 
             
-            total_ingresos = Sales.objects.aggregate(total=Sum('grand_total'))['total']
+            total_ingresos = sum_sales(sale_sets)
 
             
             wb = Workbook()
@@ -83,8 +84,8 @@ class GenerateExcelSalesView(View):
             ws.append([''] + headers)
 
             
-            for sale in sales:
-                items = salesItems.objects.filter(sale=sale).all()
+            for sale in iter_sales(sale_sets):
+                items = sale.salesitems_set.select_related('product')
                 products_list = {}
                 for item in items:
                     product_name = item.product.name
@@ -150,15 +151,15 @@ class GenerateExcelSalesYearView(View):
         if form.is_valid():
             year = form.cleaned_data.get('year')
 
-            
-            sales = Sales.objects.filter(date_added__year=year)
+            # Incluye el archivo del año si ya fue archivado.
+            sale_sets = period_querysets(year)
 
             
-            total_clientes = Sales.objects.filter(date_added__year=year).values('id').distinct().count()
+            total_clientes = count_sales(sale_sets)
 
             
-            total_items_vendidos = salesItems.objects.filter(sale__in=sales).aggregate(total=Sum('qty'))['total']
-            total_ingresos = sales.aggregate(total=Sum('grand_total'))['total']
+            total_items_vendidos = sum_sold_qty(sale_sets)
+            total_ingresos = sum_sales(sale_sets)
 
             
             wb = Workbook()
@@ -170,8 +171,8 @@ class GenerateExcelSalesYearView(View):
             ws.append([''] + headers)
 
             
-            for sale in sales:
-                items = salesItems.objects.filter(sale=sale).all()
+            for sale in iter_sales(sale_sets):
+                items = sale.salesitems_set.select_related('product')
                 products_list = {}
                 for item in items:
                     product_name = item.product.name
@@ -243,14 +244,14 @@ class GenerateExcelSalesMonthView(View):
             except IndexError:
                 return HttpResponseBadRequest("El mes proporcionado no es válido.")
 
-            sales = Sales.objects.filter(date_added__year=year, date_added__month=month)
-            total_clientes = sales.values('id').distinct().count()
-            total_items_vendidos = salesItems.objects.filter(sale__in=sales).aggregate(total=Sum('qty'))['total']
-            total_ingresos = sales.aggregate(total=Sum('grand_total'))['total']
+            sale_sets = period_querysets(year, month)
+            total_clientes = count_sales(sale_sets)
+            total_items_vendidos = sum_sold_qty(sale_sets)
+            total_ingresos = sum_sales(sale_sets)
 
             sale_details = []
-            for sale in sales:
-                items = salesItems.objects.filter(sale=sale)
+            for sale in iter_sales(sale_sets):
+                items = sale.salesitems_set.select_related('product')
                 products_list = {}
                 for item in items:
                     product_name = item.product.name
@@ -345,14 +346,14 @@ class GenerateExcelSalesDayView(View):
                 messages.error(self.request, "La fecha ingresada no es válida.")
                 return HttpResponseBadRequest("La fecha ingresada no es válida.")
 
-            sales = Sales.objects.filter(date_added__year=year, date_added__month=month, date_added__day=day)
-            total_clientes = sales.values('id').distinct().count()
-            total_items_vendidos = salesItems.objects.filter(sale__in=sales).aggregate(total=Sum('qty'))['total']
-            total_ingresos = sales.aggregate(total=Sum('grand_total'))['total']
+            sale_sets = period_querysets(year, month, day)
+            total_clientes = count_sales(sale_sets)
+            total_items_vendidos = sum_sold_qty(sale_sets)
+            total_ingresos = sum_sales(sale_sets)
 
             sale_details = []
-            for sale in sales:
-                items = salesItems.objects.filter(sale=sale)
+            for sale in iter_sales(sale_sets):
+                items = sale.salesitems_set.select_related('product')
                 products_list = {}
                 for item in items:
                     product_name = item.product.name
@@ -11,7 +11,7 @@ from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.db import transaction
-from django.db.models import Count, Sum
+from django.db.models import Count
 from django.http import HttpResponse, HttpResponseBadRequest
 from django.shortcuts import redirect, render
 from django.template.loader import get_template, render_to_string
@@ -25,8 +25,13 @@ from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from xhtml2pdf import pisa
 
+from core.datatables import DataTablesMixin
 from inventory.models import *
+from pos.archive import (
+    archived_years_between, count_sales, iter_sales, period_querysets, sales_querysets, sum_sales, sum_sold_qty,
+)
 from pos.models import *
+from pos.views import SALES_TABLE_COLUMNS, sales_table_queryset, sales_table_row
 from report.forms import SalesReportForm, YearMonthForm, YearForm, DayForm, DateRangeForm, MONTH_CHOICES, MONTH_NAMES
 
 
@@ -53,16 +58,30 @@ def is_valid_day(year, month, day):
     else:
         return day <= 31
 
-class SalesReportView(LoginRequiredMixin, PermissionRequiredMixin,ListView):
+class SalesReportView(LoginRequiredMixin, PermissionRequiredMixin, DataTablesMixin, ListView):
     model = Sales
     template_name = 'report/sales_report.html'
     context_object_name = 'sales'
     form_class = SalesReportForm
     permission_required = 'report.view_sales' 
+    datatable_columns = SALES_TABLE_COLUMNS[:5]
+
+    def datatable_row(self, sale):
+        return sales_table_row(sale, actions=False)
 
     def get_queryset(self):
 
         queryset = super().get_queryset()
+        return sales_table_queryset(self.filter_sales(queryset))
+
+    def get_datatable_queryset(self):
+        # La tabla muestra las mismas ventas que los totales, con los años archivados.
+        start_date, end_date = self.get_date_range()
+        return [
+            sales_table_queryset(self.filter_sales(sales)) for sales in sales_querysets(start_date, end_date)
+        ]
+
+    def filter_sales(self, queryset):
         form = self.form_class(self.request.GET)
 
 
@@ -80,53 +99,35 @@ class SalesReportView(LoginRequiredMixin, PermissionRequiredMixin,ListView):
 
         return queryset
 
+    def get_date_range(self):
+        form = self.form_class(self.request.GET)
+        if form.is_valid():
+            return form.cleaned_data.get('start_date'), form.cleaned_data.get('end_date')
+        return None, None
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         form = self.form_class(self.request.GET)
 
         context['form'] = form
 
-
-        total_clientes = self.get_queryset().values('id').distinct().count()
-
-
-        total_items_vendidos = salesItems.objects.filter(sale__in=self.get_queryset()).aggregate(total=Sum('qty'))['total']
-
-
-        total_ingresos = self.get_queryset().aggregate(total=Sum('grand_total'))['total']
-        total_ingresos = self.format_total(total_ingresos)
+        # Los totales y la tabla incluyen los años archivados del rango.
+        start_date, end_date = self.get_date_range()
+        sale_sets = [self.filter_sales(sales) for sales in sales_querysets(start_date, end_date)]
+        context['archived_years'] = archived_years_between(start_date, end_date)
 
 
-        sales = self.get_queryset()
+        total_clientes = count_sales(sale_sets)
 
 
-        sale_data = []
-        for sale in sales:
-            data = {}
-            for field in sale._meta.get_fields(include_parents=False):
-                if field.related_model is None:
-                    data[field.name] = getattr(sale, field.name)
+        total_items_vendidos = sum_sold_qty(sale_sets)
 
-            items = salesItems.objects.filter(sale=sale).all()
-            products_list = {}
-            for item in items:
-                product_name = item.product.name
-                if product_name in products_list:
-                    products_list[product_name] += item.qty
-                else:
-                    products_list[product_name] = item.qty
-
-            data['products_list'] = products_list
-            data['total_items_sold'] = sum(products_list.values())
 
-            if 'tax_amount' in data:
-                data['tax_amount'] = format(float(data['tax_amount']), '.2f')
+        total_ingresos = sum_sales(sale_sets)
+        total_ingresos = self.format_total(total_ingresos)
 
-            sale_data.append(data)
 
-    
         context['page_title'] = 'Sales Transactions'
-        context['sale_data'] = sale_data
         context['total_clientes'] = total_clientes
         context['total_items_vendidos'] = total_items_vendidos
         context['total_ingresos'] = total_ingresos
@@ -141,16 +142,17 @@ class GeneratePDFSalesView(View):
     def get(self, request, *args, **kwargs):
         user = request.user  
 
-        sale_data = Sales.objects.order_by('date_added').all()
+        # Incluye las ventas de los años archivados.
+        sale_sets = sales_querysets()
 
-        total_clientes = Sales.objects.values('id').distinct().count()
+        total_clientes = sum(sales.count() for sales in sale_sets)
         total_items_vendidos = 0
-        total_ingresos = sum(sale.grand_total for sale in sale_data)
+        total_ingresos = sum(sum_amount(sales, 'grand_total') for sales in sale_sets)
 
         sale_details = []
 
-        for sale in sale_data:
-            items = salesItems.objects.filter(sale=sale)
+        for sale in iter_sales(sale_sets):
+            items = sale.salesitems_set.select_related('product')
             products_list = {}
 
             for item in items:
@@ -209,15 +211,18 @@ class GeneratePDFSalesYearView(FormView):
     def form_valid(self, form):
         year = form.cleaned_data['year']
         
-        sales = Sales.objects.filter(date_added__year=year)
-        total_clientes = sales.values('cliente').distinct().count()
-        total_items_vendidos = salesItems.objects.filter(sale__in=sales).aggregate(total=Sum('qty'))['total']
-        total_ingresos = sales.aggregate(total=Sum('grand_total'))['total']
+        # Incluye el archivo del año si ya fue archivado.
+        sale_sets = period_querysets(year)
+        total_clientes = len({
+            cliente for sales in sale_sets for cliente in sales.values_list('cliente', flat=True).distinct()
+        })
+        total_items_vendidos = sum_sold_qty(sale_sets)
+        total_ingresos = sum_sales(sale_sets)
 
         
         sale_details = []
-        for sale in sales:
-            items = salesItems.objects.filter(sale=sale)
+        for sale in iter_sales(sale_sets):
+            items = sale.salesitems_set.select_related('product')
             products_list = {}
             for item in items:
                 product_name = item.product.name
@@ -272,14 +277,14 @@ class GeneratePDFSalesMonthView(FormView):
         except ValueError:
             return HttpResponseBadRequest("El año o el mes proporcionados no son válidos.")
 
-        sales = Sales.objects.filter(date_added__year=year, date_added__month=month)
-        total_clientes = sales.values('id').distinct().count()
-        total_items_vendidos = salesItems.objects.filter(sale__in=sales).aggregate(total=Sum('qty'))['total']
-        total_ingresos = sales.aggregate(total=Sum('grand_total'))['total']
+        sale_sets = period_querysets(year, month)
+        total_clientes = count_sales(sale_sets)
+        total_items_vendidos = sum_sold_qty(sale_sets)
+        total_ingresos = sum_sales(sale_sets)
 
         sale_details = []
-        for sale in sales:
-            items = salesItems.objects.filter(sale=sale)
+        for sale in iter_sales(sale_sets):
+            items = sale.salesitems_set.select_related('product')
             products_list = {}
             for item in items:
                 product_name = item.product.name
@@ -332,14 +337,14 @@ class SalesReportCustomView(FormView):
         if fecha_desde > fecha_hasta:
             return HttpResponseBadRequest("La fecha de inicio no puede ser mayor que la fecha de fin.")
 
-        sales = Sales.objects.filter(date_added__range=(fecha_desde, fecha_hasta))
-        total_clientes = sales.values('id').distinct().count()
-        total_items_vendidos = salesItems.objects.filter(sale__in=sales).aggregate(total=Sum('qty'))['total']
-        total_ingresos = sales.aggregate(total=Sum('grand_total'))['total']
+        sale_sets = sales_querysets(fecha_desde, fecha_hasta)
+        total_clientes = count_sales(sale_sets)
+        total_items_vendidos = sum_sold_qty(sale_sets)
+        total_ingresos = sum_sales(sale_sets)
 
         sale_details = []
-        for sale in sales:
-            items = salesItems.objects.filter(sale=sale)
+        for sale in iter_sales(sale_sets):
+            items = sale.salesitems_set.select_related('product')
             products_list = {}
             for item in items:
                 product_name = item.product.name
@@ -398,14 +403,14 @@ class GeneratePDFSalesDayView(FormView):
             messages.error(self.request, "La fecha ingresada no es válida.")
             return self.form_invalid(form)
 
-        sales = Sales.objects.filter(date_added__year=year, date_added__month=month, date_added__day=day)
-        total_clientes = sales.values('id').distinct().count()
-        total_items_vendidos = salesItems.objects.filter(sale__in=sales).aggregate(total=Sum('qty'))['total']
-        total_ingresos = sales.aggregate(total=Sum('grand_total'))['total']
+        sale_sets = period_querysets(year, month, day)
+        total_clientes = count_sales(sale_sets)
+        total_items_vendidos = sum_sold_qty(sale_sets)
+        total_ingresos = sum_sales(sale_sets)
 
         sale_details = []
-        for sale in sales:
-            items = salesItems.objects.filter(sale=sale)
+        for sale in iter_sales(sale_sets):
+            items = sale.salesitems_set.select_related('product')
             products_list = {}
             for item in items:
                 product_name = item.product.name
@@ -100,9 +100,27 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Las transacciones toman el bloqueo de escritura al empezar, asi
+            # esperan el busy_timeout en vez de fallar al pasar de lectura a escritura.
+            # Requiere Django 5.1 o superior (ver Pipfile). Los pragmas de cada
+            # conexion estan en core/sqlite.py (DEFAULT_PRAGMAS).
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 5,
+        },
     }
 }
 
+# Con POS_GROUP_COMMIT las ventas (del POS y las subidas desde la cola de los
+# terminales) se escriben desde un solo hilo que agrupa en una transaccion las
+# que llegan dentro de la ventana (milisegundos). Ver pos/group_commit.py sobre
+# la durabilidad con synchronous=NORMAL.
+POS_GROUP_COMMIT = False
+POS_GROUP_COMMIT_WINDOW_MS = 5
+
+# Archivos anuales de ventas creados con el comando archive_sales.
+POS_ARCHIVE_DIR = BASE_DIR / 'archive'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators